@@ -1,30 +1,58 @@
+import os
+
 from flask import Flask
-from app.extentions import db,migrate,jwt
+from sqlalchemy.orm import configure_mappers
+from app.extentions import db,migrate,jwt,search,cache,passwords,limiter,async_db
 from app.controllers.auth.auth_cotroller import auth
 from app.controllers.users.user_controller import users
 from app.controllers.companies.company_cotroller import companies
 from app.controllers.books.book_controller import books
+from app.controllers.monitoring.monitoring_controller import monitoring
+from app import query_counter, timing, compression, json_provider
+from app import database
+from app.commands import register_commands
+from config import configs
 
 
-def create_app():
+#config_name is one of config.configs, APP_CONFIG in the environment otherwise
+#overrides replaces single settings (benchmarks point SQLALCHEMY_DATABASE_URI at their own database)
+def create_app(config_name=None, overrides=None):
 
     app = Flask(__name__)
-    app.config.from_object('config.Config')
+    app.config.from_object(configs[config_name or os.environ.get('APP_CONFIG', 'development')])
+    app.config.update(overrides or {})
 
+    database.configure_engine(app)
     db.init_app(app)
     migrate.init_app(app,db)
     jwt.init_app(app)
+    search.init_app(app,db)
+    cache.init_app(app)
+    passwords.init_app(app)
+    limiter.init_app(app)
+    async_db.init_app(app)
 
     #importing models
     from app.models.users import User
     from app.models.companies import Company
     from app.models.books import Book
+    from app.models.book_stats import BookStat
+
+    #resolve the backrefs (User.books, User.companies...) so controllers can eager load them
+    configure_mappers()
+
+    query_counter.init_app(app)
+    timing.init_app(app)
+    json_provider.init_app(app)
+    compression.init_app(app)
+    register_commands(app)
     
     #registering blue prints
     app.register_blueprint(auth)
     app.register_blueprint(users)
     app.register_blueprint(companies)
     app.register_blueprint(books)
+    app.register_blueprint(monitoring)
     
 
 
@@ -0,0 +1,81 @@
+import asyncio
+import weakref
+
+from flask import current_app
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.util import await_only
+
+
+#async database access for the endpoints asgi.py serves on the event loop
+#The async engine reads the same database as db.engine through the async DBAPI of
+#its dialect (ASYNC_DATABASE_URL overrides the derived url). asgi.py runs the view in
+#a greenlet over a session of this engine, set as db.session for the request: every
+#query suspends the greenlet and the loop serves other requests until it returns.
+#Engines are bound to the event loop they were created on, there is one per loop.
+
+
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+#pool settings an async engine takes from SQLALCHEMY_ENGINE_OPTIONS, poolclass is left to it
+_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping')
+
+
+def async_url(url):
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f'no async driver for {url.drivername}, set ASYNC_DATABASE_URL')
+    return url.set(drivername=driver)
+
+
+#true when the caller runs on an event loop, in the greenlet of a view asgi.py serves
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+#wait for a concurrent.futures future without blocking the event loop
+def wait_future(future, timeout=None):
+    return await_only(asyncio.wait_for(asyncio.wrap_future(future), timeout))
+
+
+#run function on the loop's default thread executor and wait for it the same way
+def run_in_executor(function, *args):
+    return await_only(asyncio.get_running_loop().run_in_executor(None, function, *args))
+
+
+class AsyncDatabase:
+
+    def init_app(self, app):
+        app.config.setdefault('ASYNC_DATABASE_URL', None)
+        app.extensions['async_db'] = {'engines': weakref.WeakKeyDictionary()}
+
+    @property
+    def engine(self):
+        engines = current_app.extensions['async_db']['engines']
+        loop = asyncio.get_running_loop()
+        engine = engines.get(loop)
+        if engine is None:
+            config = current_app.config
+            url = make_url(config['ASYNC_DATABASE_URL']) if config['ASYNC_DATABASE_URL'] else async_url(config['SQLALCHEMY_DATABASE_URI'])
+            options = {name: value for name, value in config['SQLALCHEMY_ENGINE_OPTIONS'].items() if name in _POOL_OPTIONS}
+            engine = engines[loop] = create_async_engine(url, **options)
+        return engine
+
+    #a session for one request, nothing is expired on commit so results outlive it
+    def session(self):
+        return AsyncSession(self.engine, expire_on_commit=False)
+
+    async def dispose(self):
+        engines = current_app.extensions['async_db']['engines']
+        engine = engines.pop(asyncio.get_running_loop(), None)
+        if engine is not None:
+            await engine.dispose()
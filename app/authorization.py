@@ -0,0 +1,57 @@
+from collections import namedtuple
+from functools import wraps
+
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
+
+from app.lookups import get_token_version
+from app.status_codes import HTTP_401_UNAUTHORIZED
+
+
+#the role and token version travel in the JWT as additional claims, so the
+#ownership and admin checks of the write handlers need no user query.
+#users.token_version is bumped when the role or password changes, tokens
+#carrying an older version are refused and the client has to log in again.
+
+
+class Principal(namedtuple('Principal', ['id', 'role'])):
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    #admins may edit anything, everybody else only what they own
+    def may_edit(self, owner_id):
+        return self.is_admin or self.id == owner_id
+
+
+def token_claims(user):
+    return {'role': user.user_type, 'ver': user.token_version}
+
+
+#one primary key lookup on the primary per protected request
+def is_current_token(user_id, claims):
+    version = claims.get('ver')
+    return version is not None and version == get_token_version(user_id)
+
+
+def current_principal():
+    return g.principal
+
+
+#jwt_required plus the token version check, the handler reads current_principal()
+def authorization_required(refresh=False):
+    def decorator(view):
+        @wraps(view)
+        @jwt_required(refresh=refresh)
+        def wrapper(*args, **kwargs):
+            claims = get_jwt()
+            user_id = int(get_jwt_identity())
+
+            if not is_current_token(user_id, claims):
+                return jsonify({'error':'Token is no longer valid, log in again'}),HTTP_401_UNAUTHORIZED
+
+            g.principal = Principal(user_id, claims.get('role'))
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,212 @@
+from sqlalchemy import String, bindparam, cast, func, literal, select, true, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app import counters
+from app.models.book_stats import BookStat
+from app.models.books import Book
+
+
+#book counts per genre, company, author and price unit, and the price of the books
+#of each (count, total, lowest, highest), kept in the book_stats table for GET /books/stats
+#Every handler that writes books adds and subtracts the books it changed in the same
+#transaction: counts and totals are incremented in place, the lowest and highest
+#prices are looked up again only when a book holding one goes. flask books
+#stats-rebuild recomputes the table from the books.
+#The per author and per company counts also move users.books_count and
+#companies.books_count (app/counters.py).
+
+
+#dimension -> books column the books are counted by
+DIMENSIONS = {
+    'genre': Book.genre,
+    'company': Book.company_id,
+    'author': Book.user_id,
+    'price_unit': Book.price_unit,
+}
+
+FIELDS = ['price'] + [column.key for column in DIMENSIONS.values()]
+
+
+#the values the stats depend on, taken before a book is changed or deleted
+def snapshot(book):
+    return {name: getattr(book, name) for name in FIELDS}
+
+
+#(dimension, value) -> [books, price total, lowest price, highest price] of some books
+def book_totals(books):
+    totals = {}
+    for book in books:
+        price = int(book['price'])
+        for dimension, column in DIMENSIONS.items():
+            if book[column.key] is None:
+                continue
+            key = (dimension, str(book[column.key]))
+            entry = totals.get(key)
+            if entry is None:
+                totals[key] = [1, price, price, price]
+            else:
+                entry[0] += 1
+                entry[1] += price
+                entry[2] = min(entry[2], price)
+                entry[3] = max(entry[3], price)
+    return totals
+
+
+#the same for the books matching a condition, grouped by the database
+#for set-based deletes: taken before the books go, subtracted after
+def query_totals(session, condition):
+    totals = {}
+    for dimension, column in DIMENSIONS.items():
+        rows = session.execute(
+            select(column, func.count(), func.sum(Book.price), func.min(Book.price), func.max(Book.price))
+            .where(condition, column.isnot(None)).group_by(column))
+        for value, count, total, lowest, highest in rows:
+            totals[(dimension, str(value))] = [count, int(total), lowest, highest]
+    return totals
+
+
+def record(session, added=(), removed=()):
+    add(session, book_totals(added))
+    subtract(session, book_totals(removed))
+
+
+def _move_counters(session, totals, sign):
+    counts = {dimension: {} for dimension in ('author', 'company')}
+    for (dimension, value), (count, _, _, _) in totals.items():
+        if dimension in counts:
+            counts[dimension][value] = sign * count
+    counters.books_added(session, counts['author'], counts['company'])
+
+
+def _least_greatest(dialect):
+    if dialect == 'sqlite':
+        #min() and max() with two arguments are SQLite's scalar least and greatest
+        return func.min, func.max
+    return func.least, func.greatest
+
+
+def add(session, totals):
+    if not totals:
+        return
+
+    _move_counters(session, totals, 1)
+    table = BookStat.__table__
+    rows = [{'dimension': dimension, 'value': value, 'book_count': count, 'price_total': total, 'price_min': lowest, 'price_max': highest}
+            for (dimension, value), (count, total, lowest, highest) in totals.items()]
+    dialect = session.get_bind().dialect.name
+    least, greatest = _least_greatest(dialect)
+
+    if dialect == 'mysql':
+        statement = mysql.insert(table)
+        new = statement.inserted
+    elif dialect in ('sqlite', 'postgresql'):
+        statement = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        new = statement.excluded
+    else:
+        _add_generic(session, table, rows, least, greatest)
+        return
+
+    values = {
+        'book_count': table.c.book_count + new.book_count,
+        'price_total': table.c.price_total + new.price_total,
+        'price_min': least(table.c.price_min, new.price_min),
+        'price_max': greatest(table.c.price_max, new.price_max),
+    }
+    if dialect == 'mysql':
+        session.execute(statement.on_duplicate_key_update(values), rows)
+    else:
+        session.execute(statement.on_conflict_do_update(index_elements=['dimension', 'value'], set_=values), rows)
+
+
+#other databases: update the rows there are, insert the others
+def _add_generic(session, table, rows, least, greatest):
+    key = tuple_(table.c.dimension, table.c.value)
+    existing = set(session.execute(select(table.c.dimension, table.c.value).where(key.in_([(row['dimension'], row['value']) for row in rows]))).all())
+
+    inserts = [row for row in rows if (row['dimension'], row['value']) not in existing]
+    if inserts:
+        session.execute(table.insert(), inserts)
+
+    updates = [{'key_' + name: value for name, value in row.items()} for row in rows if (row['dimension'], row['value']) in existing]
+    if updates:
+        statement = table.update()\
+            .where(table.c.dimension == bindparam('key_dimension'), table.c.value == bindparam('key_value'))\
+            .values(book_count=table.c.book_count + bindparam('key_book_count'),
+                    price_total=table.c.price_total + bindparam('key_price_total'),
+                    price_min=least(table.c.price_min, bindparam('key_price_min')),
+                    price_max=greatest(table.c.price_max, bindparam('key_price_max')))
+        session.execute(statement, updates)
+
+
+#after the books have been deleted or changed, the lowest and highest prices are
+#read back from the books (ix_books_genre_price, ix_books_price_unit_price)
+def subtract(session, totals):
+    if not totals:
+        return
+
+    #pending ORM deletes and changes go first, the lookups below must not see the old books
+    session.flush()
+    _move_counters(session, totals, -1)
+
+    table = BookStat.__table__
+    key = tuple_(table.c.dimension, table.c.value)
+    statement = table.update()\
+        .where(table.c.dimension == bindparam('key_dimension'), table.c.value == bindparam('key_value'))\
+        .values(book_count=table.c.book_count - bindparam('key_book_count'),
+                price_total=table.c.price_total - bindparam('key_price_total'))
+    session.execute(statement, [
+        {'key_dimension': dimension, 'key_value': value, 'key_book_count': count, 'key_price_total': total}
+        for (dimension, value), (count, total, _, _) in totals.items()
+    ])
+
+    empty, stale = [], []
+    rows = session.execute(select(table.c.dimension, table.c.value, table.c.book_count, table.c.price_min, table.c.price_max)
+                           .where(key.in_(list(totals)))).all()
+    for dimension, value, count, lowest, highest in rows:
+        _, _, removed_lowest, removed_highest = totals[(dimension, value)]
+        if count <= 0:
+            empty.append((dimension, value))
+        elif removed_lowest <= lowest or removed_highest >= highest:
+            stale.append((dimension, value))
+
+    if empty:
+        session.execute(table.delete().where(key.in_(empty)))
+
+    for dimension, value in stale:
+        column = DIMENSIONS[dimension]
+        lowest, highest = session.execute(
+            select(func.min(Book.price), func.max(Book.price)).where(column == column.type.python_type(value))).one()
+        session.execute(table.update().where(table.c.dimension == dimension, table.c.value == value)
+                        .values(price_min=lowest, price_max=highest))
+
+
+#recompute the whole table from the books, one GROUP BY per dimension
+def rebuild(session):
+    table = BookStat.__table__
+    session.execute(table.delete())
+    for dimension, column in DIMENSIONS.items():
+        session.execute(table.insert().from_select(
+            ['dimension', 'value', 'book_count', 'price_total', 'price_min', 'price_max'],
+            select(literal(dimension), cast(column, String(100)), func.count(), func.sum(Book.price), func.min(Book.price), func.max(Book.price))
+            .where(column.isnot(None)).group_by(column)))
+    return {dimension: count for dimension, count in session.execute(select(table.c.dimension, func.count()).group_by(table.c.dimension))}
+
+
+#rows of the stats table that differ from a recount, (dimension, value) -> (stored, counted)
+def drift(session):
+    table = BookStat.__table__
+    stored = {(row[0], row[1]): tuple(row[2:]) for row in session.execute(
+        select(table.c.dimension, table.c.value, table.c.book_count, table.c.price_total, table.c.price_min, table.c.price_max))}
+    counted = {key: tuple(entry) for key, entry in query_totals(session, true()).items()}
+    return {key: (stored.get(key), counted.get(key)) for key in stored.keys() | counted.keys() if stored.get(key) != counted.get(key)}
+
+
+#the values of a dimension with the most books first
+def top(session, dimension, limit):
+    return session.execute(
+        select(BookStat).where(BookStat.dimension == dimension)
+        .order_by(BookStat.book_count.desc(), BookStat.value).limit(limit)).scalars().all()
+
+
+def total_books(session):
+    return session.scalar(select(func.coalesce(func.sum(BookStat.book_count), 0)).where(BookStat.dimension == 'price_unit'))
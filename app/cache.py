@@ -0,0 +1,213 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+#read-through cache for single resource lookups
+#Every entry carries tags naming the rows it was built from ('book:3', 'user:7'...),
+#writes invalidate by tag so only the entries that embed the changed row are dropped.
+#
+#CACHE_BACKEND: 'memory' (per process LRU with TTL), 'redis' (shared between
+#processes, needs the redis package and CACHE_REDIS_URL) or 'null' to disable
+
+
+class MemoryBackend:
+
+    #clear() and invalidate() only reach the calling process
+    shared = False
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  #key -> (expires at, value, tags)
+        self._tags = {}  #tag -> set of keys
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._drop(key)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        return {
+            'backend': 'memory',
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class RedisBackend:
+
+    PREFIX = 'authors:cache:'
+    shared = True
+
+    def __init__(self, url, ttl):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND = 'redis' needs the redis package installed")
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.PREFIX + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, tags=()):
+        pipe = self.client.pipeline()
+        pipe.setex(self.PREFIX + key, self.ttl, pickle.dumps(value))
+        for tag in tags:
+            pipe.sadd(self.PREFIX + 'tag:' + tag, key)
+            pipe.expire(self.PREFIX + 'tag:' + tag, self.ttl)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_key = self.PREFIX + 'tag:' + tag
+            keys = self.client.smembers(tag_key)
+            pipe = self.client.pipeline()
+            for key in keys:
+                pipe.delete(self.PREFIX + key.decode('utf-8'))
+            pipe.delete(tag_key)
+            pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(self.PREFIX + '*'):
+            self.client.delete(key)
+
+    def stats(self):
+        server = self.client.info('stats')
+        return {
+            'backend': 'redis',
+            'entries': sum(1 for _ in self.client.scan_iter(self.PREFIX + '*', count=1000)),
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': server.get('evicted_keys', 0),
+            'expirations': server.get('expired_keys', 0),
+        }
+
+
+class NullBackend:
+
+    shared = True
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, tags=()):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'backend': 'null'}
+
+
+class Cache:
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_MAX_ENTRIES', 10000)
+        app.config.setdefault('CACHE_TTL', 300)
+        app.config.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+        name = app.config['CACHE_BACKEND']
+        if name == 'memory':
+            backend = MemoryBackend(app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_TTL'])
+        elif name == 'redis':
+            backend = RedisBackend(app.config['CACHE_REDIS_URL'], app.config['CACHE_TTL'])
+        elif name == 'null':
+            backend = NullBackend()
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND {name}')
+
+        app.extensions['cache'] = backend
+
+    @property
+    def backend(self):
+        return current_app.extensions['cache']
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, tags=()):
+        self.backend.set(key, value, tags)
+        return value
+
+    #call after the write committed
+    def invalidate(self, *tags):
+        self.backend.invalidate([tag for tag in tags if tag])
+
+    def clear(self):
+        self.backend.clear()
+
+    #whether clear() and invalidate() reach every server process
+    @property
+    def shared(self):
+        return self.backend.shared
+
+    def stats(self):
+        return self.backend.stats()
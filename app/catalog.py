@@ -0,0 +1,343 @@
+import csv
+import io
+import json
+import os
+import time
+import zlib
+
+from sqlalchemy import select
+
+from app import book_stats, counters
+from app.extentions import cache, db
+from app.routing import read_engine
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+from app.upsert import upsert
+from app.validation import ValidationError, book_values, company_values
+
+
+#bulk loading of companies and books from CSV or JSONL files, and the book export
+#Files are read one record at a time and written in chunks, each chunk is one
+#upsert and one commit. After every commit the byte offset reached is saved to a
+#checkpoint file, a later run with the same file continues from there.
+#Rows follow createCompany / createBook: a row may update its own user's company or
+#book, not take over another user's name or ISBN, and an author's titles stay unique.
+#cache.clear() only reaches a shared cache, see warn_running_servers.
+
+
+#kind -> (table, unique key the upsert matches on, validation)
+KINDS = {
+    'companies': (Company.__table__, ('name',), company_values),
+    'books': (Book.__table__, ('isbn',), book_values),
+}
+
+
+def file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f'Cannot tell the format of {path}, pass --format')
+
+
+#records of the file from a byte offset on, as (record, offset after it)
+#a record that cannot be parsed comes back as a ValidationError
+def read_records(path, format, offset=0):
+    if format == 'csv':
+        return _read_csv(path, offset)
+    return _read_jsonl(path, offset)
+
+
+def _read_csv(path, offset):
+    with open(path, 'rb') as handle:
+        position = [0]
+
+        #csv needs text lines, the offset needs bytes: count the bytes of every line handed over
+        def lines():
+            for raw in handle:
+                position[0] += len(raw)
+                yield raw.decode('utf-8')
+
+        reader = csv.reader(lines())
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [name.strip().lstrip('\ufeff') for name in header]
+
+        if offset > position[0]:
+            handle.seek(offset)
+            position[0] = offset
+
+        for fields in reader:
+            if not any(fields):
+                continue
+            if len(fields) != len(header):
+                yield ValidationError(f'Expected {len(header)} columns, got {len(fields)}'), position[0]
+            else:
+                yield dict(zip(header, fields)), position[0]
+
+
+def _read_jsonl(path, offset):
+    with open(path, 'rb') as handle:
+        handle.seek(offset)
+        position = offset
+        for raw in handle:
+            position += len(raw)
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line), position
+            except ValueError as e:
+                yield ValidationError(f'Invalid JSON: {e}'), position
+
+
+class Checkpoint:
+
+    def __init__(self, path, source, kind):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.kind = kind
+        self.size = os.path.getsize(source)
+        self.offset = self.rows = self.upserted = self.rejected = 0
+
+    #resume from an earlier run, only for the same file and kind
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path) as handle:
+            saved = json.load(handle)
+        if saved['source'] != self.source or saved['kind'] != self.kind or saved['size'] != self.size:
+            raise ValueError(f'{self.path} belongs to another import, remove it or pass --restart')
+
+        self.offset = saved['offset']
+        self.rows = saved['rows']
+        self.upserted = saved['upserted']
+        self.rejected = saved['rejected']
+        return True
+
+    #written to a temporary file and renamed, a crash never leaves half a checkpoint
+    def save(self):
+        state = {
+            'source': self.source,
+            'kind': self.kind,
+            'size': self.size,
+            'offset': self.offset,
+            'rows': self.rows,
+            'upserted': self.upserted,
+            'rejected': self.rejected,
+        }
+        with open(self.path + '.tmp', 'w') as handle:
+            json.dump(state, handle)
+        os.replace(self.path + '.tmp', self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CatalogImport:
+
+    def __init__(self, kind, user_id=None, chunk_size=1000, rejects=None, progress=None):
+        self.kind = kind
+        self.table, self.key, self.validate = KINDS[kind]
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.rejects = rejects  #file object rejected rows are written to as JSON lines
+        self.progress = progress or (lambda message: None)
+
+    def run(self, path, format, checkpoint):
+        started = time.monotonic()
+        rows_at_start = checkpoint.rows
+        chunk = []
+
+        for record, offset in read_records(path, format, checkpoint.offset):
+            checkpoint.rows += 1
+            try:
+                chunk.append((checkpoint.rows, self._values(record)))
+            except ValidationError as e:
+                self._reject(checkpoint, checkpoint.rows, record, e)
+
+            if len(chunk) >= self.chunk_size:
+                self._write(chunk, checkpoint, offset)
+                chunk = []
+                self._report(checkpoint, started, rows_at_start)
+            checkpoint.offset = offset
+
+        self._write(chunk, checkpoint, checkpoint.offset)
+        if chunk:
+            self._report(checkpoint, started, rows_at_start)
+
+        if checkpoint.upserted:
+            #the rows were written behind the ORM, cached representations may embed them
+            cache.clear()
+        checkpoint.remove()
+
+    def _values(self, record):
+        if isinstance(record, ValidationError):
+            raise record
+        if not isinstance(record, dict):
+            raise ValidationError('A record must be an object')
+
+        user_id = record.get('user_id') or self.user_id
+        if not user_id:
+            raise ValidationError('user_id is required, as a column or with --user')
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            raise ValidationError('user_id must be a whole number')
+        return self.validate(record, user_id)
+
+    def _reject(self, checkpoint, row, record, error):
+        checkpoint.rejected += 1
+        if self.rejects is not None:
+            self.rejects.write(json.dumps({'row': row, 'error': str(error), 'record': record if isinstance(record, dict) else None}, default=str) + '\n')
+
+    def _write(self, chunk, checkpoint, offset):
+        if chunk:
+            #foreign keys are checked up front, one bad row must not fail the whole chunk
+            users = set(db.session.scalars(select(User.id).where(User.id.in_({values['user_id'] for _, values in chunk}))))
+            companies = set()
+            if self.kind == 'books':
+                companies = set(db.session.scalars(select(Company.id).where(Company.id.in_({values['company_id'] for _, values in chunk}))))
+
+            rows = {}
+            for row, values in chunk:
+                if values['user_id'] not in users:
+                    self._reject(checkpoint, row, values, ValidationError('User not found'))
+                elif self.kind == 'books' and values['company_id'] not in companies:
+                    self._reject(checkpoint, row, values, ValidationError('Company not found'))
+                else:
+                    #the last row wins when the file repeats a key within one chunk
+                    rows[tuple(values[name] for name in self.key)] = (row, values)
+            rows = self._owned(checkpoint, rows)
+
+            #rows matched on their key are replaced, their old values leave the stats and counters
+            replaced = []
+            if self.kind == 'books' and rows:
+                replaced = [book_stats.snapshot(book) for book in db.session.execute(
+                    select(*[Book.__table__.c[name] for name in book_stats.FIELDS]).where(Book.isbn.in_([key[0] for key in rows])))]
+            elif rows:
+                replaced = db.session.scalars(select(Company.user_id).where(Company.name.in_([key[0] for key in rows]))).all()
+
+            upsert(db.session, self.table, list(rows.values()), self.key)
+            if self.kind == 'books':
+                book_stats.record(db.session, added=rows.values(), removed=replaced)
+            elif rows:
+                owners = counters.tally(values['user_id'] for values in rows.values())
+                owners.subtract(counters.tally(replaced))
+                counters.companies_added(db.session, owners)
+            checkpoint.upserted += len(rows)
+
+        db.session.commit()
+        checkpoint.offset = offset
+        checkpoint.save()
+
+    #drops the rows createCompany / createBook would refuse: a key (company name, ISBN)
+    #taken by another user, a title its author already uses for another ISBN
+    def _owned(self, checkpoint, rows):
+        if not rows:
+            return {}
+
+        column, name = (Book.isbn, 'isbn') if self.kind == 'books' else (Company.name, 'name')
+        owners = dict(db.session.execute(select(column, column.class_.user_id).where(column.in_([key[0] for key in rows]))).all())
+
+        titles = {}  #(user id, title) -> isbn
+        if self.kind == 'books':
+            wanted = {(values['user_id'], values['title']) for _, values in rows.values()}
+            for user_id, title, isbn in db.session.execute(
+                    select(Book.user_id, Book.title, Book.isbn).where(Book.title.in_({title for _, title in wanted}))):
+                if (user_id, title) in wanted:
+                    titles[(user_id, title)] = isbn
+
+        kept = {}
+        for key, (row, values) in rows.items():
+            owner = owners.get(values[name])
+            if owner is not None and owner != values['user_id']:
+                self._reject(checkpoint, row, values, ValidationError('Book isbn already in use' if self.kind == 'books' else 'Company name already in use'))
+                continue
+            if self.kind == 'books':
+                title = (values['user_id'], values['title'])
+                if titles.setdefault(title, values['isbn']) != values['isbn']:
+                    self._reject(checkpoint, row, values, ValidationError('Book with this title and User ID already exists'))
+                    continue
+            kept[key] = values
+        return kept
+
+    def _report(self, checkpoint, started, rows_at_start):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = (checkpoint.rows - rows_at_start) / elapsed
+        self.progress(f'{checkpoint.rows} rows, {checkpoint.upserted} upserted, {checkpoint.rejected} rejected, {rate:.0f} rows/s')
+
+
+#books joined with their company and author, as exported
+EXPORT_COLUMNS = [
+    Book.id, Book.title, Book.isbn, Book.genre, Book.pages, Book.price, Book.price_unit,
+    Book.publication_date, Book.description, Book.image, Book.created_at, Book.updated_at,
+    Book.company_id, Company.name.label('company_name'),
+    Book.user_id.label('author_id'), User.first_name.label('author_first_name'), User.last_name.label('author_last_name'),
+]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+
+#export rows in id order
+#Every chunk is one short query on its own connection, streamed off a server side
+#cursor (stream_results) in batches of yield_per rows. Nothing is held between
+#chunks, so a long export neither buffers the table nor keeps a transaction open,
+#and it runs on the replica when there is one.
+def iter_export_rows(chunk_size=10000, yield_per=1000):
+    statement = select(*EXPORT_COLUMNS)\
+        .outerjoin(Company, Company.id == Book.company_id)\
+        .outerjoin(User, User.id == Book.user_id)\
+        .order_by(Book.id)\
+        .limit(chunk_size)
+
+    last_id = 0
+    while True:
+        count = 0
+        with read_engine(db).connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=yield_per).execute(statement.where(Book.id > last_id))
+            for rows in result.partitions():
+                count += len(rows)
+                last_id = rows[-1].id
+                yield rows
+        if count < chunk_size:
+            return
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+#text blocks of the export, one per batch of rows
+def export_chunks(format, rows_iter):
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        #the header goes out on its own, an export without rows is still a csv file
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        for rows in rows_iter:
+            writer.writerows([[_plain(value) for value in row] for row in rows])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        for rows in rows_iter:
+            yield ''.join(json.dumps({key: _plain(value) for key, value in zip(EXPORT_FIELDS, row)}) + '\n' for row in rows)
+
+
+#gzip member written incrementally, the blocks stay the size of a batch
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,14 @@
+from app.commands.explain import check_indexes
+from app.commands.search import search_cli
+from app.commands.books import books_cli
+from app.commands.seed import seed
+from app.commands.counters import repair_counters
+
+
+#flask cli commands, registered from create_app
+def register_commands(app):
+    app.cli.add_command(check_indexes)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(books_cli)
+    app.cli.add_command(seed)
+    app.cli.add_command(repair_counters)
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import book_stats
+from app.catalog import EXPORT_FORMATS, KINDS, CatalogImport, Checkpoint, export_chunks, file_format, gzip_chunks, iter_export_rows
+from app.commands.notice import warn_running_servers
+from app.extentions import db
+
+
+books_cli = AppGroup('books', help='Catalog import and export, book stats.')
+
+
+@books_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--kind', type=click.Choice(list(KINDS)), required=True, help='What the file holds.')
+@click.option('--format', 'format_', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--user', 'user_id', type=int, help='Owner of rows without a user_id column.')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows per upsert and commit.')
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False), help='Defaults to PATH.checkpoint.')
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start from the top.')
+@click.option('--rejects', type=click.File('a'), help='Append rejected rows to this file as JSON lines.')
+def import_catalog(path, kind, format_, user_id, chunk_size, checkpoint_path, restart, rejects):
+    """Upsert companies or books from a CSV or JSONL file.
+
+    Rows are validated like createCompany / createBook and upserted on the company
+    name or the book ISBN. A row may update a company or book of its own user, one
+    whose name or ISBN belongs to another user is rejected, as is a book whose title
+    its author already uses. An interrupted import continues where the last commit
+    left off when run again with the same file.
+    """
+    try:
+        format_ = format_ or file_format(path)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    checkpoint = Checkpoint(checkpoint_path or path + '.checkpoint', path, kind)
+    if restart:
+        checkpoint.remove()
+    else:
+        try:
+            if checkpoint.load():
+                click.echo(f'Resuming {os.path.basename(path)} after row {checkpoint.rows}')
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    job = CatalogImport(kind, user_id=user_id, chunk_size=chunk_size, rejects=rejects, progress=click.echo)
+    job.run(path, format_, checkpoint)
+    click.echo(f'Imported {kind} from {path}: {checkpoint.rows} rows, {checkpoint.upserted} upserted, {checkpoint.rejected} rejected')
+    if checkpoint.upserted:
+        warn_running_servers()
+
+
+@books_cli.command('export')
+@click.option('--format', 'format_', type=click.Choice(EXPORT_FORMATS), default='ndjson', show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), help='Defaults to stdout.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+def export_catalog(format_, output, compress):
+    """Write every book with its company and author as NDJSON or CSV."""
+    count = [0]
+    started = time.monotonic()
+
+    def counted(batches):
+        for rows in batches:
+            count[0] += len(rows)
+            yield rows
+
+    chunks = export_chunks(format_, counted(iter_export_rows(current_app.config.get('EXPORT_CHUNK_SIZE', 10000))))
+    chunks = gzip_chunks(chunks) if compress else (chunk.encode('utf-8') for chunk in chunks)
+
+    handle = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            handle.write(chunk)
+    finally:
+        if output:
+            handle.close()
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    click.echo(f'Exported {count[0]} books, {count[0] / elapsed:.0f} rows/s', err=True)
+
+
+@books_cli.command('stats-rebuild')
+@click.option('--check', is_flag=True, help='Only report the rows that differ from a recount.')
+def rebuild_stats(check):
+    """Recompute the book_stats summary table from the books.
+
+    The book handlers keep the table up to date as they go, this reconciles it
+    after writes that bypassed them (SQL run by hand, a restored backup).
+    """
+    drift = book_stats.drift(db.session)
+    for (dimension, value), (stored, counted) in sorted(drift.items()):
+        click.echo(f'{dimension} {value}: stored {stored}, counted {counted}')
+    click.echo(f'{len(drift)} stats rows differ from the books')
+    if check:
+        sys.exit(1 if drift else 0)
+
+    started = time.monotonic()
+    rows = book_stats.rebuild(db.session)
+    db.session.commit()
+    click.echo('Rebuilt book stats in {:.1f}s: '.format(time.monotonic() - started) + ', '.join(f'{count} {dimension}' for dimension, count in sorted(rows.items())))
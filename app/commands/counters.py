@@ -0,0 +1,34 @@
+import sys
+
+import click
+from flask.cli import with_appcontext
+
+from app import counters
+from app.commands.notice import warn_running_servers
+from app.extentions import cache, db
+
+
+@click.command('repair-counters')
+@click.option('--check', is_flag=True, help='Only report the counters that differ from a recount.')
+@with_appcontext
+def repair_counters(check):
+    """Recount users.books_count, users.companies_count and companies.books_count.
+
+    The handlers keep the counters as they go, this fixes the drift left by
+    writes that bypassed them (SQL run by hand, a restored backup).
+    """
+    drift = counters.drift(db.session)
+    for column, id, stored, counted in drift:
+        click.echo(f'{column} of {id}: stored {stored}, counted {counted}')
+    click.echo(f'{len(drift)} counters differ from a recount')
+    if check:
+        sys.exit(1 if drift else 0)
+
+    fixed = counters.repair(db.session)
+    db.session.commit()
+    if drift:
+        #cached representations embed the counters
+        cache.clear()
+    click.echo('Repaired ' + ', '.join(f'{count} {column}' for column, count in fixed.items()))
+    if drift:
+        warn_running_servers(new_rows=False)
@@ -0,0 +1,84 @@
+import re
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from app.extentions import db
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+
+
+#the statements the controllers issue on their hot paths, with representative values
+def controller_queries():
+    return {
+        'createBook title check': Book.query.filter_by(title='title'),
+        'createBook isbn check': Book.query.filter_by(isbn='isbn'),
+        'updateBookDetails title check': Book.query.filter_by(title='title', user_id=1),
+        'getBook': Book.query.filter_by(id=1),
+        'getAllBooks page': Book.query.filter(Book.id > 1).order_by(Book.id).limit(21),
+        'getAllBooks sort=price page': Book.query.filter((Book.price > 100) | ((Book.price == 100) & (Book.id > 1)))
+                                                .order_by(Book.price, Book.id).limit(21),
+        'getAllAuthors page': User.query.filter_by(user_type='author').filter(User.id > 1).order_by(User.id).limit(21),
+        'author books load': Book.query.filter(Book.user_id.in_([1, 2, 3])),
+        'author companies load': Company.query.filter(Company.user_id.in_([1, 2, 3])),
+        'company books': Book.query.filter_by(company_id=1),
+        'register email check': User.query.filter_by(email='someone@example.com'),
+        'register contact check': User.query.filter_by(contact='0700000000'),
+        'getCompany': Company.query.filter_by(id=1),
+    }
+
+
+def _compile(query):
+    return str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+
+
+#returns the tables each plan reads without an index, empty when the plan is fine
+def full_scans(connection, sql):
+    dialect = connection.dialect.name
+
+    if dialect == 'sqlite':
+        plan = connection.execute(text('EXPLAIN QUERY PLAN ' + sql)).mappings().all()
+        scans = []
+        for row in plan:
+            match = re.match(r'SCAN (?:TABLE )?(\w+)', row['detail'])
+            if match and 'USING' not in row['detail']:
+                scans.append(match.group(1))
+        return scans
+
+    if dialect == 'mysql':
+        plan = connection.execute(text('EXPLAIN ' + sql)).mappings().all()
+        return [row['table'] for row in plan if row['type'] == 'ALL']
+
+    raise click.ClickException(f'EXPLAIN check is not supported on {dialect}')
+
+
+@click.command('check-indexes')
+@click.option('--analyze/--no-analyze', default=True, help='Refresh planner statistics first.')
+@with_appcontext
+def check_indexes(analyze):
+    """EXPLAIN the controller queries and fail on any full table scan.
+
+    Run it against a seeded database: on near empty tables the planner
+    may prefer a scan even when an index exists.
+    """
+    failures = 0
+
+    with db.engine.connect() as connection:
+        if analyze:
+            if connection.dialect.name == 'mysql':
+                connection.execute(text('ANALYZE TABLE users, companies, books'))
+            else:
+                connection.execute(text('ANALYZE'))
+
+        for name, query in controller_queries().items():
+            scans = full_scans(connection, _compile(query))
+            if scans:
+                failures += 1
+                click.echo(f'FULL SCAN  {name}: {", ".join(scans)}')
+            else:
+                click.echo(f'ok         {name}')
+
+    if failures:
+        raise click.ClickException(f'{failures} queries fall back to a full table scan')
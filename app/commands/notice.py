@@ -0,0 +1,16 @@
+import click
+
+from app.extentions import cache, search
+
+
+#the bulk commands write behind the running servers, what those keep in process
+#memory (a 'memory' cache, the 'memory' search index) only catches up on a restart
+#new_rows: rows the search index would have to see, not only changed counters
+def warn_running_servers(new_rows=True):
+    stale = []
+    if not cache.shared:
+        stale.append("the cache (CACHE_BACKEND 'memory') keeps serving old entries for up to CACHE_TTL")
+    if new_rows and search.backend.name == 'memory':
+        stale.append("the in-process search index misses the new rows")
+    if stale:
+        click.echo('Restart the running app servers: ' + ', '.join(stale), err=True)
@@ -0,0 +1,20 @@
+import click
+from flask.cli import AppGroup
+
+from app.extentions import search as search_engine
+
+
+search_cli = AppGroup('search', help='Full text search index.')
+
+
+@search_cli.command('rebuild')
+def rebuild():
+    """Rebuild the search index from the users and books tables."""
+    search_engine.rebuild()
+    click.echo(f'Search index rebuilt ({search_engine.backend.name})')
+
+
+@search_cli.command('backend')
+def backend():
+    """Show which search backend is in use."""
+    click.echo(search_engine.backend.name)
@@ -0,0 +1,49 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from app.commands.notice import warn_running_servers
+from app.extentions import db
+from app.models.book_stats import BookStat
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+from app.seeding import Seeder, seeded_email
+
+
+@click.command('seed')
+@click.option('--books', default=10000, show_default=True, help='Books to create.')
+@click.option('--users', type=int, help='Users to create, defaults to one per 10 books.')
+@click.option('--companies', type=int, help='Companies to create, defaults to one per 50 books.')
+@click.option('--seed', 'seed_', default=0, show_default=True, help='Random seed, the same seed gives the same rows.')
+@click.option('--password', default='password123', show_default=True, help='Password of every seeded user.')
+@click.option('--admins', default=1, show_default=True, help='How many of the seeded users are admins.')
+@click.option('--skew', default=0.8, show_default=True, help='Zipf exponent of books per author and per company.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per insert and commit.')
+@click.option('--truncate', is_flag=True, help='Delete every book, company and user first.')
+@click.option('--yes', is_flag=True, help='Do not ask before --truncate.')
+@with_appcontext
+def seed(books, users, companies, seed_, password, admins, skew, batch_size, truncate, yes):
+    """Bulk insert synthetic users, companies and books for load tests."""
+    users = max(1, books // 10) if users is None else users
+    companies = max(1, books // 50) if companies is None else companies
+
+    if truncate:
+        if not yes:
+            click.confirm(f'Delete every book, company and user in {db.engine.url.render_as_string(hide_password=True)}?', abort=True)
+        for table in (BookStat.__table__, Book.__table__, Company.__table__, User.__table__):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+    started = time.monotonic()
+    seeder = Seeder(users, companies, books, seed=seed_, password=password, admins=admins, skew=skew, batch_size=batch_size, progress=click.echo)
+    try:
+        first = seeder.run()
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    click.echo(f'Seeded {users} users, {companies} companies and {books} books in {time.monotonic() - started:.1f}s')
+    warn_running_servers()
+    if users:
+        click.echo(f'Log in as {seeded_email(first["users"])} with password {password!r}')
@@ -0,0 +1,128 @@
+import gzip
+import zlib
+
+from flask import current_app, request
+
+
+#response compression
+#Bodies of COMPRESSION_MIMETYPES responses are gzip or brotli encoded, whichever the
+#client prefers (brotli only with the brotli package installed). Buffered bodies
+#under COMPRESSION_MIN_SIZE bytes go out as they are, streamed ones (NDJSON listings)
+#are compressed chunk by chunk and flushed so every chunk still reaches the client
+#as it is produced. Cached single resources keep their compressed bytes next to the
+#ETag (app/conditional.py) so a hit is not compressed again.
+#An encoded response carries a weak ETag: the bytes differ, the representation does not.
+
+
+ENCODINGS = ('br', 'gzip')
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def available_encodings():
+    return tuple(encoding for encoding in ENCODINGS if encoding != 'br' or _brotli() is not None)
+
+
+#the encoding to answer the current request with, None for identity
+def negotiate():
+    if not current_app.config['COMPRESSION_ENABLED']:
+        return None
+    accepted = request.accept_encodings
+    candidates = [encoding for encoding in available_encodings() if accepted[encoding]]
+    if not candidates:
+        return None
+    #the client's preference first, ours (ENCODINGS order) on a tie
+    return max(candidates, key=lambda encoding: (accepted[encoding], -ENCODINGS.index(encoding)))
+
+
+def compress(data, encoding):
+    config = current_app.config
+    if encoding == 'br':
+        return _brotli().compress(data, quality=config['COMPRESSION_BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=config['COMPRESSION_GZIP_LEVEL'], mtime=0)
+
+
+#every encoding of a body worth compressing, for the cache entries
+def compress_all(data):
+    if len(data) < current_app.config['COMPRESSION_MIN_SIZE'] or not current_app.config['COMPRESSION_ENABLED']:
+        return {}
+    return {encoding: compress(data, encoding) for encoding in available_encodings()}
+
+
+#the compressor is set up here, the chunks are read after the request has ended
+def compress_stream(chunks, encoding):
+    config = current_app.config
+    if encoding == 'br':
+        compressor = _brotli().Compressor(quality=config['COMPRESSION_BROTLI_QUALITY'])
+        write, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(config['COMPRESSION_GZIP_LEVEL'], zlib.DEFLATED, 31)
+        write, flush, finish = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+    def generate():
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = write(chunk) + flush()
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            #a client gone mid stream closes this generator, the wrapped one holds the request context
+            if hasattr(chunks, 'close'):
+                chunks.close()
+    return generate()
+
+
+def mark_encoded(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def _compressible(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304) or response.direct_passthrough:
+        return False
+    if 'Content-Encoding' in response.headers or 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return response.mimetype in current_app.config['COMPRESSION_MIMETYPES']
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESSION_ENABLED', True)
+    app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESSION_GZIP_LEVEL', 6)
+    app.config.setdefault('COMPRESSION_BROTLI_QUALITY', 5)
+    app.config.setdefault('COMPRESSION_MIMETYPES', ['application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html'])
+
+    @app.after_request
+    def compress_response(response):
+        if not _compressible(response):
+            return response
+
+        #the body depends on Accept-Encoding whether or not this one is encoded
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config['COMPRESSION_MIN_SIZE']:
+                return response
+            response.set_data(compress(data, encoding))
+
+        mark_encoded(response, encoding)
+        return response
@@ -0,0 +1,127 @@
+import hashlib
+from collections import namedtuple
+
+from flask import Response, current_app, request
+from sqlalchemy import func, select
+
+from app.compression import compress_all, negotiate
+from app.extentions import db
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+from app.status_codes import HTTP_304_NOT_MODIFIED
+
+
+#validators for conditional GETs on single resources
+#The version of a resource is read with one small query over the timestamp columns
+#of the row and of the related rows it embeds, so a 304 costs no loading or serialization.
+#The counters (app/counters.py) are part of it, they change without touching updated_at.
+#The version also names the cache tags of the rows the representation is built from.
+
+
+Version = namedtuple('Version', ['stamps', 'tags'])
+
+#a serialized response as kept in the cache, encoded holds its compressed bodies by
+#Content-Encoding (empty for small ones), entries cached before it existed have None
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'modified', 'encoded'], defaults=(None,))
+
+
+def _row_version(model):
+    return func.coalesce(model.updated_at, model.created_at)
+
+
+def book_version(book_id):
+    row = db.session.execute(
+        select(Book.company_id, Book.user_id, _row_version(Book), _row_version(Company), _row_version(User),
+               Company.books_count, User.books_count, User.companies_count)
+        .outerjoin(Company, Company.id == Book.company_id)
+        .outerjoin(User, User.id == Book.user_id)
+        .where(Book.id == book_id)).first()
+    if not row:
+        return None
+    return Version(tuple(row[2:]), [f'book:{book_id}', f'company:{row[0]}', f'user:{row[1]}'])
+
+
+def company_version(company_id):
+    row = db.session.execute(
+        select(Company.user_id, _row_version(Company), _row_version(User), Company.books_count, User.books_count, User.companies_count)
+        .outerjoin(User, User.id == Company.user_id)
+        .where(Company.id == company_id)).first()
+    if not row:
+        return None
+    return Version(tuple(row[1:]), [f'company:{company_id}', f'user:{row[0]}'])
+
+
+#book and company writes also invalidate their user's tag, so the user entry only needs its own
+def user_version(user_id):
+    user = db.session.query(_row_version(User), User.books_count, User.companies_count).filter(User.id == user_id).first()
+    if not user:
+        return None
+
+    #counts catch deletions, the max catches inserts and edits
+    books = db.session.query(func.count(Book.id), func.max(_row_version(Book))).filter(Book.user_id == user_id).first()
+    companies = db.session.query(func.count(Company.id), func.max(_row_version(Company))).filter(Company.user_id == user_id).first()
+    return Version(tuple(user) + tuple(books) + tuple(companies), [f'user:{user_id}'])
+
+
+#cache key of one representation of a resource
+def resource_key(kind, resource_id):
+    return f'{kind}:{resource_id}:{request.args.get("fields", "")}:{request.args.get("include", "")}'
+
+
+#strong etag over the version and the representation the request asked for (?fields=, ?include=)
+def make_etag(version):
+    representation = (request.args.get('fields'), request.args.get('include'))
+    return hashlib.sha1(repr((version.stamps, representation)).encode('utf-8')).hexdigest()
+
+
+def last_modified(version):
+    timestamps = [value for value in version.stamps if hasattr(value, 'timestamp')]
+    return max(timestamps) if timestamps else None
+
+
+def is_not_modified(etag, modified):
+    #If-None-Match wins over If-Modified-Since when both are sent
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and modified:
+        return modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def add_validators(response, etag, modified, weak=False):
+    response.set_etag(etag, weak=weak)
+    if modified:
+        response.last_modified = modified
+    #responses depend on the bearer token, shared caches must not keep them
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag, modified, weak=False):
+    return add_validators(Response(status=HTTP_304_NOT_MODIFIED), etag, modified, weak)
+
+
+#the body is compressed once here, every hit reuses the bytes
+def cached_response(payload, etag, modified):
+    body = current_app.json.dumps(payload) + '\n'
+    return CachedResponse(body, etag, modified, compress_all(body.encode('utf-8')))
+
+
+#answer from a cache entry without touching the database
+def entry_response(entry):
+    #an encoding the entry lacks is left to the compression middleware
+    encoding = negotiate() if entry.encoded else None
+    if encoding not in (entry.encoded or {}):
+        encoding = None
+    weak = encoding is not None
+    if is_not_modified(entry.etag, entry.modified):
+        return not_modified(entry.etag, entry.modified, weak)
+
+    if encoding is None:
+        response = current_app.response_class(entry.body, mimetype='application/json')
+    else:
+        response = current_app.response_class(entry.encoded[encoding], mimetype='application/json')
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return add_validators(response, entry.etag, entry.modified, weak)
@@ -1,18 +1,26 @@
 from flask import Blueprint,request,jsonify
-from app.status_codes import HTTP_400_BAD_REQUEST,HTTP_409_CONFLICT,HTTP_500_INTERNAL_SERVER_ERROR,HTTP_201_CREATED,HTTP_401_UNAUTHORIZED,HTTP_200_OK 
+from app.status_codes import HTTP_400_BAD_REQUEST,HTTP_409_CONFLICT,HTTP_500_INTERNAL_SERVER_ERROR,HTTP_201_CREATED,HTTP_401_UNAUTHORIZED,HTTP_200_OK,HTTP_503_SERVICE_UNAVAILABLE
 import validators
 from app.models.users import User
-from app.extentions import db,bcrypt
-from flask_jwt_extended import create_access_token,create_refresh_token,jwt_required,get_jwt_identity
+from app.extentions import db,passwords,limiter
+from app.passwords import PasswordPoolBusy
+from app.ratelimit import client_ip,json_field
+from app.serializers import user_serializer,request_view,FieldsError
+from app.validation import check_password,ValidationError,PASSWORD_MAX_BYTES
+from flask_jwt_extended import create_access_token,create_refresh_token,get_jwt,get_jwt_identity
+from app.authorization import authorization_required,token_claims
 
 
 #auth blueprint
 auth = Blueprint('auth', __name__,url_prefix='/api/v1/auth')
 
+REGISTERED_FIELDS = ['id','first_name','last_name','email','contact','type','biography','created_at']
 
-#user registration
 
+#user registration
+#rate limited per client IP before any bcrypt work (RATELIMIT_LIMITS)
 @auth.route('/register',methods=['POST'])
+@limiter.limit('register', ip=client_ip)
 def register_user():
 
     #storing request values
@@ -25,6 +33,11 @@ def register_user():
     password = data.get('password')
     biography = data.get('biography','')if type == "author" else ''
 
+    try:
+        view = request_view(user_serializer, default_fields=REGISTERED_FIELDS)
+    except FieldsError as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
+
     #validations of the incoming request
     if not first_name or not last_name or not contact or not password or not email:
         return jsonify({'error':'All fields are required'}),HTTP_400_BAD_REQUEST
@@ -32,8 +45,10 @@ def register_user():
     if type == 'author' and not biography:
         return jsonify({'Error':'Enter your author biography'}),HTTP_400_BAD_REQUEST
     
-    if len(password) < 8:
-        return jsonify({'Error':'Password is too short'}),HTTP_400_BAD_REQUEST 
+    try:
+        check_password(password)
+    except ValidationError as e:
+        return jsonify({'Error':str(e)}),HTTP_400_BAD_REQUEST 
     
     if not validators.email(email):
         return jsonify({'error':'Email is invalid'}),HTTP_400_BAD_REQUEST 
@@ -46,7 +61,7 @@ def register_user():
     
     try:
         
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')#hashing the password
+        hashed_password = passwords.hash(password)#hashing the password, in the password pool
 
         #creating a new user
         new_user = User(first_name=first_name,last_name=last_name,password=hashed_password,email=email,contact=contact,biography=biography,user_type=type)
@@ -58,19 +73,12 @@ def register_user():
 
         return jsonify({
             'message': f"{username} has been created successfully as an {new_user.user_type}",
-            'user':{
-                'id':new_user.id,
-                'first_name':new_user.first_name,
-                'last_name':new_user.last_name,
-                'email':new_user.email,
-                'contact':new_user.contact,
-                'type':new_user.user_type,
-                'biography':new_user.biography,
-                'created_at':new_user.created_at
-
-            }
+            'user': view.dump(new_user)
             }),HTTP_201_CREATED 
 
+    except PasswordPoolBusy as e:
+        return jsonify({'error':str(e)}),HTTP_503_SERVICE_UNAVAILABLE,{'Retry-After':'1'}
+
     except Exception as e:
         db.session.rollback()
         return jsonify({'error':str(e)}),HTTP_500_INTERNAL_SERVER_ERROR
@@ -79,7 +87,10 @@ def register_user():
     
     
 #user login
+#rate limited per client IP and per email, a password guesser spread over many
+#addresses still runs out of tokens for the account it targets
 @auth.post('/login')
+@limiter.limit('login', ip=client_ip, email=json_field('email'))
 def login():
     email = request.json.get('email')
     password = request.json.get('password')
@@ -87,15 +98,26 @@ def login():
     try:
         if not password or not email:
             return jsonify({'message':'Email and password are required'}),HTTP_400_BAD_REQUEST
+
+        #a password bcrypt cannot check is a bad request, not a wrong password
+        if not isinstance(password, str) or len(password.encode('utf-8')) > PASSWORD_MAX_BYTES:
+            return jsonify({'message':f'Password must be a string of at most {PASSWORD_MAX_BYTES} bytes'}),HTTP_400_BAD_REQUEST
         
         user = User.query.filter_by(email=email).first()
         
         if user:
-            is_correct_password = bcrypt.check_password_hash(user.password, password)
+            is_correct_password = passwords.check(user.password, password)
             
             if is_correct_password:
-                access_token = create_access_token(identity=str(user.id))  # Convert to string
-                refresh_token = create_refresh_token(identity=str(user.id))
+                #the plain password is at hand only now, upgrade hashes made with another cost
+                if passwords.needs_rehash(user.password):
+                    user.password = passwords.hash(password)
+                    db.session.commit()
+
+                #role and token version ride along so protected handlers need no user query
+                claims = token_claims(user)
+                access_token = create_access_token(identity=str(user.id), additional_claims=claims)  # Convert to string
+                refresh_token = create_refresh_token(identity=str(user.id), additional_claims=claims)
                 return jsonify({
                     'user': {
                         'id': user.id,
@@ -113,6 +135,9 @@ def login():
         else:
             return jsonify({'message': 'Invalid email address'}), HTTP_401_UNAUTHORIZED
         
+    except PasswordPoolBusy as e:
+        return jsonify({'error': str(e)}), HTTP_503_SERVICE_UNAVAILABLE, {'Retry-After': '1'}
+
     except Exception as e:
         return jsonify({
             'error': str(e)
@@ -121,10 +146,12 @@ def login():
     
 
 @auth.route("token/refresh", methods=["POST"])
-@jwt_required(refresh=True)
+@authorization_required(refresh=True)
 def refresh():
     identity = get_jwt_identity()
-    access_token = create_access_token(identity=identity)
+    #the refresh token passed the version check, its claims are still current
+    claims = get_jwt()
+    access_token = create_access_token(identity=identity, additional_claims={'role':claims['role'],'ver':claims['ver']})
     return jsonify({'access_token':access_token})
 
 
@@ -1,93 +1,214 @@
-from flask import Blueprint,request,jsonify
+from flask import Blueprint,request,jsonify,current_app,Response,stream_with_context
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import query
 from app.status_codes import HTTP_400_BAD_REQUEST,HTTP_409_CONFLICT,HTTP_500_INTERNAL_SERVER_ERROR,HTTP_201_CREATED,HTTP_401_UNAUTHORIZED,HTTP_200_OK,HTTP_404_NOT_FOUND,HTTP_403_FORBIDDEN
 import validators
 from app.models.books import Book
 from app.models.companies import Company
-from app.models.users import User
-from app.extentions import db,bcrypt
-from flask_jwt_extended import create_access_token,create_refresh_token,jwt_required,get_jwt_identity
+from app.extentions import db,bcrypt,search,cache
+from app import book_stats
+from app.pagination import paginate,page_meta,get_page_limit,get_offset,offset_meta,PaginationError
+from app.streaming import wants_stream,stream_collection,NDJSON
+from app.catalog import EXPORT_FORMATS,iter_export_rows,export_chunks,gzip_chunks
+from app.conditional import book_version,resource_key,make_etag,last_modified,is_not_modified,not_modified,cached_response,entry_response
+from app.routing import use_primary
+from app.authorization import authorization_required,current_principal
+from app.serializers import book_serializer,request_view,FieldsError
+from app.validation import book_values,ValidationError
+from flask_jwt_extended import create_access_token,create_refresh_token,jwt_required
 
 #books blueprint
 books= Blueprint('books', __name__,url_prefix='/api/v1/books')
 
 #creating a book
 @books.route('/create',methods=['POST'])
-@jwt_required()
+@authorization_required()
 def createBook():
 
     #storing request data
     data = request.get_json()
-    title = data.get('title')
-    pages = data.get('pages')
-    genre = data.get('genre')
-    price = data.get('price')
-    price_unit = data.get('price_unit')
-    isbn = data.get('isbn')
-    description = data.get('description')
-    image = data.get('image')
-    publication_date = data.get('publication_date')
-    company_id = data.get('company_id')
-    user_id = get_jwt_identity()
-
-
-    #validations of the incoming request data
-    if not title or not pages or not description or not price or not publication_date or not isbn or not price_unit or not not genre or not company_id:
-        return jsonify({'error':'All fields are required'}),HTTP_400_BAD_REQUEST
-
-    if Book.query.filter_by(title=title).first() is not None:
+    user_id = current_principal().id
+
+
+    try:
+        view = request_view(book_serializer, default_include=('company','author'))
+        #validations of the incoming request data
+        values = book_values(data, user_id)
+    except (FieldsError,ValidationError) as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
+
+    title = values['title']
+
+    if Book.query.filter_by(title=title,user_id=values['user_id']).first() is not None:
         return jsonify({'error':'Book with this title and User ID already exists'}),HTTP_400_BAD_REQUEST
     
-    if Book.query.filter_by(isbn=isbn).first() is not None:
+    if Book.query.filter_by(isbn=values['isbn']).first() is not None:
         return jsonify({'error':'Book isbn already in use'}),HTTP_400_BAD_REQUEST
     
     try:
 
        #creating a new book
-        new_book = Book(title=title,description=description,pages=pages,genre=genre,price=price,price_unit=price_unit,
-                        publication_date=publication_date,company_id=company_id,user_id=user_id,isbn=isbn,image=image)
+        new_book = Book(**values)
         db.session.add(new_book)
+        book_stats.record(db.session, added=[values])
         db.session.commit()
+        cache.invalidate(f'user:{new_book.user_id}', f'company:{new_book.company_id}')
 
         return jsonify({
             'message': title + ' has been created successfully as an ',
-            'book':{
-                 'title':new_book.title,
-                 'pages':new_book.pages,
-                 'price':new_book.price,
-                 'price_unit':new_book.price_unit,
-                 'publication_date':new_book.publication_date,
-                 'description':new_book.description,
-                 'image':new_book.image,
-                 'genre':new_book.genre,
-                 'isbn':new_book.isbn,
-                 'created_at':new_book.created_at,
-                 'company':{
-                     'id':new_book.company.id,
-                     'name':new_book.company.first_name,
-                     'origin':new_book.company.origin,
-                     'description':new_book.company.description,
-                     'created_at':new_book.created_at
-                 },
-                 'author':{
-                          'first_name':new_book.user.first_name,
-                          'last_name':new_book.user.last_name,
-                           'username':new_book.user.get_full_name(),
-                           'email':new_book.user.email,
-                           'contact':new_book.user.contact,
-                           'type':new_book.user.user_type,
-                           'biography':new_book.user.biography,
-                           'created_at':new_book.user.created_at,
-                 }
-  
-            }
+            'book': view.dump(new_book)
             }),HTTP_201_CREATED 
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'error':str(e)}),HTTP_500_INTERNAL_SERVER_ERROR
+
+
+#creating many books at once
+#The body is an array of books as createBook takes them. Titles, ISBNs and companies
+#are checked with one IN query each and the valid books go in with a single
+#executemany, every item gets its own result: created, conflict or invalid.
+@books.route('/bulk',methods=['POST'])
+@authorization_required()
+def createBooks():
+
+    items = request.get_json()
+    user_id = current_principal().id
+    max_items = current_app.config.get('BULK_MAX_ITEMS', 1000)
+
+    if not isinstance(items, list) or not items:
+        return jsonify({'error':'Send a non empty array of books'}),HTTP_400_BAD_REQUEST
+
+    if len(items) > max_items:
+        return jsonify({'error':f'At most {max_items} books per request'}),HTTP_400_BAD_REQUEST
+
+    results = [None] * len(items)
+    candidates = {}  #index -> column values
+    for index, item in enumerate(items):
+        try:
+            candidates[index] = book_values(item, user_id)
+        except ValidationError as e:
+            results[index] = {'index':index,'status':'invalid','error':str(e)}
+
+    try:
+        titles = {values['title'] for values in candidates.values()}
+        isbns = {values['isbn'] for values in candidates.values()}
+        company_ids = {values['company_id'] for values in candidates.values()}
+
+        taken_titles = set(db.session.scalars(select(Book.title).where(Book.user_id == user_id, Book.title.in_(titles)))) if titles else set()
+        taken_isbns = set(db.session.scalars(select(Book.isbn).where(Book.isbn.in_(isbns)))) if isbns else set()
+        companies = set(db.session.scalars(select(Company.id).where(Company.id.in_(company_ids)))) if company_ids else set()
+
+        rows = []
+        for index, values in candidates.items():
+            if values['company_id'] not in companies:
+                results[index] = {'index':index,'status':'invalid','error':'Company not found'}
+            elif values['title'] in taken_titles:
+                results[index] = {'index':index,'status':'conflict','error':'Book with this title and User ID already exists'}
+            elif values['isbn'] in taken_isbns:
+                results[index] = {'index':index,'status':'conflict','error':'Book isbn already in use'}
+            else:
+                #later duplicates inside the same payload conflict with the first one
+                taken_titles.add(values['title'])
+                taken_isbns.add(values['isbn'])
+                rows.append((index, values))
+
+        if rows:
+            #one executemany, the driver sends it as a multi-row INSERT
+            db.session.execute(Book.__table__.insert(), [values for _, values in rows])
+            #MySQL has no INSERT ... RETURNING, the unique ISBNs map the rows back to their ids
+            ids = dict(db.session.execute(select(Book.isbn, Book.id).where(Book.isbn.in_([values['isbn'] for _, values in rows]))).all())
+            book_stats.record(db.session, added=[values for _, values in rows])
+            db.session.commit()
+
+            for index, values in rows:
+                results[index] = {'index':index,'status':'created','id':ids[values['isbn']],'title':values['title']}
+
+            #the Core insert bypasses the session, tell the search index and the cache
+            search.refresh('books', ids.values())
+            cache.invalidate(f'user:{user_id}', *{f'company:{values["company_id"]}' for _, values in rows})
+
+    except IntegrityError:
+        #a concurrent request took one of the titles or ISBNs between the checks and the insert
+        db.session.rollback()
+        return jsonify({'error':'A title or ISBN was taken while the books were being created, nothing was saved'}),HTTP_409_CONFLICT
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error':str(e)}),HTTP_500_INTERNAL_SERVER_ERROR
+
+    counts = {status: sum(1 for result in results if result['status'] == status) for status in ('created','conflict','invalid')}
+    return jsonify({
+        'message': f"{counts['created']} of {len(items)} books have been created",
+        'counts': counts,
+        'results': results
+    }),HTTP_201_CREATED if counts['created'] else HTTP_200_OK
     
 
+#exporting the whole catalog
+#?format=ndjson (default) or csv, gzip encoded when the client accepts it
+@books.get('/export')
+@authorization_required()
+def exportBooks():
+
+    format = request.args.get('format','ndjson')
+    if format not in EXPORT_FORMATS:
+        return jsonify({'error':'format must be one of: ' + ', '.join(EXPORT_FORMATS)}),HTTP_400_BAD_REQUEST
+
+    chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 10000)
+    chunks = export_chunks(format, iter_export_rows(chunk_size))
+    mimetype = 'text/csv' if format == 'csv' else NDJSON
+
+    headers = {'Content-Disposition': f'attachment; filename=books.{format}', 'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
+#book counts per genre, company and author and prices per price unit, for dashboards
+#Read from the book_stats summary table (app/book_stats.py), ?limit= caps the values
+#of each dimension, the ones with the most books come first
+@books.get('/stats')
+@jwt_required()
+def bookStats():
+
+    try:
+
+        limit = get_page_limit()
+
+        def counts(dimension, name, convert=str):
+            return [{name: convert(stat.value), 'books': stat.book_count} for stat in book_stats.top(db.session, dimension, limit)]
+
+        prices = [{
+            'price_unit': stat.value,
+            'books': stat.book_count,
+            'total': stat.price_total,
+            'average': round(stat.price_total / stat.book_count, 2),
+            'min': stat.price_min,
+            'max': stat.price_max,
+        } for stat in book_stats.top(db.session, 'price_unit', limit)]
+
+        return jsonify({
+            "message":"Book statistics retrieved successfully",
+            "total_books": book_stats.total_books(db.session),
+            "genres": counts('genre', 'genre'),
+            "companies": counts('company', 'company_id', int),
+            "authors": counts('author', 'author_id', int),
+            "prices": prices
+        }),HTTP_200_OK
+
+    except PaginationError as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
+
+    except Exception as e:
+        return jsonify({
+            'error':str(e)
+        }),HTTP_500_INTERNAL_SERVER_ERROR
+
+
   #Getting all books 
 @books.get('/')
 @jwt_required()
@@ -95,40 +216,25 @@ def getAllBooks():
     
     try:
 
-        all_books = Book.query.all()
-
-        books_data = []
-
-        for book in all_books:
-            book_info = {
-                 'title':book.title,
-                 'pages':book.pages,
-                 'price':book.price,
-                 'price_unit':book.price_unit,
-                 'publication_date':book.publication_date,
-                 'description':book.description,
-                 'image':book.image,
-                 'genre':book.genre,
-                 'isbn':book.isbn,
-                 'created_at':book.created_at,
-                 'company':{
-                     'id':book.company.id,
-                     'name':book.company.first_name,
-                     'origin':book.company.origin,
-                     'description':book.company.description,
-                     'created_at':book.created_at
-                    },
-                }
+        view = request_view(book_serializer, default_include=('company',))
+
+        if wants_stream():
+            return stream_collection(Book.query, Book, view, 'books', "All books retrieved successfully")
+
+        page = paginate(Book.query.options(*view.load_options()), Book, allowed_sorts=('created_at','price','title'))
+
+        books_data = [view.dump(book) for book in page.items]
 
         return jsonify({
             "message":"All books retrieved successfully",
             "total_books": len(books_data),
-            "books": books_data
-
-            
+            "books": books_data,
+            "pagination": page_meta(page)
 
         }),HTTP_200_OK
              
+    except (PaginationError,FieldsError) as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
 
     except Exception as e:
         return jsonify({
@@ -136,6 +242,48 @@ def getAllBooks():
         }),HTTP_500_INTERNAL_SERVER_ERROR
     
 
+  #Search books by title, description and genre
+@books.get('/search')
+@jwt_required()
+def searchBooks():
+
+    try:
+
+        search_query = request.args.get('query','')
+        limit = get_page_limit()
+        offset = get_offset()
+
+        book_ids = search.search('books', search_query, offset=offset, limit=limit + 1)
+        has_more = len(book_ids) > limit
+        book_ids = book_ids[:limit]
+
+        view = request_view(book_serializer, default_include=('company',))
+        found = Book.query.filter(Book.id.in_(book_ids)).options(*view.load_options()).all()
+        by_id = {book.id: book for book in found}
+        results = [by_id[book_id] for book_id in book_ids if book_id in by_id]
+
+        if len(results) == 0:
+            return jsonify({'message':'No results found'}),HTTP_404_NOT_FOUND
+
+        books_data = [view.dump(book) for book in results]
+
+        return jsonify({
+            "message":f'Books matching {search_query} retrieved successfully',
+            "total_search": len(books_data),
+            "search_result": books_data,
+            "pagination": offset_meta(offset, limit, has_more)
+
+        }),HTTP_200_OK
+
+    except (PaginationError,FieldsError) as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
+
+    except Exception as e:
+        return jsonify({
+            'error':str(e)
+        }),HTTP_500_INTERNAL_SERVER_ERROR
+
+
    #Get book by id
 @books.get('/book/<int:id>')
 @jwt_required()
@@ -143,46 +291,38 @@ def getBook(id):
 
     try:
 
-        book = Book.query.filter_by(id=id).first()
-        
-        if not book:
-            return jsonify({"error":"Book not found"}),HTTP_404_NOT_FOUND
+        view = request_view(book_serializer, default_include=('company','author'))
 
-        return jsonify({
-            "message":"Book details retrieved successfully",
+        #a cached representation answers without any query, conditional or not
+        key = resource_key('book', id)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry_response(entry)
+
+        #the fill path reads the primary, a replica row would be cached past its invalidation
+        with use_primary():
+            version = book_version(id)
+            if not version:
+                return jsonify({"error":"Book not found"}),HTTP_404_NOT_FOUND
+
+            etag, modified = make_etag(version), last_modified(version)
+            if is_not_modified(etag, modified):
+                return not_modified(etag, modified)
+
+            book = Book.query.options(*view.load_options()).filter_by(id=id).first()
         
-            "Book":{
-               'title':book.title,
-                 'pages':book.pages,
-                 'price':book.price,
-                 'price_unit':book.price_unit,
-                 'publication_date':book.publication_date,
-                 'description':book.description,
-                 'image':book.image,
-                 'genre':book.genre,
-                 'isbn':book.isbn,
-                 'created_at':book.created_at,
-                 'company':{
-                     'id':book.company.id,
-                     'name':book.company.first_name,
-                     'origin':book.company.origin,
-                     'description':book.company.description,
-                     'created_at':book.created_at
-                 },
-                 'author':{
-                          'first_name':book.user.first_name,
-                          'last_name':book.user.last_name,
-                           'username':book.user.get_full_name(),
-                           'email':book.user.email,
-                           'contact':book.user.contact,
-                           'type':book.user.user_type,
-                           'biography':book.user.biography,
-                           'created_at':book.user.created_at,
-                 }
-  
-            }
-            }),HTTP_201_CREATED 
+            if not book:
+                return jsonify({"error":"Book not found"}),HTTP_404_NOT_FOUND
+
+            entry = cache.set(key, cached_response({
+                "message":"Book details retrieved successfully",
+                "Book": view.dump(book)
+                }, etag, modified), tags=version.tags)
+            return entry_response(entry)
              
+    except FieldsError as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
+
     except Exception as e:
         return jsonify({
             'error':str(e)
@@ -191,13 +331,12 @@ def getBook(id):
 
     #update book details
 @books.route('/edit/<int:id>',methods=['PUT','PATCH'])
-@jwt_required()
+@authorization_required()
 def updateBookDetails(id):
 
     try:
 
-        current_user = get_jwt_identity()
-        loggedInUser = User.query.filter_by(id=current_user).first()
+        current_user = current_principal()
          
          #get book by id
         book = Book.query.filter_by(id=id).first()
@@ -205,12 +344,14 @@ def updateBookDetails(id):
         if not book:
             return jsonify({"error":"Book not found"}),HTTP_404_NOT_FOUND
         
-        elif loggedInUser.user_type!='admin' and book.user_id!=current_user:
+        elif not current_user.may_edit(book.user_id):
             return jsonify({'error':'You are not authorised to update the book details'}),HTTP_403_FORBIDDEN
         
         else:
+             view = request_view(book_serializer, default_include=('company','author'))
+
              #Store request data
-             title = request.get_json().get('title',book.tile)
+             title = request.get_json().get('title',book.title)
              pages = request.get_json().get('pages',book.pages)
              price = request.get_json().get('price',book.price)
              publication_date = request.get_json().get('publication_date',book.publication_date)
@@ -227,12 +368,13 @@ def updateBookDetails(id):
                       'error':'ISBN already in use'
                   }),HTTP_409_CONFLICT
              
-             if title!= book.isbn and Book.query.filter_by(title=title,user_id=current_user).first():
+             if title!= book.title and Book.query.filter_by(title=title,user_id=current_user.id).first():
                   return jsonify({
                       'error':'Title already in use'
                   }),HTTP_409_CONFLICT
 
 
+             before = book_stats.snapshot(book)
              book.title = title
              book.pages = pages
              book.price = price
@@ -243,43 +385,22 @@ def updateBookDetails(id):
              book.publication_date = publication_date
              book.company_id = company_id
              book.description = description
+
+             after = book_stats.snapshot(book)
+             if after != before:
+                 book_stats.record(db.session, added=[after], removed=[before])
              
              db.session.commit()
+             cache.invalidate(f'book:{book.id}', f'user:{book.user_id}', f'company:{before["company_id"]}', f'company:{book.company_id}')
              
              return jsonify({
                 'message':title + " 's details have been successfully updated",
-                "book":{
-                     'title':book.title,
-                 'pages':book.pages,
-                 'price':book.price,
-                 'price_unit':book.price_unit,
-                 'publication_date':book.publication_date,
-                 'description':book.description,
-                 'image':book.image,
-                 'genre':book.genre,
-                 'isbn':book.isbn,
-                 'created_at':book.created_at,
-                 'company':{
-                     'id':book.company.id,
-                     'name':book.company.first_name,
-                     'origin':book.company.origin,
-                     'description':book.company.description,
-                     'created_at':book.created_at
-                 },
-                 'author':{
-                          'first_name':book.user.first_name,
-                          'last_name':book.user.last_name,
-                           'username':book.user.get_full_name(),
-                           'email':book.user.email,
-                           'contact':book.user.contact,
-                           'type':book.user.user_type,
-                           'biography':book.user.biography,
-                           'created_at':book.user.created_at,
-                 }
-  
-                 }
+                "book": view.dump(book)
              })
 
+    except FieldsError as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
+
     except Exception as e:
         return jsonify({
             'error':str(e)
@@ -288,12 +409,11 @@ def updateBookDetails(id):
     
        #Deleting a book
 @books.route('/delete/<int:id>',methods=['DELETE'])
-@jwt_required()
+@authorization_required()
 def deleteBook(id): 
 
     try:
-        current_user = get_jwt_identity()
-        loggedInUser = User.query.filter_by(id=current_user).first()
+        current_user = current_principal()
          
          #get book by id
         book = Book.query.filter_by(id=id).first()
@@ -301,13 +421,17 @@ def deleteBook(id):
         if not book:
             return jsonify({"error":"Book not found"}),HTTP_404_NOT_FOUND
         
-        elif loggedInUser.user_type!='admin' and book.user_id!=current_user: 
+        elif not current_user.may_edit(book.user_id): 
             return jsonify({'error':'You are not authorised to delete the book details'}),HTTP_403_FORBIDDEN
         
         else:
 
+            tags = [f'book:{book.id}', f'user:{book.user_id}', f'company:{book.company_id}']
+            removed = book_stats.snapshot(book)
             db.session.delete(book)
+            book_stats.record(db.session, removed=[removed])
             db.session.commit()
+            cache.invalidate(*tags)
 
 
             return jsonify({'message':'Book has been deleted successfully'})
@@ -1,29 +1,42 @@
 from flask import Blueprint,request,jsonify
+from sqlalchemy import select
 from app.status_codes import HTTP_400_BAD_REQUEST,HTTP_409_CONFLICT,HTTP_500_INTERNAL_SERVER_ERROR,HTTP_201_CREATED,HTTP_401_UNAUTHORIZED,HTTP_200_OK,HTTP_404_NOT_FOUND,HTTP_403_FORBIDDEN
 import validators
 from app.models.companies import Company
-from app.models.users import User
-from app.extentions import db,bcrypt
-from flask_jwt_extended import create_access_token,create_refresh_token,jwt_required,get_jwt_identity
+from app.models.books import Book
+from app.extentions import db,search,cache
+from app import book_stats,counters
+from app.pagination import paginate,page_meta,PaginationError
+from app.streaming import wants_stream,stream_collection
+from app.conditional import company_version,resource_key,make_etag,last_modified,is_not_modified,not_modified,cached_response,entry_response
+from app.routing import use_primary
+from app.authorization import authorization_required,current_principal
+from app.serializers import company_serializer,request_view,FieldsError
+from app.validation import company_values,ValidationError
+from flask_jwt_extended import create_access_token,create_refresh_token,jwt_required
 
 #company blueprint
 companies= Blueprint('companies', __name__,url_prefix='/api/v1/companies')
 
+CREATED_FIELDS = ['id','name','origin','description']
+
 #creating companies
 @companies.route('/create',methods=['POST'])
-@jwt_required()
+@authorization_required()
 def createCompany():
 
     #storing request values
     data = request.json
-    name = data.get('name')
-    origin = data.get('origin')
-    description = data.get('description')
-    user_id = get_jwt_identity()
+    user_id = current_principal().id
+
+    try:
+        view = request_view(company_serializer, default_fields=CREATED_FIELDS)
+        #validations of the incoming request
+        values = company_values(data, user_id)
+    except (FieldsError,ValidationError) as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
 
-    #validations of the incoming request
-    if not name or not origin or not description:
-        return jsonify({'error':'All fields are required'}),HTTP_400_BAD_REQUEST
+    name = values['name']
 
     if Company.query.filter_by(name=name).first() is not None:
         return jsonify({'error':'Company name already in use'}),HTTP_400_BAD_REQUEST
@@ -31,19 +44,15 @@ def createCompany():
     try:
 
        #creating a new company
-        new_company = Company(name=name,description=description,origin=origin,user_id=user_id)
+        new_company = Company(**values)
         db.session.add(new_company)
+        counters.companies_added(db.session, {new_company.user_id: 1})
         db.session.commit()
+        cache.invalidate(f'user:{new_company.user_id}')
 
         return jsonify({
             'message': name + ' has been created successfully as an ',
-            'company':{
-                'id':new_company.id,
-                'name':new_company.name,
-                'origin':new_company.origin,
-                'description':new_company.description,
-
-            }
+            'company': view.dump(new_company)
             }),HTTP_201_CREATED 
 
     except Exception as e:
@@ -58,42 +67,26 @@ def getAllCompanies():
     
     try:
 
-        all_companies = Company.query.all()
-
-        companies_data = []
-
-        for company in all_companies:
-            company_info = {
-                'id':company.id,
-                'name':company.first_name,
-                'origin':company.origin,
-                'description':company.description,
-                'user':{
-                     'id':company.id,
-                     'first_name':company.first_name,
-                     'last_name':company.last_name,
-                      'username':company.get_full_name(),
-                      'email':company.email,
-                      'contact':company.contact,
-                      'type':company.user_type,
-                      'biography':company.biography,
-                      'created_at':company.user.created_at
-                },
-                'created_at':company.created_at
-                
-            }
-            companies_data.append(company_info)
+        view = request_view(company_serializer, default_include=('user',))
+
+        if wants_stream():
+            return stream_collection(Company.query, Company, view, 'companies', "All companies retrieved successfully")
+
+        page = paginate(Company.query.options(*view.load_options()), Company, allowed_sorts=('created_at','name'))
+
+        companies_data = [view.dump(company) for company in page.items]
 
 
         return jsonify({
             "message":"All companies retrieved successfully",
             "total_companies": len(companies_data),
-            "companies": companies_data
-
-            
+            "companies": companies_data,
+            "pagination": page_meta(page)
 
         }),HTTP_200_OK
              
+    except (PaginationError,FieldsError) as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
 
     except Exception as e:
         return jsonify({
@@ -107,35 +100,39 @@ def getCompany(id):
 
     try:
 
-        company = Company.query.filter_by(id=id).first()
-        
-        if not company:
-            return jsonify({"error":"Company not found"}),HTTP_404_NOT_FOUND
+        view = request_view(company_serializer, default_include=('user',))
 
-        return jsonify({
-            "message":"Company details retrieved successfully",
+        #a cached representation answers without any query, conditional or not
+        key = resource_key('company', id)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry_response(entry)
+
+        #the fill path reads the primary, a replica row would be cached past its invalidation
+        with use_primary():
+            version = company_version(id)
+            if not version:
+                return jsonify({"error":"Company not found"}),HTTP_404_NOT_FOUND
+
+            etag, modified = make_etag(version), last_modified(version)
+            if is_not_modified(etag, modified):
+                return not_modified(etag, modified)
+
+            company = Company.query.options(*view.load_options()).filter_by(id=id).first()
         
-            "company":{
-                     'id':company.id,
-                     'name':company.first_name,
-                      'origin':company.origin,
-                      'description':company.description,
-                     'user':{
-                     'id':company.id,
-                     'first_name':company.first_name,
-                     'last_name':company.last_name,
-                      'username':company.get_full_name(),
-                      'email':company.email,
-                      'contact':company.contact,
-                      'type':company.user_type,
-                      'biography':company.biography,
-                      'created_at':company.user.created_at
-                },
-                'created_at':company.created_at
-            }
+            if not company:
+                return jsonify({"error":"Company not found"}),HTTP_404_NOT_FOUND
 
-        }),HTTP_200_OK
+            entry = cache.set(key, cached_response({
+                "message":"Company details retrieved successfully",
+                "company": view.dump(company)
+
+            }, etag, modified), tags=version.tags)
+            return entry_response(entry)
              
+    except FieldsError as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
+
     except Exception as e:
         return jsonify({
             'error':str(e)
@@ -144,13 +141,12 @@ def getCompany(id):
     
  #update company details
 @companies.route('/edit/<int:id>',methods=['PUT','PATCH'])
-@jwt_required()
+@authorization_required()
 def updateCompanyDetails(id):
 
     try:
 
-        current_user = get_jwt_identity()
-        loggedInUser = User.query.filter_by(id=current_user).first()
+        current_user = current_principal()
          
          #get company by id
         company = Company.query.filter_by(id=id).first()
@@ -158,10 +154,12 @@ def updateCompanyDetails(id):
         if not company:
             return jsonify({"error":"Company not found"}),HTTP_404_NOT_FOUND
         
-        elif loggedInUser.user_type!='admin' and company.user_id!=current_user:
+        elif not current_user.may_edit(company.user_id):
             return jsonify({'error':'You are not authorised to update the company details'}),HTTP_403_FORBIDDEN
         
         else:
+             view = request_view(company_serializer, default_include=('user',))
+
              #Store request data
              name = request.get_json().get('name',company.name)
              origin = request.get_json().get('origin',company.origin)
@@ -172,29 +170,16 @@ def updateCompanyDetails(id):
              company.description = description
              
              db.session.commit()
+             cache.invalidate(f'company:{company.id}', f'user:{company.user_id}')
              
              return jsonify({
                 'message':name + " 's details have been successfully updated",
-                "company":{
-                     'id':company.id,
-                     'name':company.first_name,
-                     'origin':company.origin,
-                     'description':company.description,
-                     'user':{
-                     'id':company.id,
-                     'first_name':company.first_name,
-                     'last_name':company.last_name,
-                     'username':company.get_full_name(),
-                     'email':company.email,
-                     'contact':company.contact,
-                     'type':company.user_type,
-                     'biography':company.biography,
-                     'created_at':company.user.created_at
-                },
-                'created_at':company.created_at  
-                 }
+                "company": view.dump(company)
              })
 
+    except FieldsError as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
+
     except Exception as e:
         return jsonify({
             'error':str(e)
@@ -203,12 +188,11 @@ def updateCompanyDetails(id):
 
      #Deleting a company
 @companies.route('/delete/<int:id>',methods=['DELETE'])
-@jwt_required()
+@authorization_required()
 def deleteCompany(id):
 
     try:
-        current_user = get_jwt_identity()
-        loggedInUser = User.query.filter_by(id=current_user).first()
+        current_user = current_principal()
          
          #get company by id
         company= Company.query.filter_by(id=id).first()
@@ -216,17 +200,23 @@ def deleteCompany(id):
         if not company:
             return jsonify({"error":"Company not found"}),HTTP_404_NOT_FOUND
         
-        elif loggedInUser.user_type!='admin' and company.user_id!=current_user: 
+        elif not current_user.may_edit(company.user_id): 
             return jsonify({'error':'You are not authorised to delete the company details'}),HTTP_403_FORBIDDEN
         
         else:
 
-            #delete the associated books
-            for book in company.books:
-                db.session.delete(book)
+            #the owner and the authors of the company's books embed them
+            authors = db.session.scalars(select(Book.user_id).where(Book.company_id == company.id).distinct())
+            tags = {f'company:{company.id}', f'user:{company.user_id}'} | {f'user:{author}' for author in authors}
+            search.forget('books', select(Book.id).where(Book.company_id == company.id))
+            removed = book_stats.query_totals(db.session, Book.company_id == company.id)
 
+            #the database deletes the books with the company (ON DELETE CASCADE)
             db.session.delete(company)
+            book_stats.subtract(db.session, removed)
+            counters.companies_added(db.session, {company.user_id: -1})
             db.session.commit()
+            cache.invalidate(*tags)
 
 
             return jsonify({'message':'Company has been deleted successfully'})
@@ -0,0 +1,37 @@
+from flask import Blueprint,jsonify
+from app.status_codes import HTTP_200_OK,HTTP_403_FORBIDDEN
+from app.extentions import db,cache,limiter
+from app.database import pool_stats
+from app.routing import replica_status
+from app.authorization import authorization_required,current_principal
+
+#monitoring blueprint
+#admins only: the stats show pool internals, the replica url and cache keys
+monitoring = Blueprint('monitoring', __name__,url_prefix='/api/v1/monitoring')
+
+
+#cache hit/miss/eviction counters
+@monitoring.get('/cache')
+@authorization_required()
+def cacheStats():
+    if not current_principal().is_admin:
+        return jsonify({'error':'You are not authorised to view the cache stats'}),HTTP_403_FORBIDDEN
+    return jsonify({'cache':cache.stats()}),HTTP_200_OK
+
+
+#connection pool status plus checkout counts and wait times, and whether the replica is in use
+@monitoring.get('/pool')
+@authorization_required()
+def poolStats():
+    if not current_principal().is_admin:
+        return jsonify({'error':'You are not authorised to view the pool stats'}),HTTP_403_FORBIDDEN
+    return jsonify({'pool':pool_stats(db),'replica':replica_status(db)}),HTTP_200_OK
+
+
+#rate limiter backend, buckets in use and requests allowed / refused by this process
+@monitoring.get('/ratelimit')
+@authorization_required()
+def rateLimitStats():
+    if not current_principal().is_admin:
+        return jsonify({'error':'You are not authorised to view the rate limiter stats'}),HTTP_403_FORBIDDEN
+    return jsonify({'ratelimit':limiter.stats()}),HTTP_200_OK
@@ -1,42 +1,56 @@
 from flask import Blueprint,request,jsonify
-from app.status_codes import HTTP_400_BAD_REQUEST,HTTP_409_CONFLICT,HTTP_500_INTERNAL_SERVER_ERROR,HTTP_201_CREATED,HTTP_401_UNAUTHORIZED,HTTP_200_OK,HTTP_404_NOT_FOUND,HTTP_403_FORBIDDEN
+from app.status_codes import HTTP_400_BAD_REQUEST,HTTP_409_CONFLICT,HTTP_500_INTERNAL_SERVER_ERROR,HTTP_201_CREATED,HTTP_401_UNAUTHORIZED,HTTP_200_OK,HTTP_404_NOT_FOUND,HTTP_403_FORBIDDEN,HTTP_503_SERVICE_UNAVAILABLE
 import validators
 from app.models.users import User
+from app.models.companies import Company
+from app.models.books import Book
+from sqlalchemy import select,or_
 from flask_jwt_extended import create_access_token,create_refresh_token,jwt_required,get_jwt_identity
-from app.extentions import db,bcrypt
+from app.extentions import db,search,cache,passwords
+from app import book_stats
+from app.passwords import PasswordPoolBusy
+from app.pagination import paginate,page_meta,get_page_limit,get_offset,offset_meta,PaginationError
+from app.streaming import wants_stream,stream_collection
+from app.conditional import user_version,resource_key,make_etag,last_modified,is_not_modified,not_modified,cached_response,entry_response
+from app.routing import use_primary
+from app.authorization import authorization_required,current_principal
+from app.serializers import user_serializer,request_view,FieldsError
+from app.validation import check_password,ValidationError
 
 
 #user blueprint
 users = Blueprint('users', __name__,url_prefix='/api/v1/users')
 
+#default fields of each response, ?fields= overrides them
+LIST_FIELDS = ['id','first_name','last_name','username','email','contact','type','books_count','companies_count','created_at']
+AUTHOR_FIELDS = ['id','first_name','last_name','username','email','contact','biography','books_count','companies_count','created_at']
+DETAIL_FIELDS = ['id','first_name','last_name','username','email','contact','type','biography','books_count','companies_count','created_at']
+UPDATED_FIELDS = ['id','first_name','last_name','email','contact','type','biography','updated_at']
+
 # Getting all users endpoint
 @users.get('/')
 @jwt_required()
 def getAllUsers():
     try:
-        all_users = User.query.all()  # Fetch all users
-
-        users_data = []
-
-        for user in all_users:
-            user_info = {
-                'id': user.id,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'username': user.get_full_name(),
-                'email': user.email,
-                'contact': user.contact,
-                'type': user.user_type,
-                'created_at': user.created_at
-            }
-            users_data.append(user_info)
+        view = request_view(user_serializer, default_fields=LIST_FIELDS)
+
+        if wants_stream():
+            return stream_collection(User.query, User, view, 'users', "All users have been retrieved successfully")
+
+        page = paginate(User.query.options(*view.load_options()), User, allowed_sorts=('created_at',))  # Fetch one page of users
+
+        users_data = [view.dump(user) for user in page.items]
 
         return jsonify({
             "message": "All users have been retrieved successfully",
-            "total_users": len(all_users),  # Use len(all_users) to get the total number of users
-            "users": users_data
+            "total_users": len(users_data),  # number of users in this page
+            "users": users_data,
+            "pagination": page_meta(page)
         }), HTTP_200_OK
 
+    except (PaginationError,FieldsError) as e:
+        return jsonify({'error': str(e)}), HTTP_400_BAD_REQUEST
+
     except Exception as e:
         return jsonify({
             'error': str(e)
@@ -50,42 +64,27 @@ def getAllAuthors():
     
     try:
 
-        all_authors = User.query.filter_by(user_type='author').all()
+        #books and companies are loaded for the whole page in one query each
+        view = request_view(user_serializer, default_fields=AUTHOR_FIELDS, default_include=('companies','books'))
+        if wants_stream():
+            return stream_collection(User.query.filter_by(user_type='author'), User, view, 'authors', "All authors retrieved successfully")
 
-        authors_data = []
+        authors_query = User.query.filter_by(user_type='author').options(*view.load_options())
+        page = paginate(authors_query, User, allowed_sorts=('created_at',))
 
-        for author in all_authors:
-            author_info = {
-                'id':author.id,
-                'first_name':author.first_name,
-                'last_name':author.last_name,
-                'username':author.get_full_name(),
-                'email':author.email,
-                'contact':author.contact,
-                'biography':author.biography,
-                'created_at':author.created_at,
-                'companies':[],
-                'books':[]
-
-            }
-
-            if hasattr(author,'books'):
-                author_info['books'] = [ {'id': book.id, 'title':book.title,'price':book.price,'genre':book.id, 'price_unit':book.price_unit,'description':book.description,'publication':book.publication_date,'image':book.image,'created_at':book.created_at} for book in author.books ]
-
-            if hasattr(author,'companies'):
-                author_info['companies'] = [ {'id':company.id,'name':company.name,'origin':company.origin} for company in author.company]
-            authors_data.append(author_info)
+        authors_data = [view.dump(author) for author in page.items]
 
 
         return jsonify({
             "message":"All authors retrieved successfully",
             "total": len(authors_data),
-            "authors": authors_data
-
-            
+            "authors": authors_data,
+            "pagination": page_meta(page)
 
         }),HTTP_200_OK
              
+    except (PaginationError,FieldsError) as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
 
     except Exception as e:
         return jsonify({
@@ -100,45 +99,38 @@ def getUser(id):
 
     try:
 
-        user = User.query.filter_by(id=id).first()
-        
-        if not user:
-            return jsonify({"error":"User not found"}),HTTP_404_NOT_FOUND
+        view = request_view(user_serializer, default_fields=DETAIL_FIELDS, default_include=('companies','books'))
 
-        books = []
-        companies = []
+        #a cached representation answers without any query, conditional or not
+        key = resource_key('user', id)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry_response(entry)
 
-        if hasattr(user,'books'):
-           books = [ {'id': book.id, 'title':book.title,'price':book.price,'genre':book.id, 'price_unit':book.price_unit,'description':book.description,'publication':book.publication_date,'image':book.image,'created_at':book.created_at} for book in user.books ]
+        #the fill path reads the primary, a replica row would be cached past its invalidation
+        with use_primary():
+            version = user_version(id)
+            if not version:
+                return jsonify({"error":"User not found"}),HTTP_404_NOT_FOUND
 
-        if hasattr(user,'companies'):
-            companies = [ {'id':company.id,'name':company.name,'origin':company.origin} for company in user.company]
-            
+            etag, modified = make_etag(version), last_modified(version)
+            if is_not_modified(etag, modified):
+                return not_modified(etag, modified)
 
-
-        return jsonify({
-            "message":"All authors retrieved successfully",
+            user = User.query.filter_by(id=id).options(*view.load_options()).first()
         
-            "user":{
-                'id':user.id,
-                'first_name':user.first_name,
-                'last_name':user.last_name,
-                'username':user.get_full_name(),
-                'email':user.email,
-                'contact':user.contact,
-                'type':user.user_type,
-                'biography':user.biography,
-                'created_at':user.created_at,
-                'companies':companies,
-                'books':books
-
-
-            }
+            if not user:
+                return jsonify({"error":"User not found"}),HTTP_404_NOT_FOUND
 
-            
+            entry = cache.set(key, cached_response({
+                "message":"All authors retrieved successfully",
+                "user": view.dump(user)
 
-        }),HTTP_200_OK
+            }, etag, modified), tags=version.tags)
+            return entry_response(entry)
              
+    except FieldsError as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
 
     except Exception as e:
         return jsonify({
@@ -147,12 +139,11 @@ def getUser(id):
     
 #update user details
 @users.route('/edit/<int:id>',methods=['PUT','PATCH'])
-@jwt_required()
+@authorization_required()
 def updateUserDetails(id):
 
     try:
-        current_user = get_jwt_identity()
-        loggedInUser = User.query.filter_by(id=current_user).first()
+        current_user = current_principal()
          
          #get user by id
         user = User.query.filter_by(id=id).first()
@@ -160,9 +151,11 @@ def updateUserDetails(id):
         if not user:
             return jsonify({"error":"User not found"}),HTTP_404_NOT_FOUND
         
-        elif loggedInUser.user_type!='admin' and user.id!=current_user:
+        elif not current_user.may_edit(user.id):
             return jsonify({'error':'You are not authorised to update the user details'}),HTTP_403_FORBIDDEN
         else:
+             view = request_view(user_serializer, default_fields=UPDATED_FIELDS)
+
              first_name = request.get_json().get('first_name',user.first_name)
              last_name = request.get_json().get('last_name',user.last_name)
              email = request.get_json().get('email',user.email)
@@ -170,9 +163,8 @@ def updateUserDetails(id):
              biography = request.get_json().get('biography',user.biography)
              user_type = request.get_json().get('user_type',user.user_type)
 
-             if "password" in request.json:
-                 hashed_password = bcrypt.generate_password_hash(request.json.get('password'))
-                 user.password = hashed_password
+             if user_type != user.user_type and not current_user.is_admin:
+                return jsonify({'error':'Only an admin can change the user type'}),HTTP_403_FORBIDDEN
 
              if email != user.email and User.query.filter_by(email=email).first():
                 return jsonify({'error':'Email address already in use'}),HTTP_409_CONFLICT
@@ -180,6 +172,14 @@ def updateUserDetails(id):
              if contact!= user.contact and User.query.filter_by(contact=contact).first():
                 return jsonify({'error':'Contact already in use'}),HTTP_409_CONFLICT
 
+             #hashed last, conflicts are answered without paying for bcrypt
+             if "password" in request.json:
+                 user.password = passwords.hash(check_password(request.json.get('password')))
+
+             #tokens issued before a role or password change stop being accepted
+             if user_type != user.user_type or "password" in request.json:
+                 user.token_version = User.token_version + 1
+
              user.first_name = first_name
              user.last_name = last_name
              user.email = email
@@ -188,24 +188,21 @@ def updateUserDetails(id):
              user.user_type = user_type
 
              db.session.commit()
+             cache.invalidate(f'user:{user.id}')
              #get username
              user_name = user.get_full_name()
 
              return jsonify({
                 'message':user_name + " 's details have been successfully updated",
-                "user":{
-                'id':user.id,
-                'first_name':user.first_name,
-                'last_name':user.last_name,
-                'email':user.email,
-                'contact':user.contact,
-                'type':user.user_type,
-                'biography':user.biography, 
-                'updated_at':user.updated_at
-                     
-                 }
+                "user": view.dump(user)
              })
 
+    except (FieldsError,ValidationError) as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
+
+    except PasswordPoolBusy as e:
+        return jsonify({'error':str(e)}),HTTP_503_SERVICE_UNAVAILABLE,{'Retry-After':'1'}
+
     except Exception as e:
         return jsonify({
             'error':str(e)
@@ -215,12 +212,11 @@ def updateUserDetails(id):
 
  #Deleting a user
 @users.route('/delete/<int:id>',methods=['DELETE'])
-@jwt_required()
+@authorization_required()
 def deleteUser(id):
 
     try:
-        current_user = get_jwt_identity()
-        loggedInUser = User.query.filter_by(id=current_user).first()
+        current_user = current_principal()
          
          #get user by id
         user = User.query.filter_by(id=id).first()
@@ -228,21 +224,28 @@ def deleteUser(id):
         if not user:
             return jsonify({"error":"User not found"}),HTTP_404_NOT_FOUND
         
-        elif loggedInUser.user_type!='admin': 
+        elif not current_user.is_admin: 
             return jsonify({'error':'You are not authorised to delete the user details'}),HTTP_403_FORBIDDEN
         
         else:
 
-            #delete associated companies
-            for company in user.companies:
-                db.session.delete(company)
-
-            #delete the associated books
-            for book in user.books:
-                db.session.delete(book)
-
+            #entries of the user's books are tagged with the user, its companies are not,
+            #and the other authors of books in those companies embed them too
+            company_ids = db.session.scalars(select(Company.id).where(Company.user_id == user.id)).all()
+            tags = {f'user:{user.id}'} | {f'company:{company_id}' for company_id in company_ids}
+            if company_ids:
+                authors = db.session.scalars(select(Book.user_id).where(Book.company_id.in_(company_ids)).distinct())
+                tags |= {f'user:{author}' for author in authors}
+            search.forget('books', select(Book.id).where(or_(Book.user_id == user.id, Book.company_id.in_(company_ids))))
+            removed = book_stats.query_totals(db.session, or_(Book.user_id == user.id, Book.company_id.in_(company_ids)))
+            #the other companies the user's books were in lose them from their books_count
+            tags |= {f'company:{value}' for dimension, value in removed if dimension == 'company'}
+
+            #the database deletes the companies and books with the user (ON DELETE CASCADE)
             db.session.delete(user)
+            book_stats.subtract(db.session, removed)
             db.session.commit()
+            cache.invalidate(*tags)
 
 
             return jsonify({'message':'User has been deleted successfully'})
@@ -261,47 +264,35 @@ def searchAuthors():
     try:
 
         search_query = request.args.get('query','')
-
-        authors = User.query.filter( ((User.first_name.ilike(f'%{search_query}')) |
-                                       (User.last_name.ilike(f'%{search_query}')))
-                                       & (User.user_type == "author") ).all()
+        limit = get_page_limit()
+        offset = get_offset()
+
+        #ranked ids from the search index, one extra to know whether there is a next page
+        author_ids = search.search('authors', search_query, offset=offset, limit=limit + 1)
+        has_more = len(author_ids) > limit
+        author_ids = author_ids[:limit]
+
+        view = request_view(user_serializer, default_fields=AUTHOR_FIELDS, default_include=('companies','books'))
+        found = User.query.filter(User.id.in_(author_ids)).options(*view.load_options()).all()
+        by_id = {author.id: author for author in found}
+        authors = [by_id[author_id] for author_id in author_ids if author_id in by_id]
         
         if  len(authors) ==0:
              return jsonify({'message':'No results found'}),HTTP_404_NOT_FOUND
-        
-        else:
-         authors_data = []
-
-         for author in authors:
-            author_info = {
-                'id':author.id,
-                'first_name':author.first_name,
-                'last_name':author.last_name,
-                'username':author.get_full_name(),
-                'email':author.email,
-                'contact':author.contact,
-                'biography':author.biography,
-                'created_at':author.created_at,
-                'companies':[],
-                'books':[]
-
-            }
-
-            if hasattr(author,'books'):
-                author_info['books'] = [ {'id': book.id, 'title':book.title,'price':book.price,'genre':book.id, 'price_unit':book.price_unit,'description':book.description,'publication':book.publication_date,'image':book.image,'created_at':book.created_at} for book in author.books ]
 
-            if hasattr(author,'companies'):
-                author_info['companies'] = [ {'id':company.id,'name':company.name,'origin':company.origin,'description':company.description} for company in author.company]
-            authors_data.append(author_info)
+        authors_data = [view.dump(author) for author in authors]
 
 
         return jsonify({
             "message":f'Authors with name {search_query} retrieved successsfully',
             "total_search": len(authors_data),
-            "search_result": authors_data
+            "search_result": authors_data,
+            "pagination": offset_meta(offset, limit, has_more)
 
         }),HTTP_200_OK
              
+    except (PaginationError,FieldsError) as e:
+        return jsonify({'error':str(e)}),HTTP_400_BAD_REQUEST
 
     except Exception as e:
         return jsonify({
@@ -0,0 +1,78 @@
+from collections import Counter
+
+from sqlalchemy import bindparam, func, select
+
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+
+
+#denormalized counters: users.books_count, users.companies_count and companies.books_count
+#The handlers that add or remove books and companies move the counters by the same
+#amount in the same transaction, books through app/book_stats.py which sees every
+#book write. Rows are updated in id order so concurrent writers lock them in the
+#same order. flask repair-counters recounts them.
+
+
+#(counter column, foreign key of the counted rows)
+COUNTERS = [
+    (User.books_count, Book.user_id),
+    (User.companies_count, Company.user_id),
+    (Company.books_count, Book.company_id),
+]
+
+
+#ids -> how many of them, for the counted rows' foreign key values
+def tally(ids):
+    return Counter(id for id in ids if id is not None)
+
+
+def _move(session, column, deltas):
+    deltas = sorted((int(id), delta) for id, delta in deltas.items() if delta)
+    if not deltas:
+        return
+
+    table = column.class_.__table__
+    #a counter is not a change to the row, updated_at (and the ETags built on it) stays
+    statement = table.update()\
+        .where(table.c.id == bindparam('key_id'))\
+        .values({column.key: table.c[column.key] + bindparam('key_delta'), 'updated_at': table.c.updated_at})
+    session.execute(statement, [{'key_id': id, 'key_delta': delta} for id, delta in deltas])
+
+
+#authors and companies are {id: books added}, negative for books removed
+def books_added(session, authors, companies):
+    _move(session, User.books_count, authors)
+    _move(session, Company.books_count, companies)
+
+
+#owners is {user id: companies added}, negative for companies removed
+def companies_added(session, owners):
+    _move(session, User.companies_count, owners)
+
+
+def _counted(column, foreign_key):
+    return select(func.count()).where(foreign_key == column.class_.id).correlate(column.class_).scalar_subquery()
+
+
+#rows whose counter differs from a recount, as (column name, id, stored, counted)
+def drift(session):
+    found = []
+    for column, foreign_key in COUNTERS:
+        counted = _counted(column, foreign_key)
+        rows = session.execute(select(column.class_.id, column, counted).where(column != counted).order_by(column.class_.id))
+        found.extend((f'{column.class_.__tablename__}.{column.key}', id, stored, count) for id, stored, count in rows)
+    return found
+
+
+#recount every counter, one UPDATE per counter touching only the rows that drifted
+def repair(session):
+    fixed = {}
+    for column, foreign_key in COUNTERS:
+        model = column.class_
+        counted = _counted(column, foreign_key)
+        result = session.execute(model.__table__.update()
+                                 .where(column != counted)
+                                 .values({column.key: counted, 'updated_at': model.__table__.c.updated_at}))
+        fixed[f'{model.__tablename__}.{column.key}'] = result.rowcount
+    return fixed
@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+from app.routing import REPLICA
+
+
+#SQLite only enforces foreign keys on connections that ask for it, the
+#ON DELETE CASCADE rules the delete handlers rely on need it on every connection
+@event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+#checkout counters of one pool
+class PoolStats:
+
+    #checkouts that waited longer than this are counted as slow
+    SLOW = 0.01
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = self.slow_checkouts = self.timeouts = 0
+        self.wait_total = self.wait_max = 0.0
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if waited > self.SLOW:
+                self.slow_checkouts += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'slow_checkouts': self.slow_checkouts,
+                'timeouts': self.timeouts,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+
+
+#QueuePool that times every checkout, including waits for a free connection
+class TimedQueuePool(QueuePool):
+
+    def __init__(self, *args, **kwargs):
+        self.stats = kwargs.pop('stats', None) or PoolStats()
+        super().__init__(*args, **kwargs)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+    #dispose() and invalidation build a new pool, the counters carry over
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+#engine options completed before Flask-SQLAlchemy builds the engines
+def configure_engine(app):
+    #copied, the dict in the config class is shared by every app built from it
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    #the replica is one more bind, app/routing.py decides when it is used
+    if app.config.get('REPLICA_DATABASE_URL'):
+        binds = app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA] = app.config['REPLICA_DATABASE_URL']
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    #in-memory SQLite lives on a single connection, it keeps SQLAlchemy's own pool
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        for name in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle'):
+            options.pop(name, None)
+        return
+
+    options.setdefault('poolclass', TimedQueuePool)
+
+
+#status and checkout counters of every engine the app uses
+def pool_stats(db):
+    stats = {}
+    for bind, engine in db.engines.items():
+        pool = engine.pool
+        entry = {'class': type(pool).__name__, 'status': pool.status()}
+        if isinstance(pool, QueuePool):
+            entry.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(), overflow=pool.overflow())
+        if isinstance(pool, TimedQueuePool):
+            entry.update(pool.stats.as_dict())
+        stats[bind or 'default'] = entry
+    return stats
@@ -2,12 +2,26 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
+from app.routing import RoutingSession
+from app.search import SearchEngine
+from app.cache import Cache
+from app.passwords import Passwords
+from app.ratelimit import RateLimiter
+from app.aio import AsyncDatabase
 
 
 migrate = Migrate()
-db = SQLAlchemy()
+#reads of GET requests go to the replica bind when one is configured
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 jwt = JWTManager()
+search = SearchEngine()
+cache = Cache()
+passwords = Passwords()
+#token buckets of the rate limited routes (login, register)
+limiter = RateLimiter()
+#async engine of the endpoints asgi.py serves on the event loop
+async_db = AsyncDatabase()
 
 
 
@@ -0,0 +1,104 @@
+from datetime import date, datetime, timezone
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.timing import TimedJSONProvider, span
+
+
+#the app's JSON provider, used by jsonify, cached responses and the streamed listings
+#JSON_PROVIDER: 'orjson', 'default' (the json module) or 'auto' for orjson when it
+#is installed. Both write the same JSON: dates and datetimes as RFC 822 strings
+#(http_date), keys sorted unless JSON_SORT_KEYS is off, compact out of debug mode.
+#orjson writes non-ASCII characters as UTF-8 rather than \u escapes, the decoded
+#values are the same. Anything orjson refuses (integers over 64 bits, a custom
+#cls=) goes through the json module.
+
+
+def _orjson():
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+#werkzeug's http_date without the detour through email.utils, a listing has
+#thousands of them: naive datetimes are UTC, dates are midnight UTC
+def http_date(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        clock = f'{value.hour:02d}:{value.minute:02d}:{value.second:02d}'
+    else:
+        clock = '00:00:00'
+    return f'{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} {clock} GMT'
+
+
+def _default(value):
+    if isinstance(value, date):
+        return http_date(value)
+    return DefaultJSONProvider.default(value)
+
+
+class OrjsonProvider(TimedJSONProvider):
+
+    default = staticmethod(_default)
+
+    ensure_ascii = False
+
+    #json.dumps arguments orjson has an option for, compact or indent=2 output only
+    _SUPPORTED = {'default', 'sort_keys', 'ensure_ascii', 'separators', 'indent'}
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._lib = _orjson()
+
+    def dumps(self, obj, **kwargs):
+        orjson = self._lib
+        if not set(kwargs) <= self._SUPPORTED or kwargs.get('indent') not in (None, 2) or kwargs.get('separators') not in (None, (',', ':')):
+            return super().dumps(obj, **kwargs)
+
+        #datetimes go to default (http_date) like with the json module, not ISO 8601
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent') == 2:
+            option |= orjson.OPT_INDENT_2
+
+        with span('serialize'):
+            try:
+                return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+            except orjson.JSONEncodeError:
+                return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return self._lib.loads(s)
+
+
+PROVIDERS = {'default': TimedJSONProvider, 'orjson': OrjsonProvider}
+
+
+def provider_class(name):
+    if name == 'auto':
+        name = 'orjson' if _orjson() is not None else 'default'
+    if name == 'orjson' and _orjson() is None:
+        raise RuntimeError("JSON_PROVIDER = 'orjson' needs the orjson package installed")
+    if name not in PROVIDERS:
+        raise RuntimeError('JSON_PROVIDER must be one of: auto, ' + ', '.join(PROVIDERS))
+    return PROVIDERS[name]
+
+
+def init_app(app):
+    app.config.setdefault('JSON_PROVIDER', 'auto')
+    app.config.setdefault('JSON_SORT_KEYS', True)
+
+    app.json_provider_class = provider_class(app.config['JSON_PROVIDER'])
+    app.json = app.json_provider_class(app)
+    app.json.sort_keys = app.config['JSON_SORT_KEYS']
+
@@ -0,0 +1,13 @@
+from app.extentions import db
+from app.models.users import User
+from app.routing import use_primary
+
+
+#token version of a user for the authorization check on protected write handlers
+#Read from the primary on every check, never cached: revocation has to reach every
+#worker at once, and a per process cache kept a revoked version for its whole TTL.
+#It is a single primary key lookup.
+def get_token_version(user_id):
+    with use_primary():
+        row = db.session.query(User.token_version).filter(User.id == user_id).first()
+    return row[0] if row is not None else None
@@ -0,0 +1,19 @@
+from app.extentions import db
+
+#running totals of the books per genre, company, author and price unit (app/book_stats.py)
+#value is the genre, the company id, the author id or the price unit as text
+class BookStat(db.Model):
+    __tablename__ = 'book_stats'
+    __table_args__ = (
+        #the top values of a dimension for GET /books/stats
+        db.Index('ix_book_stats_dimension_book_count','dimension','book_count'),
+    )
+    dimension = db.Column(db.String(20),primary_key=True)
+    value = db.Column(db.String(100),primary_key=True)
+    book_count = db.Column(db.Integer,nullable=False,default=0)
+    price_total = db.Column(db.BigInteger,nullable=False,default=0)
+    price_min = db.Column(db.Integer,nullable=True)
+    price_max = db.Column(db.Integer,nullable=True)
+
+    def __repr__(self):
+        return f'BookStat {self.dimension} {self.value}'
@@ -1,26 +1,36 @@
 from app.extentions import db
 from datetime import datetime
+from app.models.timestamps import Timestamp
 
 class Book(db.Model):
     __tablename__="books"
+    __table_args__ = (
+        #duplicate title checks in createBook and updateBookDetails
+        db.Index('ix_books_title_user_id','title','user_id'),
+        #lowest and highest price of a genre or price unit, for the book stats
+        db.Index('ix_books_genre_price','genre','price'),
+        db.Index('ix_books_price_unit_price','price_unit','price'),
+    )
     id = db.Column(db.Integer,primary_key=True)
     title = db.Column(db.String(150),nullable=False)
     pages = db.Column(db.Integer,nullable=False)
-    price = db.Column(db.Integer,nullable=False)
+    price = db.Column(db.Integer,nullable=False,index=True)
     price_unit = db.Column(db.String(100),nullable=False,default='UGX')
     publication_date = db.Column(db.Date,nullable=False)
     isbn = db.Column(db.String(30),nullable=True,unique=True)
     genre = db.Column(db.String(50),nullable=False)
     description = db.Column(db.String(255),nullable=False)
     image = db.Column(db.String(255),nullable=True)
-    user_id = db.Column(db.Integer,db.ForeignKey('users.id'))
-    company_id = db.Column(db.Integer,db.ForeignKey('companies.id'))
-    user = db.relationship('User',backref='books')
-    company = db.relationship('Company',backref='books')
-    created_at = db.Column(db.DateTime,default=datetime.now())
-    updated_at = db.Column(db.DateTime,onupdate=datetime.now())
+    #the database deletes the books of a deleted author or company (ON DELETE CASCADE),
+    #passive_deletes keeps the ORM from loading them to delete one by one
+    user_id = db.Column(db.Integer,db.ForeignKey('users.id',name='fk_books_user_id_users',ondelete='CASCADE'),index=True)
+    company_id = db.Column(db.Integer,db.ForeignKey('companies.id',name='fk_books_company_id_companies',ondelete='CASCADE'),index=True)
+    user = db.relationship('User',backref=db.backref('books',cascade='all',passive_deletes=True))
+    company = db.relationship('Company',backref=db.backref('books',cascade='all',passive_deletes=True))
+    created_at = db.Column(Timestamp,default=datetime.now,index=True)
+    updated_at = db.Column(Timestamp,onupdate=datetime.now)
 
-    def __init__(self,title,price,description,pages,user_id,company_id,price_unit,genre,publication_date,isbn):
+    def __init__(self,title,price,description,pages,user_id,company_id,price_unit,genre,publication_date,isbn,image=None):
         super(Book, self).__init__()
         self.title = title
         self.price = price
@@ -32,6 +42,7 @@ class Book(db.Model):
         self.genre = genre
         self.publication_date = publication_date
         self.isbn = isbn
+        self.image = image
 
     def __repr__(self):
         return f'Book {self.title}'
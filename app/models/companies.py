@@ -1,5 +1,6 @@
 from app.extentions import db
 from datetime import datetime
+from app.models.timestamps import Timestamp
 
 class Company(db.Model):
     __tablename__ = 'companies'
@@ -7,10 +8,12 @@ class Company(db.Model):
     name = db.Column(db.String(100),unique=True)
     origin = db.Column(db.Text(),nullable=False)
     description = db.Column(db.Text(),nullable=False)
-    user_id = db.Column(db.Integer,db.ForeignKey('users.id'))
-    user = db.relationship('User',backref='companies')
-    created_at = db.Column(db.DateTime,default=datetime.now())
-    updated_at = db.Column(db.DateTime,onupdate=datetime.now())
+    user_id = db.Column(db.Integer,db.ForeignKey('users.id',name='fk_companies_user_id_users',ondelete='CASCADE'),index=True)
+    user = db.relationship('User',backref=db.backref('companies',cascade='all',passive_deletes=True))
+    #kept by the handlers (app/counters.py)
+    books_count = db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    created_at = db.Column(Timestamp,default=datetime.now,index=True)
+    updated_at = db.Column(Timestamp,onupdate=datetime.now)
 
     def __init__(self,name,origin,description,user_id):
         super(Company, self).__init__()
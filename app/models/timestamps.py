@@ -0,0 +1,6 @@
+from sqlalchemy.dialects import mysql
+from app.extentions import db
+
+#created_at / updated_at keep microseconds on MySQL (plain DATETIME truncates to the second),
+#they are the row versions the ETags are computed from
+Timestamp = db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
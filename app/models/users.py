@@ -1,5 +1,6 @@
 from app.extentions import db
 from datetime import datetime
+from app.models.timestamps import Timestamp
 class User(db.Model):
     __tablename__="users"
     id = db.Column(db.Integer,primary_key=True)
@@ -10,9 +11,13 @@ class User(db.Model):
     image = db.Column(db.String(255),nullable=True)
     password = db.Column(db.Text(),nullable=False)
     biography = db.Column(db.Text, nullable=False)
-    user_type = db.Column(db.String(20),default='author')
-    created_at = db.Column(db.DateTime,default=datetime.now())
-    updated_at = db.Column(db.DateTime,onupdate=datetime.now())
+    user_type = db.Column(db.String(20),default='author',index=True)
+    token_version = db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    #kept by the handlers (app/counters.py), listings show them without touching books or companies
+    books_count = db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    companies_count = db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    created_at = db.Column(Timestamp,default=datetime.now,index=True)
+    updated_at = db.Column(Timestamp,onupdate=datetime.now)
 
     def __init__(self,first_name,last_name,email,contact,password,biography,user_type,image=None):
         super(User, self).__init__()
@@ -0,0 +1,198 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+from flask import current_app, request
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import undefer
+
+
+#raised for a bad ?limit=, ?sort= or ?cursor= value, controllers turn it into a 400
+class PaginationError(ValueError):
+    pass
+
+
+Page = namedtuple('Page', ['items', 'limit', 'sort', 'next_cursor', 'prev_cursor'])
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+#cursors come from the client, only a scalar, a null or a date may be compared with the column
+def _load_value(value):
+    if isinstance(value, dict):
+        try:
+            if 'dt' in value:
+                return datetime.fromisoformat(value['dt'])
+            if 'd' in value:
+                return date.fromisoformat(value['d'])
+        except (ValueError, TypeError):
+            raise PaginationError('Invalid cursor')
+        raise PaginationError('Invalid cursor')
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int, float))):
+        raise PaginationError('Invalid cursor')
+    return value
+
+
+#cursors are opaque to clients: urlsafe base64 of a small json document
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_payload(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+
+    if not isinstance(payload, dict):
+        raise PaginationError('Invalid cursor')
+    return payload
+
+
+def decode_cursor(cursor):
+    payload = _decode_payload(cursor)
+    if not isinstance(payload.get('id'), int) or payload.get('dir') not in ('next', 'prev'):
+        raise PaginationError('Invalid cursor')
+    return payload
+
+
+def get_page_limit():
+    default = current_app.config.get('DEFAULT_PAGE_SIZE', 20)
+    maximum = current_app.config.get('MAX_PAGE_SIZE', 100)
+
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+
+    if limit < 1:
+        raise PaginationError('limit must be greater than zero')
+
+    #hard server side cap, whatever the client asks for
+    return min(limit, maximum)
+
+
+def get_sort(allowed_sorts):
+    sort = request.args.get('sort', 'id')
+    name = sort[1:] if sort.startswith('-') else sort
+
+    if name != 'id' and name not in allowed_sorts:
+        raise PaginationError('sort must be one of: ' + ', '.join(('id',) + tuple(allowed_sorts)))
+    return sort
+
+
+#rows strictly after (value, id) in the requested order, id breaks ties
+#Sort columns may be nullable (created_at, Company.name). MySQL and SQLite sort NULLs
+#lowest, first going up and last going down, the seek follows the same order: a
+#NULL is never greater or smaller than a value, so the comparisons alone skip it.
+def _keyset_filter(model, column, descending, value, last_id):
+    if column is None:
+        return model.id < last_id if descending else model.id > last_id
+
+    if value is None:
+        if descending:
+            return and_(column.is_(None), model.id < last_id)
+        return or_(column.is_not(None), and_(column.is_(None), model.id > last_id))
+
+    if descending:
+        return or_(column < value, and_(column == value, model.id < last_id), column.is_(None))
+    return or_(column > value, and_(column == value, model.id > last_id))
+
+
+def _order_by(model, column, descending):
+    if column is None:
+        return [model.id.desc() if descending else model.id.asc()]
+    if descending:
+        return [column.desc(), model.id.desc()]
+    return [column.asc(), model.id.asc()]
+
+
+def _cursor_for(row, sort, name, direction):
+    payload = {'s': sort, 'id': row.id, 'dir': direction}
+    if name != 'id':
+        payload['v'] = _dump_value(getattr(row, name))
+    return encode_cursor(payload)
+
+
+#keyset pagination on the primary key with an optional sort column
+def paginate(query, model, allowed_sorts=()):
+    limit = get_page_limit()
+    sort = get_sort(allowed_sorts)
+    name = sort.lstrip('-')
+    descending = sort.startswith('-')
+    column = None if name == 'id' else getattr(model, name)
+
+    cursor = request.args.get('cursor')
+    payload = decode_cursor(cursor) if cursor else None
+    direction = payload['dir'] if payload else 'next'
+
+    if payload and payload.get('s', 'id') != sort:
+        raise PaginationError('cursor does not match the requested sort')
+    #without the sort value the seek would be column > NULL, an empty page
+    if payload and column is not None and 'v' not in payload:
+        raise PaginationError('Invalid cursor')
+
+    #walking backwards means reading the reversed order and flipping the page
+    reverse = direction == 'prev'
+    scan_descending = descending != reverse
+
+    #the cursor is built from the sort column, load it even when ?fields= left it out
+    if column is not None:
+        query = query.options(undefer(column))
+
+    if payload:
+        query = query.filter(_keyset_filter(model, column, scan_descending, _load_value(payload.get('v')), payload['id']))
+
+    rows = query.order_by(*_order_by(model, column, scan_descending)).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if reverse:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or reverse:
+            next_cursor = _cursor_for(rows[-1], sort, name, 'next')
+        if (has_more and reverse) or (payload and not reverse):
+            prev_cursor = _cursor_for(rows[0], sort, name, 'prev')
+
+    return Page(rows, limit, sort, next_cursor, prev_cursor)
+
+
+#ranked results (search) have no stable key to seek on, their cursors carry an offset
+def get_offset():
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return 0
+
+    offset = _decode_payload(cursor).get('o')
+    if not isinstance(offset, int) or offset < 0:
+        raise PaginationError('Invalid cursor')
+    return offset
+
+
+def offset_meta(offset, limit, has_more):
+    return {
+        'limit': limit,
+        'next_cursor': encode_cursor({'o': offset + limit}) if has_more else None,
+        'prev_cursor': encode_cursor({'o': max(offset - limit, 0)}) if offset else None
+    }
+
+
+def page_meta(page):
+    return {
+        'limit': page.limit,
+        'sort': page.sort,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    }
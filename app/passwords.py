@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt as _bcrypt
+from flask import current_app
+
+from app.aio import on_event_loop, run_in_executor, wait_future
+from app.timing import span
+from app.validation import PASSWORD_MAX_BYTES
+
+
+#password hashing and verification off the request worker
+#bcrypt costs ~250ms of CPU per call at 12 rounds, run inline a burst of logins holds
+#every worker. The calls go to a small process pool instead, and when more than
+#PASSWORD_POOL_SIZE + PASSWORD_QUEUE_DEPTH calls are in flight new ones are refused
+#with PasswordPoolBusy (a 503) rather than queued behind each other.
+#
+#BCRYPT_LOG_ROUNDS: cost of new hashes, weaker hashes are upgraded on login
+#PASSWORD_POOL_SIZE: worker processes, 0 hashes inline in the request worker
+#PASSWORD_QUEUE_DEPTH: calls allowed to wait for a free worker
+#PASSWORD_TIMEOUT: seconds a request waits for its result
+#
+#The views asgi.py serves on the event loop wait for the pool's future without blocking
+#the loop, or with no pool for the default thread executor, bcrypt never runs on the loop.
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+#run in the pool workers, module level so they can be pickled
+def _hash(password, rounds):
+    return _bcrypt.hashpw(password.encode('utf-8'), _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(hashed, password):
+    password = password.encode('utf-8')
+    #validation.check_password refuses these with a 400 before they get here
+    if len(password) > PASSWORD_MAX_BYTES:
+        raise ValueError(f'password cannot be longer than {PASSWORD_MAX_BYTES} bytes')
+    if isinstance(hashed, str):
+        hashed = hashed.encode('utf-8')
+    try:
+        return _bcrypt.checkpw(password, hashed)
+    except ValueError:
+        #not a bcrypt hash
+        return False
+
+
+def hash_rounds(hashed):
+    #$2b$12$<salt and digest>
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class Passwords:
+
+    def init_app(self, app):
+        app.config.setdefault('BCRYPT_LOG_ROUNDS', 12)
+        app.config.setdefault('PASSWORD_POOL_SIZE', min(4, os.cpu_count() or 1))
+        app.config.setdefault('PASSWORD_QUEUE_DEPTH', 16)
+        app.config.setdefault('PASSWORD_TIMEOUT', 10)
+
+        size = app.config['PASSWORD_POOL_SIZE']
+        app.extensions['passwords'] = {
+            'pool': None,
+            'pid': None,
+            'lock': threading.Lock(),
+            'slots': threading.BoundedSemaphore(size + app.config['PASSWORD_QUEUE_DEPTH']) if size else None,
+        }
+
+    @property
+    def _state(self):
+        return current_app.extensions['passwords']
+
+    def _pool(self):
+        state = self._state
+        #the pool is created on first use in each server process, never inherited across a fork
+        with state['lock']:
+            if state['pool'] is None or state['pid'] != os.getpid():
+                context = multiprocessing.get_context('spawn')
+                state['pool'] = ProcessPoolExecutor(current_app.config['PASSWORD_POOL_SIZE'], mp_context=context)
+                state['pid'] = os.getpid()
+            return state['pool']
+
+    def _run(self, function, *args):
+        with span('bcrypt'):
+            return self._call(function, *args)
+
+    def _call(self, function, *args):
+        slots = self._state['slots']
+        loop = on_event_loop()
+        if slots is None:
+            if loop:
+                return run_in_executor(function, *args)
+            return function(*args)
+
+        if not slots.acquire(blocking=False):
+            raise PasswordPoolBusy('Too many password operations in progress, try again shortly')
+        try:
+            future = self._pool().submit(function, *args)
+            if loop:
+                return wait_future(future, current_app.config['PASSWORD_TIMEOUT'])
+            return future.result(timeout=current_app.config['PASSWORD_TIMEOUT'])
+        finally:
+            slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, current_app.config['BCRYPT_LOG_ROUNDS'])
+
+    def check(self, hashed, password):
+        return self._run(_check, hashed, password)
+
+    #hash made with a lower cost than the configured one, a lowered setting (the
+    #testing profile) never weakens the hashes already stored
+    def needs_rehash(self, hashed):
+        return (hash_rounds(hashed) or 0) < current_app.config['BCRYPT_LOG_ROUNDS']
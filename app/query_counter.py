@@ -0,0 +1,63 @@
+from contextvars import ContextVar
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#a context variable like the request timer (app/timing.py), requests asgi.py serves
+#on the event loop thread count their own statements
+_counters = ContextVar('query_counters', default=())
+
+
+#counts the SQL statements sent to the database while it is active
+#    with QueryCounter() as counter:
+#        client.get('/api/v1/users/authors')
+#    assert counter.count == 3
+class QueryCounter:
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        _counters.set(_counters.get() + (self,))
+        return self
+
+    def __exit__(self, *exc):
+        _counters.set(tuple(counter for counter in _counters.get() if counter is not self))
+        return False
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in _counters.get():
+        counter.statements.append(statement)
+
+
+#with QUERY_COUNT_HEADER enabled every response reports its statement count in X-Query-Count
+def init_app(app):
+
+    if not app.config.get('QUERY_COUNT_HEADER'):
+        return
+
+    @app.before_request
+    def start_query_counter():
+        g.query_counter = QueryCounter().__enter__()
+
+    @app.after_request
+    def add_query_count_header(response):
+        counter = g.pop('query_counter', None)
+        if counter is not None:
+            counter.__exit__(None, None, None)
+            response.headers['X-Query-Count'] = str(counter.count)
+        return response
+
+    @app.teardown_request
+    def stop_query_counter(exc):
+        counter = g.pop('query_counter', None)
+        if counter is not None:
+            counter.__exit__(None, None, None)
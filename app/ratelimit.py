@@ -0,0 +1,255 @@
+import functools
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request
+
+from app.status_codes import HTTP_429_TOO_MANY_REQUESTS
+from app.timing import span
+
+
+#token bucket rate limiting for expensive routes (login and register run bcrypt)
+#A route limited with @limiter.limit('login', ip=client_ip, email=json_field('email'))
+#has one bucket per key: 'login.ip' per client address, 'login.email' per email. A
+#bucket holds up to N tokens and refills at N per period (RATELIMIT_LIMITS,
+#'5/minute'), every request takes one from each of its buckets and is answered 429
+#with Retry-After when one of them was empty, before the view runs. Tokens are taken
+#all or nothing: a refused request spends none, so a locked email cannot be used to
+#drain the IP bucket of whoever tries it.
+#
+#RATELIMIT_BACKEND: 'memory' (per process, LRU of RATELIMIT_MAX_KEYS buckets) or
+#'sqlite' (a file every process on the host shares, RATELIMIT_SQLITE_PATH, put it
+#on /dev/shm to keep it in shared memory)
+#The checks are timed as the ratelimit span of Server-Timing.
+
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+#'5/minute' -> (5 tokens, 60 seconds)
+def parse_rate(value):
+    try:
+        count, period = value.split('/')
+        count = int(count)
+        seconds = PERIODS[period.strip().rstrip('s')]
+    except (ValueError, KeyError):
+        raise ValueError(f'Invalid rate limit {value!r}, expected e.g. 5/minute') from None
+    if count < 1:
+        raise ValueError(f'Invalid rate limit {value!r}, the count must be positive')
+    return count, seconds
+
+
+#key functions: the value a bucket is kept for, None leaves the request out of that bucket
+
+def client_ip():
+    #the proxy's address behind a reverse proxy unless the app is wrapped in werkzeug's ProxyFix
+    return request.remote_addr
+
+
+def json_field(name):
+    def key():
+        data = request.get_json(silent=True)
+        value = data.get(name) if isinstance(data, dict) else None
+        return str(value).strip().lower() if value else None
+    return key
+
+
+#the token count of a bucket last seen at updated, refilled up to now
+def _refill(tokens, updated, capacity, rate, now):
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+#seconds until every bucket has a token, 0 when they all have one
+def _wait(tokens, rates):
+    return max((1 - count) / rate if count < 1 else 0.0 for count, rate in zip(tokens, rates))
+
+
+class MemoryBackend:
+
+    name = 'memory'
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  #key -> (tokens, updated), least recently used first
+        self._lock = threading.Lock()
+
+    #buckets is [(key, capacity, rate)], a token is taken from each when they all
+    #have one; returns the seconds until they do, 0 when the tokens were taken
+    def take(self, buckets):
+        now = time.monotonic()
+        with self._lock:
+            tokens = []
+            for key, capacity, rate in buckets:
+                count, updated = self._buckets.pop(key, (capacity, now))
+                tokens.append(_refill(count, updated, capacity, rate, now))
+            wait = _wait(tokens, [rate for _, _, rate in buckets])
+            #an evicted bucket starts full again, the least recently used are idle ones
+            for (key, _, _), count in zip(buckets, tokens):
+                self._buckets[key] = (count - 1 if not wait else count, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def keys(self):
+        return len(self._buckets)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SqliteBackend:
+
+    name = 'sqlite'
+
+    #buckets idle for this long are deleted every PRUNE_EVERY takes, they would be full again
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, idle_expiry):
+        self.path = path
+        self.idle_expiry = idle_expiry
+        self._local = threading.local()  #one connection per thread
+        self._takes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        #autocommit, the transactions are opened by hand; WAL lets readers and the writer overlap
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        #losing the last buckets on a power cut is harmless
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def take(self, buckets):
+        #wall clock: monotonic clocks of different processes need not agree
+        now = time.time()
+        connection = self._connection()
+        #BEGIN IMMEDIATE takes the write lock up front, two processes cannot both spend the last token
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            tokens = []
+            for key, capacity, rate in buckets:
+                row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens.append(capacity if row is None else _refill(row[0], row[1], capacity, rate, now))
+            wait = _wait(tokens, [rate for _, _, rate in buckets])
+            if not wait:
+                connection.executemany('INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                                       'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                                       [(key, count - 1, now) for (key, _, _), count in zip(buckets, tokens)])
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        self._takes += 1
+        if self._takes % self.PRUNE_EVERY == 0:
+            connection.execute('DELETE FROM buckets WHERE updated < ?', (now - self.idle_expiry,))
+        return wait
+
+    def keys(self):
+        return self._connection().execute('SELECT count(*) FROM buckets').fetchone()[0]
+
+    def clear(self):
+        self._connection().execute('DELETE FROM buckets')
+
+
+class RateLimiter:
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATELIMIT_MAX_KEYS', 100000)
+        app.config.setdefault('RATELIMIT_SQLITE_PATH', None)
+        app.config.setdefault('RATELIMIT_DEFAULT', '60/minute')
+        app.config.setdefault('RATELIMIT_LIMITS', {})
+
+        #parsed once, a typo fails at startup rather than on the first request
+        limits = {name: parse_rate(value) for name, value in app.config['RATELIMIT_LIMITS'].items()}
+        default = parse_rate(app.config['RATELIMIT_DEFAULT'])
+        longest = max(seconds for _, seconds in [default, *limits.values()])
+
+        name = app.config['RATELIMIT_BACKEND']
+        if name == 'memory':
+            backend = MemoryBackend(app.config['RATELIMIT_MAX_KEYS'])
+        elif name == 'sqlite':
+            path = app.config['RATELIMIT_SQLITE_PATH'] or os.path.join(app.instance_path, 'ratelimit.sqlite')
+            backend = SqliteBackend(path, idle_expiry=longest)
+        else:
+            raise ValueError(f'Unknown RATELIMIT_BACKEND {name}')
+
+        app.extensions['ratelimit'] = {'backend': backend, 'limits': limits, 'default': default,
+                                       'lock': threading.Lock(), 'allowed': 0, 'refused': 0}
+
+    @property
+    def state(self):
+        return current_app.extensions['ratelimit']
+
+    @property
+    def backend(self):
+        return self.state['backend']
+
+    #a 429 response when one of the buckets of the current request is empty, None otherwise
+    def check(self, name, keys):
+        if not current_app.config['RATELIMIT_ENABLED']:
+            return None
+
+        state = self.state
+        with span('ratelimit'):
+            buckets = []
+            for key_name, key in keys.items():
+                value = key()
+                if value is None:
+                    continue
+                bucket = f'{name}.{key_name}'
+                capacity, seconds = state['limits'].get(bucket, state['default'])
+                buckets.append((f'{bucket}:{value}', capacity, capacity / seconds))
+            wait = state['backend'].take(buckets) if buckets else 0.0
+
+        #threaded servers check concurrently, += on the dict is not atomic
+        with state['lock']:
+            state['allowed' if not wait else 'refused'] += 1
+        if not wait:
+            return None
+        retry_after = max(1, math.ceil(wait))
+        return jsonify({'error': f'Too many requests, retry in {retry_after} seconds'}), HTTP_429_TOO_MANY_REQUESTS, {'Retry-After': str(retry_after)}
+
+    #view decorator, put it under the route decorator
+    def limit(self, name, **keys):
+        def decorator(view):
+            @functools.wraps(view)
+            def limited(*args, **kwargs):
+                refused = self.check(name, keys)
+                if refused is not None:
+                    return refused
+                return view(*args, **kwargs)
+            return limited
+        return decorator
+
+    def stats(self):
+        state = self.state
+        return {
+            'backend': state['backend'].name,
+            'enabled': current_app.config['RATELIMIT_ENABLED'],
+            'keys': state['backend'].keys(),
+            'allowed': state['allowed'],
+            'refused': state['refused'],
+        }
+
+    def clear(self):
+        self.backend.clear()
@@ -0,0 +1,118 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+
+
+#read/write splitting
+#With REPLICA_DATABASE_URL set the app gets a 'replica' bind. Statements issued while
+#handling a GET or HEAD request read from it, everything else uses the primary:
+#writes, requests with other methods, cli commands, SELECT ... FOR UPDATE and, once
+#a request has written, the rest of that request so it reads its own writes.
+#Reads whose result outlives the request (cache fills, token versions) are made
+#under use_primary(): a lagging replica would have them keep a stale row for the
+#cache TTL, after the write that invalidated it.
+#A replica that cannot be reached is skipped for REPLICA_RETRY_AFTER seconds.
+
+
+REPLICA = 'replica'
+_READ_METHODS = ('GET', 'HEAD')
+
+_lock = threading.Lock()
+_down_until = {}  #replica engine -> monotonic time it may be tried again
+
+
+def _is_down(engine):
+    with _lock:
+        until = _down_until.get(engine)
+        if until is not None and until <= time.monotonic():
+            del _down_until[engine]
+            until = None
+    return until is not None
+
+
+def mark_down(engine, seconds):
+    with _lock:
+        _down_until[engine] = time.monotonic() + seconds
+
+
+def replica_status(db):
+    engine = db.engines.get(REPLICA)
+    if engine is None:
+        return None
+    return {'url': engine.url.render_as_string(hide_password=True), 'healthy': not _is_down(engine)}
+
+
+def _is_write(clause):
+    if clause is None:
+        return False
+    return getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        replica = self._db.engines.get(REPLICA)
+
+        #only statements meant for the default engine are routed
+        if replica is None or bind is not None or engine is not self._db.engines.get(None):
+            return engine
+
+        if self._flushing or _is_write(clause):
+            self.info['wrote'] = True
+            return engine
+
+        if self.info.get('wrote') or self.info.get('primary') or not has_request_context() or request.method not in _READ_METHODS:
+            return engine
+
+        if _is_down(replica) or not self._replica_reachable(replica):
+            return engine
+        return replica
+
+    #the first replica read of a session opens its connection here, a failure falls
+    #back to the primary for this statement and marks the replica down
+    def _replica_reachable(self, replica):
+        if self.info.get('replica_ok'):
+            return True
+        try:
+            self.connection(bind_arguments={'bind': replica})
+        except exc.DBAPIError:
+            mark_down(replica, current_app.config.get('REPLICA_RETRY_AFTER', 30))
+            return False
+        self.info['replica_ok'] = True
+        return True
+
+
+#statements of the block read from the primary, whatever the request method
+#    with use_primary():
+#        version = book_version(id)
+@contextmanager
+def use_primary():
+    info = current_app.extensions['sqlalchemy'].session.info
+    info['primary'] = info.get('primary', 0) + 1
+    try:
+        yield
+    finally:
+        info['primary'] -= 1
+
+
+#a replica that drops connections mid request is skipped by the following ones
+@event.listens_for(Engine, 'handle_error')
+def _replica_disconnect(context):
+    if not context.is_disconnect or not has_app_context():
+        return
+    if current_app.extensions['sqlalchemy'].engines.get(REPLICA) is context.engine:
+        mark_down(context.engine, current_app.config.get('REPLICA_RETRY_AFTER', 30))
+
+
+#the engine long reads outside the session should use (exports)
+def read_engine(db):
+    replica = db.engines.get(REPLICA)
+    if replica is not None and not _is_down(replica):
+        return replica
+    return db.engine
@@ -0,0 +1,115 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+
+from app.search.backends import BACKENDS, KINDS, MemoryBackend, MySQLFullTextBackend, SQLiteFTSBackend
+from app.search.memory import tokenize
+
+
+#full text search over authors and books
+#SEARCH_BACKEND picks the implementation: 'sqlite' (FTS5), 'mysql' (FULLTEXT),
+#'memory' (in-process inverted index) or 'auto' to use the database's own
+#full text index when the migration created one and fall back to memory otherwise
+class SearchEngine:
+
+    def __init__(self, db=None):
+        self.db = db
+
+    def init_app(self, app, db):
+        self.db = db
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.extensions['search'] = {'backend': None}
+
+        #index changes are collected at flush time and applied once the transaction commits
+        if not event.contains(db.session, 'after_flush', _collect_changes):
+            event.listen(db.session, 'after_flush', _collect_changes)
+            event.listen(db.session, 'after_commit', _apply_changes)
+            event.listen(db.session, 'after_soft_rollback', _discard_changes)
+
+    @property
+    def backend(self):
+        state = current_app.extensions['search']
+        if state['backend'] is None:
+            state['backend'] = self._resolve(current_app.config['SEARCH_BACKEND'])
+        return state['backend']
+
+    def _resolve(self, name):
+        if name != 'auto':
+            return BACKENDS[name]()
+
+        dialect = self.db.engine.dialect.name
+        for candidate in (SQLiteFTSBackend, MySQLFullTextBackend):
+            if BACKENDS.get(dialect) is candidate and candidate.available(self.db.session):
+                return candidate()
+        return MemoryBackend()
+
+    #ranked ids for kind ('authors' or 'books'), every query term is a prefix
+    def search(self, kind, query, offset=0, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        return self.backend.search(self.db.session, kind, terms, offset, limit)
+
+    #re-read rows written outside the ORM unit of work (bulk inserts, cascades)
+    def refresh(self, kind, ids):
+        spec = KINDS[kind]
+        table = self.db.metadata.tables[spec['table']]
+        columns = [table.c.id] + [table.c[field] for field in spec['fields']]
+
+        changes = dict.fromkeys(((kind, doc_id) for doc_id in ids), None)
+        statement = select(*columns).where(table.c.id.in_(list(ids)))
+        if kind == 'authors':
+            statement = statement.where(table.c.user_type == 'author')
+        for row in self.db.session.execute(statement).mappings():
+            changes[(kind, row['id'])] = dict(row)
+
+        self.backend.apply(changes)
+
+    #rows removed by ON DELETE CASCADE never pass through the session. Database
+    #indexes follow their tables, the in-process one is told at commit time.
+    def forget(self, kind, ids_statement):
+        if not isinstance(self.backend, MemoryBackend):
+            return
+        changes = self.db.session.info.setdefault('search_changes', {})
+        for doc_id in self.db.session.scalars(ids_statement):
+            changes[(kind, doc_id)] = None
+
+    def rebuild(self):
+        self.backend.rebuild(self.db.session)
+
+
+def _document(obj, kind):
+    return {field: getattr(obj, field) for field in KINDS[kind]['fields']}
+
+
+def _collect_changes(session, flush_context):
+    #local imports, the models import the extensions module this package is created from
+    from app.models.books import Book
+    from app.models.users import User
+
+    changes = session.info.setdefault('search_changes', {})
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, User):
+            changes[('authors', obj.id)] = _document(obj, 'authors') if obj.user_type == 'author' else None
+        elif isinstance(obj, Book):
+            changes[('books', obj.id)] = _document(obj, 'books')
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changes[('authors', obj.id)] = None
+        elif isinstance(obj, Book):
+            changes[('books', obj.id)] = None
+
+
+def _apply_changes(session):
+    changes = session.info.pop('search_changes', None)
+    if not changes or not has_app_context():
+        return
+
+    backend = current_app.extensions.get('search', {}).get('backend')
+    if backend is not None:
+        backend.apply(changes)
+
+
+def _discard_changes(session, previous_transaction):
+    session.info.pop('search_changes', None)
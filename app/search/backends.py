@@ -0,0 +1,172 @@
+import threading
+
+from sqlalchemy import bindparam, text
+
+from app.search.memory import InvertedIndex
+
+
+#what gets indexed for each kind of search
+KINDS = {
+    'authors': {
+        'table': 'users',
+        'fts_table': 'users_fts',
+        'fields': {'first_name': 3.0, 'last_name': 3.0, 'biography': 1.0},
+        'where': "user_type = 'author'",
+    },
+    'books': {
+        'table': 'books',
+        'fts_table': 'books_fts',
+        'fields': {'title': 3.0, 'description': 1.0, 'genre': 2.0},
+        'where': None,
+    },
+}
+
+
+#sqlite FTS5 external content tables, kept in sync by triggers so bulk inserts
+#and cascading deletes are indexed too (the same DDL lives in migration e1a7c4f09b28)
+def sqlite_schema(kind):
+    spec = KINDS[kind]
+    table, fts = spec['table'], spec['fts_table']
+    columns = ', '.join(spec['fields'])
+    new_values = ', '.join('new.' + field for field in spec['fields'])
+    old_values = ', '.join('old.' + field for field in spec['fields'])
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', content_rowid='id', tokenize='unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+class SQLiteFTSBackend:
+    name = 'sqlite-fts5'
+
+    @staticmethod
+    def available(session):
+        found = session.execute(text("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN ('users_fts', 'books_fts')")).scalar()
+        return found == 2
+
+    def search(self, session, kind, terms, offset, limit):
+        spec = KINDS[kind]
+        fts = spec['fts_table']
+        #each term is matched as a prefix, terms are ANDed
+        match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in spec['fields'].values())
+        where = f" AND t.{spec['where']}" if spec['where'] else ''
+
+        rows = session.execute(text(
+            f"SELECT t.id FROM {fts} JOIN {spec['table']} t ON t.id = {fts}.rowid "
+            f"WHERE {fts} MATCH :match{where} "
+            f"ORDER BY bm25({fts}, {weights}), t.id LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'limit': limit, 'offset': offset})
+        return [row[0] for row in rows]
+
+    def apply(self, changes):
+        #triggers keep the index in step with the tables
+        pass
+
+    def rebuild(self, session):
+        for kind, spec in KINDS.items():
+            for statement in sqlite_schema(kind):
+                session.execute(text(statement))
+            session.execute(text(f"INSERT INTO {spec['fts_table']}({spec['fts_table']}) VALUES ('rebuild')"))
+        session.commit()
+
+
+class MySQLFullTextBackend:
+    name = 'mysql-fulltext'
+
+    INDEXES = {'authors': 'ft_users_search', 'books': 'ft_books_search'}
+
+    @classmethod
+    def available(cls, session):
+        found = session.execute(text(
+            "SELECT count(DISTINCT index_name) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND index_type = 'FULLTEXT' AND index_name IN :names"
+        ).bindparams(bindparam('names', expanding=True)), {'names': list(cls.INDEXES.values())}).scalar()
+        return found == len(cls.INDEXES)
+
+    def search(self, session, kind, terms, offset, limit):
+        spec = KINDS[kind]
+        columns = ', '.join(spec['fields'])
+        against = ' '.join('+' + term + '*' for term in terms)
+        where = f" AND {spec['where']}" if spec['where'] else ''
+
+        rows = session.execute(text(
+            f"SELECT id, MATCH({columns}) AGAINST (:against IN BOOLEAN MODE) AS score FROM {spec['table']} "
+            f"WHERE MATCH({columns}) AGAINST (:against IN BOOLEAN MODE){where} "
+            f"ORDER BY score DESC, id LIMIT :limit OFFSET :offset"
+        ), {'against': against, 'limit': limit, 'offset': offset})
+        return [row[0] for row in rows]
+
+    def apply(self, changes):
+        #InnoDB maintains FULLTEXT indexes itself
+        pass
+
+    def rebuild(self, session):
+        session.execute(text('OPTIMIZE TABLE users, books'))
+
+
+#fallback for databases without a usable full text index: one index per process,
+#loaded on first search and then kept up to date from committed sessions
+class MemoryBackend:
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.indexes = None
+
+    @staticmethod
+    def available(session):
+        return True
+
+    def _load(self, session):
+        indexes = {}
+        for kind, spec in KINDS.items():
+            index = InvertedIndex(spec['fields'])
+            where = f" WHERE {spec['where']}" if spec['where'] else ''
+            result = session.execute(
+                text(f"SELECT id, {', '.join(spec['fields'])} FROM {spec['table']}{where}"),
+                execution_options={'yield_per': 1000}
+            )
+            for row in result.mappings():
+                index.add(row['id'], row)
+            indexes[kind] = index
+        return indexes
+
+    def _ensure_loaded(self, session):
+        if self.indexes is None:
+            with self._lock:
+                if self.indexes is None:
+                    self.indexes = self._load(session)
+        return self.indexes
+
+    def search(self, session, kind, terms, offset, limit):
+        return self._ensure_loaded(session)[kind].search(terms, offset, limit)
+
+    #changes: {(kind, id): document or None for a removal}
+    def apply(self, changes):
+        if self.indexes is None:
+            return
+        for (kind, doc_id), document in changes.items():
+            if document is None:
+                self.indexes[kind].remove(doc_id)
+            else:
+                self.indexes[kind].add(doc_id, document)
+
+    def rebuild(self, session):
+        with self._lock:
+            self.indexes = self._load(session)
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'mysql': MySQLFullTextBackend,
+    'memory': MemoryBackend,
+}
+
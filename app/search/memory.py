@@ -0,0 +1,108 @@
+import bisect
+import math
+import re
+import threading
+from collections import defaultdict
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+#in-process inverted index with field weights, bm25 ranking and prefix matching
+class InvertedIndex:
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, fields):
+        self.fields = fields  #{field name: weight}
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  #token -> {doc id: weighted term frequency}
+        self._doc_tokens = {}  #doc id -> set of tokens, needed to unindex
+        self._doc_lengths = {}
+        self._total_length = 0
+        self._vocabulary = []  #sorted tokens, bisected for prefix lookups
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def add(self, doc_id, document):
+        frequencies = defaultdict(float)
+        length = 0
+        for field, weight in self.fields.items():
+            tokens = tokenize(document.get(field))
+            length += len(tokens)
+            for token in tokens:
+                frequencies[token] += weight
+
+        with self._lock:
+            self._remove(doc_id)
+            for token, frequency in frequencies.items():
+                if token not in self._postings:
+                    bisect.insort(self._vocabulary, token)
+                self._postings[token][doc_id] = frequency
+            self._doc_tokens[doc_id] = set(frequencies)
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        for token in self._doc_tokens.pop(doc_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                position = bisect.bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+
+    def _expand(self, term):
+        #every indexed token the term is a prefix of
+        start = bisect.bisect_left(self._vocabulary, term)
+        tokens = []
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            tokens.append(token)
+        return tokens
+
+    #all terms must match (as a prefix), returns doc ids best first
+    def search(self, terms, offset=0, limit=20):
+        if not terms:
+            return []
+
+        with self._lock:
+            documents = len(self._doc_lengths)
+            if not documents:
+                return []
+            average_length = self._total_length / documents or 1
+
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token in self._expand(term):
+                    postings = self._postings[token]
+                    idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, frequency in postings.items():
+                        norm = self.K1 * (1 - self.B + self.B * self._doc_lengths[doc_id] / average_length)
+                        term_scores[doc_id] += idf * frequency * (self.K1 + 1) / (frequency + norm)
+
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {doc_id: score + term_scores[doc_id] for doc_id, score in scores.items() if doc_id in term_scores}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [doc_id for doc_id, score in ranked[offset:offset + limit]]
@@ -0,0 +1,187 @@
+import itertools
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app import book_stats, counters
+from app.extentions import cache, db, passwords
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+
+
+#synthetic users, companies and books for load tests (flask seed)
+#Rows go in with Core executemany batches, one commit per batch, and ids continue
+#after the highest existing one so seeding can add to a database in use. Every
+#value comes from a random.Random(seed): the same seed on the same starting ids
+#gives the same rows. Books per author and per company follow a Zipf law (a few
+#prolific authors and big publishers, a long tail of one-book authors), so do the
+#genres. Emails, contacts, company names and ISBNs are derived from the row id
+#and are unique by construction.
+
+
+GENRES = [
+    'fiction', 'romance', 'mystery', 'fantasy', 'biography', 'history', 'science fiction', 'thriller',
+    'children', 'poetry', 'self help', 'business', 'religion', 'travel', 'cooking', 'science',
+    'politics', 'philosophy', 'art', 'drama',
+]
+
+WORDS = [
+    'river', 'market', 'garden', 'lake', 'city', 'music', 'journey', 'kingdom', 'harvest', 'storm',
+    'school', 'mountain', 'village', 'secret', 'shadow', 'island', 'letter', 'season', 'road', 'fire',
+    'silence', 'house', 'bridge', 'forest', 'promise', 'night', 'stone', 'rain', 'voice', 'light',
+]
+
+FIRST_NAMES = ['Amina', 'Brian', 'Grace', 'Isaac', 'Joan', 'Kato', 'Lydia', 'Moses', 'Nakato', 'Okello', 'Patience', 'Ruth', 'Samuel', 'Tendo', 'Wasswa', 'Zawadi']
+LAST_NAMES = ['Achieng', 'Byaruhanga', 'Kiggundu', 'Mugisha', 'Namubiru', 'Nsubuga', 'Ochieng', 'Opio', 'Ssempala', 'Tumusiime', 'Wanjiru', 'Zziwa']
+
+ORIGINS = ['Uganda', 'Kenya', 'Tanzania', 'Rwanda', 'Nigeria', 'Ghana', 'South Africa', 'United Kingdom', 'United States']
+
+#created_at of seeded rows runs over these years, in id order
+EPOCH = datetime(2019, 1, 1)
+SPAN = timedelta(days=5 * 365)
+
+
+def seeded_email(user_id):
+    return f'seed-user{user_id}@example.com'
+
+
+def isbn13(number):
+    digits = f'979{number % 10 ** 9:09d}'
+    check = (10 - sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+#cumulative Zipf weights for ranks 1..n, for random.choices(cum_weights=)
+def zipf_weights(n, exponent):
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+class Seeder:
+
+    def __init__(self, users, companies, books, seed=0, password='password123', admins=1, skew=0.8, batch_size=5000, progress=None):
+        self.counts = {'users': users, 'companies': companies, 'books': books}
+        self.seed = seed
+        self.password = password
+        self.admins = admins
+        self.skew = skew  #Zipf exponent of books per author and per company
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: None)
+        self.rng = random.Random(seed)
+
+    def run(self):
+        if self.counts['books'] and not (self.counts['users'] and self.counts['companies']):
+            raise ValueError('books need at least one user and one company')
+
+        first = {
+            'users': (db.session.scalar(select(func.max(User.id))) or 0) + 1,
+            'companies': (db.session.scalar(select(func.max(Company.id))) or 0) + 1,
+            'books': (db.session.scalar(select(func.max(Book.id))) or 0) + 1,
+        }
+        user_ids = range(first['users'], first['users'] + self.counts['users'])
+        company_ids = range(first['companies'], first['companies'] + self.counts['companies'])
+
+        #bcrypt once, every seeded user shares the hash
+        hashed = passwords.hash(self.password)
+
+        self._insert('users', User.__table__, self._users(user_ids, hashed))
+        self._insert('companies', Company.__table__, self._companies(company_ids, user_ids),
+                     record=lambda batch: counters.companies_added(db.session, counters.tally(row['user_id'] for row in batch)))
+        self._insert('books', Book.__table__, self._books(first['books'], user_ids, company_ids),
+                     record=lambda batch: book_stats.record(db.session, added=batch))
+
+        #the rows were written behind the ORM, cached representations may embed them
+        cache.clear()
+        return first
+
+    #record is called with every batch before its commit
+    def _insert(self, kind, table, rows, record=None):
+        total = self.counts[kind]
+        if not total:
+            return
+        started = time.monotonic()
+        done = 0
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            db.session.execute(insert(table), batch)
+            if record is not None:
+                record(batch)
+            db.session.commit()
+            done += len(batch)
+            rate = done / max(time.monotonic() - started, 1e-6)
+            self.progress(f'{kind}: {done}/{total}, {rate:.0f} rows/s')
+
+    def _created_at(self, position, total):
+        return EPOCH + SPAN * (position / max(total, 1)) + timedelta(seconds=self.rng.randint(0, 3600))
+
+    def _users(self, ids, hashed):
+        rng = self.rng
+        for position, user_id in enumerate(ids):
+            admin = position < self.admins
+            yield {
+                'id': user_id,
+                'first_name': rng.choice(FIRST_NAMES),
+                'last_name': rng.choice(LAST_NAMES),
+                'email': seeded_email(user_id),
+                'contact': f'+999{user_id:010d}',
+                'image': None,
+                'password': hashed,
+                'biography': '' if admin else f'Writes about {rng.choice(WORDS)}, {rng.choice(WORDS)} and {rng.choice(WORDS)}.',
+                'user_type': 'admin' if admin else 'author',
+                'token_version': 0,
+                'created_at': self._created_at(position, len(ids)),
+            }
+
+    def _companies(self, ids, user_ids):
+        rng = self.rng
+        for position, company_id in enumerate(ids):
+            yield {
+                'id': company_id,
+                'name': f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} Publishers {company_id}',
+                'origin': rng.choice(ORIGINS),
+                'description': f'Publisher of {rng.choice(GENRES)} and {rng.choice(GENRES)} titles.',
+                'user_id': rng.choice(user_ids),
+                'created_at': self._created_at(position, len(ids)),
+            }
+
+    def _books(self, first_id, user_ids, company_ids):
+        rng = self.rng
+        total = self.counts['books']
+
+        #which author or company gets the most books is itself random
+        authors = list(user_ids)
+        rng.shuffle(authors)
+        publishers = list(company_ids)
+        rng.shuffle(publishers)
+        author_weights = zipf_weights(len(authors), self.skew)
+        publisher_weights = zipf_weights(len(publishers), self.skew)
+        genre_weights = zipf_weights(len(GENRES), 1.0)
+
+        for start in range(0, total, self.batch_size):
+            size = min(self.batch_size, total - start)
+            batch_authors = rng.choices(authors, cum_weights=author_weights, k=size)
+            batch_publishers = rng.choices(publishers, cum_weights=publisher_weights, k=size)
+            batch_genres = rng.choices(GENRES, cum_weights=genre_weights, k=size)
+
+            for offset in range(size):
+                book_id = first_id + start + offset
+                genre = batch_genres[offset]
+                yield {
+                    'id': book_id,
+                    'title': f'The {rng.choice(WORDS).title()} of {rng.choice(WORDS).title()} {book_id}',
+                    'pages': rng.randint(48, 960),
+                    'price': rng.randrange(5000, 150000, 500),
+                    'price_unit': 'UGX',
+                    'publication_date': date(1960, 1, 1) + timedelta(days=rng.randint(0, 23000)),
+                    'isbn': isbn13(book_id),
+                    'genre': genre,
+                    'description': f'A {genre} story of {rng.choice(WORDS)} and {rng.choice(WORDS)}.',
+                    'image': None,
+                    'user_id': batch_authors[offset],
+                    'company_id': batch_publishers[offset],
+                    'created_at': self._created_at(start + offset, total),
+                }
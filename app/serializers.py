@@ -0,0 +1,208 @@
+from flask import request
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+from app.timing import span
+
+
+#raised for an unknown name in ?fields= or ?include=, controllers turn it into a 400
+class FieldsError(ValueError):
+    pass
+
+
+#describes how one model is turned into a dict
+#fields maps an output name to a column attribute, or to (getter, [columns it reads])
+#relations maps an include name to (relationship attribute, serializer name)
+class ModelSerializer:
+
+    def __init__(self, model, fields, summary, relations=None):
+        self.model = model
+        self.fields = fields
+        self.summary = summary  #fields used when nested inside another resource
+        self.relations = relations or {}
+
+    def columns(self, name):
+        spec = self.fields[name]
+        return spec[1] if isinstance(spec, tuple) else [spec]
+
+    def value(self, obj, name):
+        spec = self.fields[name]
+        return spec[0](obj) if isinstance(spec, tuple) else getattr(obj, spec)
+
+
+user_serializer = ModelSerializer(
+    model=User,
+    fields={
+        'id': 'id',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'username': (lambda user: user.get_full_name(), ['first_name', 'last_name']),
+        'email': 'email',
+        'contact': 'contact',
+        'type': 'user_type',
+        'biography': 'biography',
+        'image': 'image',
+        'books_count': 'books_count',
+        'companies_count': 'companies_count',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    summary=['id', 'first_name', 'last_name', 'username', 'email', 'contact', 'type', 'biography', 'books_count', 'companies_count', 'created_at'],
+    relations={
+        'books': ('books', 'book'),
+        'companies': ('companies', 'company'),
+    }
+)
+
+company_serializer = ModelSerializer(
+    model=Company,
+    fields={
+        'id': 'id',
+        'name': 'name',
+        'origin': 'origin',
+        'description': 'description',
+        'books_count': 'books_count',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    summary=['id', 'name', 'origin', 'description', 'books_count', 'created_at'],
+    relations={
+        'user': ('user', 'user'),
+    }
+)
+
+book_serializer = ModelSerializer(
+    model=Book,
+    fields={
+        'id': 'id',
+        'title': 'title',
+        'pages': 'pages',
+        'price': 'price',
+        'price_unit': 'price_unit',
+        'publication_date': 'publication_date',
+        'description': 'description',
+        'image': 'image',
+        'genre': 'genre',
+        'isbn': 'isbn',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    summary=['id', 'title', 'price', 'genre', 'price_unit', 'description', 'publication_date', 'image', 'created_at'],
+    relations={
+        'author': ('user', 'user'),
+        'company': ('company', 'company'),
+    }
+)
+
+SERIALIZERS = {
+    'user': user_serializer,
+    'company': company_serializer,
+    'book': book_serializer,
+}
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+#the fields and includes one request asked for, plus the SQL loading that matches them
+class View:
+
+    def __init__(self, serializer, fields, includes):
+        self.serializer = serializer
+        self.fields = fields
+        self.includes = includes  #{include name: View}
+
+    def _relationship(self, name):
+        attribute, _ = self.serializer.relations[name]
+        return getattr(self.serializer.model, attribute)
+
+    def _load_columns(self, view, extra=()):
+        model = view.serializer.model
+        names = {'id'}
+        for field in view.fields:
+            names.update(view.serializer.columns(field))
+        names.update(extra)
+        return [getattr(model, name) for name in sorted(names)]
+
+    #only the requested columns are selected, Text columns that were not asked for stay in the database
+    def load_options(self, *extra_columns):
+        mapper = self.serializer.model.__mapper__
+        extra = set(extra_columns)
+        options = []
+
+        for name, nested in self.includes.items():
+            relationship = self._relationship(name)
+            prop = relationship.property
+            #the parent side of the join condition has to be loaded for the relationship to resolve
+            extra.update(mapper.get_property_by_column(column).key for column in prop.local_columns)
+
+            if prop.uselist:
+                child_keys = [nested.serializer.model.__mapper__.get_property_by_column(column).key for column in prop.remote_side]
+                options.append(selectinload(relationship).load_only(*self._load_columns(nested, child_keys)))
+            else:
+                options.append(joinedload(relationship).load_only(*self._load_columns(nested)))
+
+        options.insert(0, load_only(*self._load_columns(self, extra)))
+        return options
+
+    def dump(self, obj):
+        with span('serialize'):
+            return self._dump(obj)
+
+    def _dump(self, obj):
+        if obj is None:
+            return None
+
+        data = {name: self.serializer.value(obj, name) for name in self.fields}
+
+        for name, nested in self.includes.items():
+            related = getattr(obj, self.serializer.relations[name][0])
+            if self._relationship(name).property.uselist:
+                data[name] = [nested.dump(item) for item in related]
+            else:
+                data[name] = nested.dump(related)
+        return data
+
+
+#build the View for the current request
+#?fields=id,title,author.email picks top level and nested fields
+#?include=author,company picks the nested resources, defaults apply when absent
+def request_view(serializer, default_fields=None, default_include=()):
+    requested = _split(request.args.get('fields'))
+    include_arg = request.args.get('include')
+    includes = _split(include_arg) if include_arg is not None else list(default_include)
+
+    for name in includes:
+        if name not in serializer.relations:
+            raise FieldsError('include must be one of: ' + ', '.join(serializer.relations))
+
+    top_fields = [name for name in requested if '.' not in name]
+    nested_fields = {}
+    for name in requested:
+        if '.' in name:
+            relation, field = name.split('.', 1)
+            if relation not in includes:
+                raise FieldsError(f'{name} requires include={relation}')
+            nested_fields.setdefault(relation, []).append(field)
+
+    if not top_fields:
+        top_fields = list(default_fields or serializer.fields)
+    _check_fields(serializer, top_fields)
+
+    nested_views = {}
+    for name in includes:
+        nested_serializer = SERIALIZERS[serializer.relations[name][1]]
+        fields = nested_fields.get(name) or list(nested_serializer.summary)
+        _check_fields(nested_serializer, fields)
+        nested_views[name] = View(nested_serializer, fields, {})
+
+    return View(serializer, top_fields, nested_views)
+
+
+def _check_fields(serializer, fields):
+    for name in fields:
+        if name not in serializer.fields:
+            raise FieldsError(f'Unknown field {name}, expected one of: ' + ', '.join(serializer.fields))
@@ -2,9 +2,12 @@
 HTTP_200_OK = 200 #Data has been returned successfully
 HTTP_201_CREATED = 201 #data has been created
 HTTP_202_ACCEPTED = 202 #data has been accepted
+HTTP_304_NOT_MODIFIED = 304 #conditional GET, the client copy is current
 HTTP_400_BAD_REQUEST = 400  
 HTTP_401_UNAUTHORIZED = 401
 HTTP_404_NOT_FOUND = 404
 HTTP_500_INTERNAL_SERVER_ERROR = 500
 HTTP_409_CONFLICT = 409
-HTTP_403_FORBIDDEN = 403
\ No newline at end of file
+HTTP_403_FORBIDDEN = 403
+HTTP_429_TOO_MANY_REQUESTS = 429 #a rate limit bucket is empty, see Retry-After
+HTTP_503_SERVICE_UNAVAILABLE = 503 #the password pool is saturated, retry later
\ No newline at end of file
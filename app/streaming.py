@@ -0,0 +1,59 @@
+from flask import Response, current_app, request, stream_with_context
+
+
+NDJSON = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+
+#?stream=1 asks for the whole collection as a streamed json document,
+#Accept: application/x-ndjson for one json object per line
+def wants_stream():
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes') or wants_ndjson()
+
+
+#read the collection in primary key order, one short query per chunk
+#
+#A server side cursor cannot be used here: the includes are eager loaded with
+#extra statements per chunk, and MySQL (pymysql SSCursor) refuses new statements
+#on a connection while an unbuffered result is still open. Seeking on the id
+#keeps memory bounded by the chunk size all the same.
+def iter_chunks(query, model, chunk_size):
+    last_id = None
+    while True:
+        chunk_query = query if last_id is None else query.filter(model.id > last_id)
+        rows = chunk_query.order_by(model.id).limit(chunk_size).all()
+        if not rows:
+            return
+
+        yield rows
+
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1].id
+
+
+def stream_collection(query, model, view, key, message):
+    chunk_size = current_app.config.get('STREAM_CHUNK_SIZE', 500)
+    dumps = current_app.json.dumps
+    query = query.options(*view.load_options())
+
+    def generate_ndjson():
+        for rows in iter_chunks(query, model, chunk_size):
+            yield ''.join(dumps(view.dump(row)) + '\n' for row in rows)
+
+    def generate_json():
+        #the envelope matches the paginated response, the total is only known at the end
+        yield '{"message":' + dumps(message) + ',"' + key + '":['
+        total = 0
+        for rows in iter_chunks(query, model, chunk_size):
+            body = ','.join(dumps(view.dump(row)) for row in rows)
+            yield (',' if total else '') + body
+            total += len(rows)
+        yield '],"total":' + str(total) + '}'
+
+    if wants_ndjson():
+        return Response(stream_with_context(generate_ndjson()), mimetype=NDJSON)
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
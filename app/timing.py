@@ -0,0 +1,155 @@
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#per request timings: SQL statements and their time, serialization, bcrypt, the rate
+#limiter's checks and the whole handler. Sampled requests (TIMING_SAMPLE_RATE, 0 to 1) get a Server-Timing
+#header and one JSON log line on the app.timing logger keyed by endpoint; the
+#others only pay for a thread local lookup per statement.
+#    Server-Timing: db;desc="4 queries";dur=3.1, serialize;dur=0.8, bcrypt;dur=0.0, ratelimit;dur=0.0, app;dur=6.2
+
+
+logger = logging.getLogger('app.timing')
+
+#a context variable rather than a thread local, asgi.py serves several requests at
+#once on the event loop thread, each in its own context
+_timer = ContextVar('request_timer', default=None)
+
+SPANS = ('db', 'serialize', 'bcrypt', 'ratelimit')
+
+
+class RequestTimer:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(SPANS, 0.0)
+        self.queries = 0
+        self._open = {}  #span -> (depth, started), nested spans are counted once
+
+    def enter(self, name):
+        depth, started = self._open.get(name, (0, None))
+        self._open[name] = (depth + 1, started if depth else time.perf_counter())
+
+    def exit(self, name):
+        depth, started = self._open[name]
+        if depth == 1:
+            del self._open[name]
+            self.durations[name] += time.perf_counter() - started
+        else:
+            self._open[name] = (depth - 1, started)
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+def current_timer():
+    return _timer.get()
+
+
+#time a block under one of SPANS when the current request is sampled
+@contextmanager
+def span(name):
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    timer.enter(name)
+    try:
+        yield
+    finally:
+        timer.exit(name)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = current_timer()
+    if timer is not None:
+        timer.queries += 1
+        timer.enter('db')
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = current_timer()
+    if timer is not None and 'db' in timer._open:
+        timer.exit('db')
+
+
+@event.listens_for(Engine, 'handle_error')
+def _failed_execute(context):
+    timer = current_timer()
+    if timer is not None and 'db' in timer._open:
+        timer.exit('db')
+
+
+#JSON encoding counts as serialization, app/json_provider.py installs it or a subclass
+class TimedJSONProvider(DefaultJSONProvider):
+
+    def dumps(self, obj, **kwargs):
+        with span('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+def server_timing(timer):
+    ms = {name: round(seconds * 1000, 3) for name, seconds in timer.durations.items()}
+    total = round(timer.total() * 1000, 3)
+    header = (f'db;desc="{timer.queries} queries";dur={ms["db"]}, serialize;dur={ms["serialize"]}, bcrypt;dur={ms["bcrypt"]}, '
+              f'ratelimit;dur={ms["ratelimit"]}, app;dur={total}')
+    record = {
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'db_queries': timer.queries,
+        'db_ms': ms['db'],
+        'serialize_ms': ms['serialize'],
+        'bcrypt_ms': ms['bcrypt'],
+        'ratelimit_ms': ms['ratelimit'],
+        'total_ms': total,
+    }
+    return header, record
+
+
+def init_app(app):
+    app.config.setdefault('TIMING_SAMPLE_RATE', 0.0)
+
+    rate = app.config['TIMING_SAMPLE_RATE']
+    if not rate:
+        return
+
+    #one JSON object per line, unless the deployment already configured logging
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    if not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+
+    @app.before_request
+    def start_timer():
+        if rate >= 1 or random.random() < rate:
+            g.request_timer = RequestTimer()
+            _timer.set(g.request_timer)
+
+    @app.after_request
+    def add_server_timing(response):
+        timer = g.pop('request_timer', None)
+        if timer is not None:
+            _timer.set(None)
+            header, record = server_timing(timer)
+            record['status'] = response.status_code
+            response.headers['Server-Timing'] = header
+            logger.info(json.dumps(record), extra={'timing': record})
+        return response
+
+    @app.teardown_request
+    def stop_timer(exc):
+        g.pop('request_timer', None)
+        _timer.set(None)
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from sqlalchemy import bindparam, select, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+
+#insert rows, updating the ones whose key is already taken
+#One executemany per call on MySQL (ON DUPLICATE KEY UPDATE) and SQLite/PostgreSQL
+#(ON CONFLICT DO UPDATE). key names the columns of a unique constraint, on MySQL
+#any unique key of the table triggers the update so it should be the only one hit.
+def upsert(session, table, rows, key):
+    if not rows:
+        return
+
+    update = [name for name in rows[0] if name not in key]
+    dialect = session.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        statement = mysql.insert(table)
+        values = {name: statement.inserted[name] for name in update}
+        if 'updated_at' in table.c:
+            values['updated_at'] = datetime.now()
+        session.execute(statement.on_duplicate_key_update(values), rows)
+
+    elif dialect in ('sqlite', 'postgresql'):
+        statement = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        values = {name: statement.excluded[name] for name in update}
+        if 'updated_at' in table.c:
+            values['updated_at'] = datetime.now()
+        session.execute(statement.on_conflict_do_update(index_elements=list(key), set_=values), rows)
+
+    else:
+        _upsert_generic(session, table, rows, key, update)
+
+
+#other databases: find the existing keys with one query, then one executemany each way
+def _upsert_generic(session, table, rows, key, update):
+    columns = [table.c[name] for name in key]
+    wanted = [tuple(row[name] for name in key) for row in rows]
+    existing = set(session.execute(select(*columns).where(tuple_(*columns).in_(wanted))).all())
+
+    inserts = [row for row, row_key in zip(rows, wanted) if row_key not in existing]
+    if inserts:
+        session.execute(table.insert(), inserts)
+
+    updates = []
+    for row, row_key in zip(rows, wanted):
+        if row_key in existing:
+            values = {name: row[name] for name in update}
+            values.update(('key_' + name, value) for name, value in zip(key, row_key))
+            if 'updated_at' in table.c:
+                values['updated_at'] = datetime.now()
+            updates.append(values)
+    if updates:
+        #the SET clause is taken from the column names in the parameters
+        statement = table.update().where(*[table.c[name] == bindparam('key_' + name) for name in key])
+        session.execute(statement, updates)
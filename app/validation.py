@@ -0,0 +1,76 @@
+from datetime import date
+
+
+#raised for a book, company or password that cannot be stored, controllers turn it into a 400
+class ValidationError(ValueError):
+    pass
+
+
+#bcrypt only reads the first 72 bytes of a password, longer ones are refused rather than cut
+PASSWORD_MIN_LENGTH = 8
+PASSWORD_MAX_BYTES = 72
+
+BOOK_REQUIRED = ('title', 'pages', 'description', 'price', 'publication_date', 'isbn', 'price_unit', 'genre', 'company_id')
+
+
+def _integer(data, name):
+    try:
+        return int(data[name])
+    except (TypeError, ValueError):
+        raise ValidationError(f'{name} must be a whole number')
+
+
+#column values of a new book, shared by createBook, the bulk endpoint and flask books import
+def book_values(data, user_id):
+    if not isinstance(data, dict):
+        raise ValidationError('A book must be a JSON object')
+
+    missing = [name for name in BOOK_REQUIRED if not data.get(name)]
+    if missing:
+        raise ValidationError('All fields are required, missing: ' + ', '.join(missing))
+
+    try:
+        publication_date = date.fromisoformat(str(data['publication_date']))
+    except ValueError:
+        raise ValidationError('publication_date must be a YYYY-MM-DD date')
+
+    return {
+        'title': str(data['title']),
+        'pages': _integer(data, 'pages'),
+        'price': _integer(data, 'price'),
+        'price_unit': str(data['price_unit']),
+        'publication_date': publication_date,
+        'isbn': str(data['isbn']),
+        'genre': str(data['genre']),
+        'description': str(data['description']),
+        'image': data.get('image') or None,
+        'company_id': _integer(data, 'company_id'),
+        'user_id': int(user_id),
+    }
+
+
+#column values of a new company, shared by createCompany and flask books import
+def company_values(data, user_id):
+    if not isinstance(data, dict):
+        raise ValidationError('A company must be a JSON object')
+
+    if not data.get('name') or not data.get('origin') or not data.get('description'):
+        raise ValidationError('All fields are required')
+
+    return {
+        'name': str(data['name']),
+        'origin': str(data['origin']),
+        'description': str(data['description']),
+        'user_id': int(user_id),
+    }
+
+
+#a password register or updateUserDetails may hash, login checks the same rules
+def check_password(password):
+    if not isinstance(password, str):
+        raise ValidationError('Password must be a string')
+    if len(password) < PASSWORD_MIN_LENGTH:
+        raise ValidationError('Password is too short')
+    if len(password.encode('utf-8')) > PASSWORD_MAX_BYTES:
+        raise ValidationError(f'Password is too long, at most {PASSWORD_MAX_BYTES} bytes')
+    return password
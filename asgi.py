@@ -0,0 +1,193 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from app.extentions import db, async_db
+
+
+#ASGI entry point: uvicorn asgi:application
+#ASYNC_ENDPOINTS (the single resource reads and login) are served on the event loop.
+#Their Flask view runs in a greenlet over a session of the async engine (app/aio.py,
+#aiomysql or aiosqlite) set as db.session for the request: each query suspends the
+#greenlet and the loop serves other requests until the driver answers, bcrypt is
+#awaited on the password pool (app/passwords.py). Hooks, error handlers and the
+#response are Flask's own, the views are the same functions run.py serves.
+#These requests read the primary, app/routing.py's replica routing is not applied.
+#Cache and rate limiter calls stay blocking, they are in memory or a short round trip.
+#
+#Every other endpoint runs on one of ASGI_THREADS threads, its database and bcrypt
+#calls block that thread like under run.py: exports, imports and NDJSON listings
+#use db.engine or stream after the view returned.
+#Needs an ASGI server (uvicorn) and the async driver of the database.
+
+
+#WSGI environ of an ASGI http scope, body is a file with the request body
+def build_environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    host, port = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'], environ['SERVER_PORT'] = host, str(port or 0)
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+        value = value.decode('latin-1')
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+def _start_message(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+#runs the Flask request in the greenlet of session.run_sync, session is db.session meanwhile
+def _respond(session, app, environ):
+    ctx = app.request_context(environ)
+    error = None
+    try:
+        try:
+            ctx.push()
+            db.session.registry.set(session)
+            try:
+                response = app.full_dispatch_request()
+            finally:
+                #the async session closes it, the teardown must not
+                db.session.registry.clear()
+        except Exception as e:
+            error = e
+            response = app.handle_exception(e)
+
+        started = []
+        chunks = response(environ, lambda status, headers, exc_info=None: started.append((status, headers)))
+        try:
+            body = b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        return started[0], body
+    finally:
+        if error is not None and app.should_ignore_error(error):
+            error = None
+        ctx.pop(error)
+
+
+class AsgiApp:
+
+    def __init__(self, app):
+        self.app = app
+        self.async_endpoints = frozenset(app.config['ASYNC_ENDPOINTS'])
+        self.executor = ThreadPoolExecutor(app.config['ASGI_THREADS'], thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'unsupported ASGI scope {scope["type"]}')
+
+        body = SpooledTemporaryFile(max_size=65536)
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+
+            environ = build_environ(scope, body)
+            if self._endpoint(environ) in self.async_endpoints:
+                await self.serve_async(environ, send)
+            else:
+                await self.serve_threaded(environ, send)
+        finally:
+            body.close()
+
+    def _endpoint(self, environ):
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+        return endpoint
+
+    async def serve_async(self, environ, send):
+        with self.app.app_context():
+            session = async_db.session()
+        async with session:
+            (status, headers), body = await session.run_sync(_respond, self.app, environ)
+        await send(_start_message(status, headers))
+        await send({'type': 'http.response.body', 'body': body})
+
+    #the WSGI app on a pool thread, every chunk is sent from the loop as it is produced
+    async def serve_threaded(self, environ, send):
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and started and started[0] is True:
+                    raise exc_info[1].with_traceback(exc_info[2])
+                started[:] = [(status, headers)]
+
+            chunks = self.app(environ, start_response)
+            try:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if started[0] is not True:
+                        send_from_thread(_start_message(*started[0]))
+                        started[0] = True
+                    send_from_thread({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finally:
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+            if started[0] is not True:
+                send_from_thread(_start_message(*started[0]))
+            send_from_thread({'type': 'http.response.body', 'body': b''})
+
+        await loop.run_in_executor(self.executor, run)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                with self.app.app_context():
+                    await async_db.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(config_name=None, overrides=None):
+    return AsgiApp(create_app(config_name, overrides))
+
+
+application = create_asgi_app()
@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import sys
+
+from benchmarks import concurrency, json_providers, queries, ratelimit, runner
+
+
+#python -m benchmarks run --rows 1000 --rows 100000
+#python -m benchmarks compare benchmarks/results/<base>.json benchmarks/results/<head>.json
+#python -m benchmarks concurrency --endpoint books.getBook --concurrency 50 --slow 100
+#python -m benchmarks json --limit 500
+#python -m benchmarks ratelimit --checks 20000 --threads 8
+#python -m benchmarks queries --rows 1000
+
+
+def run(args):
+    rows = args.rows or [1000]
+    output = args.output
+    meta = runner.metadata(args.database_url, args.driver, args.requests, args.warmup)
+    if output is None:
+        output = os.path.join(runner.RESULTS_DIR, f'{meta["commit"]}-{meta["dialect"]}.json')
+
+    report = {'meta': meta, 'runs': {}}
+    for size in rows:
+        report['runs'][str(size)] = runner.run(
+            size, args.database_url, args.requests, args.warmup, args.driver, args.config, args.seed, args.endpoint)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'results written to {output}')
+    return 0
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    for key in ('dialect', 'driver', 'requests'):
+        if base['meta'].get(key) != head['meta'].get(key):
+            print(f'warning: {key} differs ({base["meta"].get(key)} vs {head["meta"].get(key)}), the numbers are not comparable')
+
+    rows = runner.compare(base, head, args.threshold)
+    regressions = [row for row in rows if row[5]]
+    for size, endpoint, before, after, change, regressed in rows:
+        print(f'{size:>9} {endpoint:<32} p95 {before:>9}ms -> {after:>9}ms {change:+7.1%}' + ('  REGRESSION' if regressed else ''))
+    print(f'{len(regressions)} of {len(rows)} endpoints regressed by more than {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+def concurrent(args):
+    report = concurrency.run(
+        args.rows, args.database_url, args.endpoint, args.concurrency, args.requests, args.slow, args.interval, args.config, args.seed)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'meta': runner.metadata(args.database_url, 'sync+asgi', args.requests, 0), 'concurrency': report}, f, indent=2)
+        print(f'results written to {args.output}')
+    return 0
+
+
+def json_encoding(args):
+    report = json_providers.run(args.rows, args.database_url, args.limit, args.repeat, args.config, args.seed)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'meta': runner.metadata(args.database_url, 'json', args.repeat, 0), 'json': report}, f, indent=2)
+        print(f'results written to {args.output}')
+    return 0
+
+
+def rate_limiting(args):
+    report = ratelimit.run(args.checks, args.emails, args.threads, args.config)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'meta': runner.metadata(runner.DEFAULT_DATABASE_URL, 'ratelimit', args.checks, 0), 'ratelimit': report}, f, indent=2)
+        print(f'results written to {args.output}')
+    return 0
+
+
+def statement_budgets(args):
+    report = queries.run(args.rows, args.database_url, args.config, args.seed)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'meta': runner.metadata(args.database_url, 'queries', 1, 1), 'queries': report}, f, indent=2)
+        print(f'results written to {args.output}')
+    if report['failures']:
+        print(f'{len(report["failures"])} endpoints went over their statement budget: ' + ', '.join(report['failures']))
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark every API endpoint')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='benchmark the endpoints and store the results as JSON')
+    run_parser.add_argument('--rows', type=int, action='append', help='books in the dataset, repeat for several sizes (default 1000)')
+    run_parser.add_argument('--database-url', default=runner.DEFAULT_DATABASE_URL, help='database url, {rows} is replaced by the dataset size')
+    run_parser.add_argument('--requests', type=int, default=200, help='timed requests per endpoint')
+    run_parser.add_argument('--warmup', type=int, default=5, help='untimed requests per endpoint before the timed ones')
+    run_parser.add_argument('--driver', choices=sorted(runner.DRIVERS), default='client', help='Flask test client or a local HTTP server')
+    run_parser.add_argument('--config', default='testing', help='one of config.configs')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--endpoint', action='append', help='only benchmark this endpoint, e.g. books.getAllBooks')
+    run_parser.add_argument('-o', '--output', help='result file (default benchmarks/results/<commit>-<dialect>.json)')
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser('compare', help='compare two result files, exit 1 on a p95 regression')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='allowed p95 growth, 0.1 is 10%%')
+    compare_parser.set_defaults(handler=compare)
+
+    concurrency_parser = commands.add_parser('concurrency', help='compare run.py and asgi.py serving under concurrent and slow clients')
+    concurrency_parser.add_argument('--rows', type=int, default=1000, help='books in the dataset')
+    concurrency_parser.add_argument('--database-url', default=runner.DEFAULT_DATABASE_URL, help='database url, {rows} is replaced by the dataset size')
+    concurrency_parser.add_argument('--endpoint', choices=sorted(concurrency.ENDPOINTS), default='books.getBook')
+    concurrency_parser.add_argument('--concurrency', type=int, default=50, help='clients sending requests at the same time')
+    concurrency_parser.add_argument('--requests', type=int, default=1000, help='requests in total')
+    concurrency_parser.add_argument('--slow', type=int, default=100, help='slow clients holding a connection open')
+    concurrency_parser.add_argument('--interval', type=float, default=0.5, help='seconds between the header lines of a slow client')
+    concurrency_parser.add_argument('--config', default='testing', help='one of config.configs')
+    concurrency_parser.add_argument('--seed', type=int, default=0)
+    concurrency_parser.add_argument('-o', '--output', help='also write the results to this JSON file')
+    concurrency_parser.set_defaults(handler=concurrent)
+
+    json_parser = commands.add_parser('json', help='compare the JSON providers on listing payloads')
+    json_parser.add_argument('--rows', type=int, default=1000, help='books in the dataset')
+    json_parser.add_argument('--database-url', default=runner.DEFAULT_DATABASE_URL, help='database url, {rows} is replaced by the dataset size')
+    json_parser.add_argument('--limit', type=int, default=500, help='items per payload')
+    json_parser.add_argument('--repeat', type=int, default=20, help='encodings per payload and provider, the best one counts')
+    json_parser.add_argument('--config', default='testing', help='one of config.configs')
+    json_parser.add_argument('--seed', type=int, default=0)
+    json_parser.add_argument('-o', '--output', help='also write the results to this JSON file')
+    json_parser.set_defaults(handler=json_encoding)
+
+    ratelimit_parser = commands.add_parser('ratelimit', help='time the rate limiter check of each backend')
+    ratelimit_parser.add_argument('--checks', type=int, default=20000, help='checks per run')
+    ratelimit_parser.add_argument('--emails', type=int, default=1000, help='distinct emails, one bucket each')
+    ratelimit_parser.add_argument('--threads', type=int, default=8, help='threads checking at once in the second run')
+    ratelimit_parser.add_argument('--config', default='testing', help='one of config.configs')
+    ratelimit_parser.add_argument('-o', '--output', help='also write the results to this JSON file')
+    ratelimit_parser.set_defaults(handler=rate_limiting)
+
+    queries_parser = commands.add_parser('queries', help='check the SQL statements per request against their budgets, exit 1 when one goes over')
+    queries_parser.add_argument('--rows', type=int, default=1000, help='books in the dataset')
+    queries_parser.add_argument('--database-url', default=runner.DEFAULT_DATABASE_URL, help='database url, {rows} is replaced by the dataset size')
+    queries_parser.add_argument('--config', default='testing', help='one of config.configs')
+    queries_parser.add_argument('--seed', type=int, default=0)
+    queries_parser.add_argument('-o', '--output', help='also write the results to this JSON file')
+    queries_parser.set_defaults(handler=statement_budgets)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from benchmarks import dataset
+from benchmarks.runner import DEFAULT_DATABASE_URL, summarize
+
+
+#run.py's threaded werkzeug server against asgi.py under uvicorn: concurrent clients
+#hammer one endpoint while slow clients trickle their request headers in, reported
+#with the peak number of threads the process used.
+#The cache is off so every request reaches the database, the rate limiter is off so
+#the auth.login clients are not refused. The endpoints are ASYNC_ENDPOINTS, asgi.py
+#serves them on the event loop over the async engine.
+
+
+ENDPOINTS = {
+    'books.getBook': lambda rng, rows: ('GET', f'/api/v1/books/book/{rng.randint(1, rows)}', None),
+    'companies.getCompany': lambda rng, rows: ('GET', f'/api/v1/companies/company/{rng.randint(1, dataset.sizes(rows)[1])}', None),
+    'auth.login': lambda rng, rows: ('POST', '/api/v1/auth/login', {'email': dataset.AUTHOR_EMAIL, 'password': dataset.PASSWORD}),
+}
+
+
+def serve_sync(app):
+    #one access log line per request would be most of the work
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        thread.join()
+    return server.server_port, stop
+
+
+def serve_asgi(application):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(application, host='127.0.0.1', port=0, log_level='warning', lifespan='on'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+    return server.servers[0].sockets[0].getsockname()[1], stop
+
+
+async def fetch(port, method, path, body=None, token=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    head = [f'{method} {path} HTTP/1.1', 'Host: 127.0.0.1', 'Connection: close', f'Content-Length: {len(payload)}']
+    if body is not None:
+        head.append('Content-Type: application/json')
+    if token:
+        head.append(f'Authorization: Bearer {token}')
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status_line, _, rest = response.partition(b'\r\n')
+    return int(status_line.split()[1]), rest.partition(b'\r\n\r\n')[2]
+
+
+#holds a connection open by sending a header line every interval until stopped
+async def slow_client(port, interval, stop):
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /api/v1/books/ HTTP/1.1\r\nHost: 127.0.0.1\r\n')
+        while not stop.is_set():
+            writer.write(b'X-Slow: 1\r\n')
+            await writer.drain()
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+        writer.close()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def drive(port, endpoint, rows, token, concurrency, requests, slow, interval, seed):
+    rng = random.Random(seed)
+    stop = asyncio.Event()
+    slow_tasks = [asyncio.create_task(slow_client(port, interval, stop)) for _ in range(slow)]
+    await asyncio.sleep(interval)
+
+    peak_threads = threading.active_count()
+    latencies, errors = [], 0
+    queue = [ENDPOINTS[endpoint](rng, rows) for _ in range(requests)]
+
+    async def worker():
+        nonlocal errors, peak_threads
+        while queue:
+            method, path, body = queue.pop()
+            started = time.perf_counter()
+            try:
+                status, _ = await fetch(port, method, path, body, token)
+            except (ConnectionError, OSError):
+                status = 599
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+            peak_threads = max(peak_threads, threading.active_count())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*slow_tasks)
+
+    summary = summarize(latencies, errors)
+    summary['throughput_rps'] = round(len(latencies) / elapsed, 2)
+    summary['peak_threads'] = peak_threads
+    return summary
+
+
+def run(rows=1000, database_url=DEFAULT_DATABASE_URL, endpoint='books.getBook', concurrency=50, requests=1000, slow=100, interval=0.5, config='testing', seed=0, log=print):
+    import asgi
+
+    url = database_url.format(rows=rows)
+    overrides = {'SQLALCHEMY_DATABASE_URI': url, 'TIMING_SAMPLE_RATE': 0, 'QUERY_COUNT_HEADER': False, 'CACHE_BACKEND': 'null', 'RATELIMIT_ENABLED': False}
+    app = create_app(config, overrides)
+    dataset.ensure_dataset(app, rows, seed)
+
+    modes = {
+        'sync': lambda: serve_sync(app),
+        'asgi': lambda: serve_asgi(asgi.create_asgi_app(config, overrides)),
+    }
+    results = {}
+    for mode, serve in modes.items():
+        port, stop = serve()
+        try:
+            status, body = asyncio.run(fetch(port, 'POST', '/api/v1/auth/login', {'email': dataset.AUTHOR_EMAIL, 'password': dataset.PASSWORD}))
+            if status != 200:
+                raise RuntimeError(f'benchmark login failed with {status}: {body[:200]!r}')
+            token = json.loads(body)['user']['access_token']
+            results[mode] = summary = asyncio.run(drive(port, endpoint, rows, token, concurrency, requests, slow, interval, seed))
+        finally:
+            stop()
+        log(f'{mode:<5} {endpoint:<24} p50 {summary["p50_ms"]:>9}ms p95 {summary["p95_ms"]:>9}ms p99 {summary["p99_ms"]:>9}ms '
+            f'{summary["throughput_rps"]:>9} req/s {summary["peak_threads"]:>5} threads' + (f' {summary["errors"]} errors' if summary['errors'] else ''))
+
+    with app.app_context():
+        dataset.reset(rows)
+    return {
+        'rows': rows, 'endpoint': endpoint, 'concurrency': concurrency, 'requests': requests,
+        'slow_clients': slow, 'modes': results,
+    }
@@ -0,0 +1,61 @@
+import os
+
+from flask_migrate import upgrade
+from sqlalchemy import func, select
+
+from app import book_stats, counters
+from app.extentions import db
+from app.models.book_stats import BookStat
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+from app.seeding import WORDS, Seeder, seeded_email
+
+
+#benchmark databases: one per size, migrated with the project's migrations and filled
+#by the flask seed generator. A database that already holds the requested number of
+#books is reused, so the 1M row set is only built once.
+
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+#the seeder makes the first user of an empty database the admin
+ADMIN_EMAIL = seeded_email(1)
+AUTHOR_EMAIL = seeded_email(2)
+PASSWORD = 'benchmark-password'
+
+SEARCH_WORDS = WORDS
+
+
+#users and companies of a dataset with the given number of books
+def sizes(rows):
+    return max(10, rows // 10), max(5, rows // 50)
+
+
+def ensure_dataset(app, rows, seed=0):
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        reset(rows)
+        if db.session.scalar(select(func.count(Book.id))) == rows:
+            return False
+
+        for table in (BookStat.__table__, Book.__table__, Company.__table__, User.__table__):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+        users, companies = sizes(rows)
+        Seeder(users, companies, rows, seed=seed, password=PASSWORD).run()
+        return True
+
+
+#the dataset ids run from 1, rows the scenarios created are above them
+def reset(rows):
+    users, companies = sizes(rows)
+    removed = book_stats.query_totals(db.session, Book.id > rows)
+    db.session.execute(Book.__table__.delete().where(Book.id > rows))
+    book_stats.subtract(db.session, removed)
+    owners = counters.tally(db.session.scalars(select(Company.user_id).where(Company.id > companies)))
+    db.session.execute(Company.__table__.delete().where(Company.id > companies))
+    counters.companies_added(db.session, {owner: -count for owner, count in owners.items()})
+    db.session.execute(User.__table__.delete().where(User.id > users))
+    db.session.commit()
@@ -0,0 +1,85 @@
+import json
+import time
+
+from sqlalchemy import select
+
+from app import create_app
+from app.controllers.users.user_controller import AUTHOR_FIELDS
+from app.extentions import db
+from app.json_provider import PROVIDERS, provider_class
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+from app.serializers import book_serializer, company_serializer, request_view, user_serializer
+from benchmarks import dataset
+from benchmarks.runner import DEFAULT_DATABASE_URL
+
+
+#JSON providers on the payloads the listings return: dumps time per payload for
+#each installed provider, checked to decode to the same value as the json module's
+
+
+#name -> (model, serializer, default fields, default includes, response key)
+PAYLOADS = {
+    'books': (Book, book_serializer, None, ('company',), 'books'),
+    'authors': (User, user_serializer, AUTHOR_FIELDS, ('companies', 'books'), 'authors'),
+    'companies': (Company, company_serializer, None, ('user',), 'companies'),
+}
+
+
+def build_payloads(app, limit):
+    payloads = {}
+    for name, (model, serializer, fields, includes, key) in PAYLOADS.items():
+        with app.test_request_context():
+            view = request_view(serializer, default_fields=fields, default_include=includes)
+            rows = db.session.scalars(select(model).options(*view.load_options()).order_by(model.id).limit(limit)).unique().all()
+            payloads[name] = {'message': f'{name} retrieved successfully', key: [view.dump(row) for row in rows]}
+    return payloads
+
+
+def time_dumps(provider, payload, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        provider.dumps(payload, separators=(',', ':'))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(rows=1000, database_url=DEFAULT_DATABASE_URL, limit=500, repeat=20, config='testing', seed=0, log=print):
+    app = create_app(config, {'SQLALCHEMY_DATABASE_URI': database_url.format(rows=rows)})
+    dataset.ensure_dataset(app, rows, seed)
+
+    providers = {}
+    for name in PROVIDERS:
+        try:
+            providers[name] = provider_class(name)(app)
+        except RuntimeError as e:
+            log(f'skipping {name}: {e}')
+    for provider in providers.values():
+        provider.sort_keys = app.config['JSON_SORT_KEYS']
+
+    results = {}
+    with app.app_context():
+        payloads = build_payloads(app, limit)
+        for payload_name, payload in payloads.items():
+            expected = json.loads(providers['default'].dumps(payload))
+            baseline = None
+            results[payload_name] = {}
+            for name, provider in providers.items():
+                body = provider.dumps(payload, separators=(',', ':'))
+                if json.loads(body) != expected:
+                    raise RuntimeError(f'{name} does not encode {payload_name} like the json module')
+                seconds = time_dumps(provider, payload, repeat)
+                baseline = baseline or seconds
+                results[payload_name][name] = summary = {
+                    'items': len(next(value for value in payload.values() if isinstance(value, list))),
+                    'bytes': len(body.encode('utf-8')),
+                    'best_ms': round(seconds * 1000, 3),
+                    'mb_per_s': round(len(body.encode('utf-8')) / seconds / 1e6, 1),
+                    'speedup': round(baseline / seconds, 2),
+                }
+                log(f'{payload_name:<10} {name:<8} {summary["items"]:>5} items {summary["bytes"]:>9} bytes '
+                    f'{summary["best_ms"]:>9}ms {summary["mb_per_s"]:>7} MB/s x{summary["speedup"]}')
+    return {'rows': rows, 'limit': limit, 'repeat': repeat, 'payloads': results}
@@ -0,0 +1,106 @@
+from urllib.parse import urlencode
+
+from app import create_app
+from app.extentions import db
+from app.query_counter import QueryCounter
+from benchmarks import dataset
+from benchmarks.runner import DEFAULT_DATABASE_URL, ClientDriver, login
+
+
+#statement budgets: the SQL statements one request may send, counted with QueryCounter.
+#Listings are counted at a page of 1 and a page of 50 and must send the same number,
+#a query per row (an N+1) grows with the page and fails the check. Detail views are
+#counted for several ids and must stay at their budget whatever the row embeds.
+#The cache is off so the detail views are counted on their fill path, every path is
+#requested once first so one-time work (the search backend probe) is not counted.
+
+
+PAGE_SIZES = (1, 50)
+
+#endpoint, path, most statements
+LISTINGS = [
+    #the page, then the books and the companies of the whole page in one query each
+    ('users.getAllAuthors', '/api/v1/users/authors', 3),
+    ('users.getAllUsers', '/api/v1/users/', 1),
+    #the ranked ids, the authors with their books and companies
+    ('users.searchAuthors', '/api/v1/users/search', 4),
+    ('books.getAllBooks', '/api/v1/books/', 1),
+    ('books.searchBooks', '/api/v1/books/search', 2),
+    ('companies.getAllCompanies', '/api/v1/companies/', 1),
+]
+
+#endpoint, path, most statements
+DETAILS = [
+    #the version, the book with its company and author
+    ('books.getBook', '/api/v1/books/book/{id}', 2),
+    ('companies.getCompany', '/api/v1/companies/company/{id}', 2),
+    #three version queries, the user, its books, its companies
+    ('users.getUser', '/api/v1/users/user/{id}', 6),
+]
+
+SEARCHES = {'users.searchAuthors', 'books.searchBooks'}
+
+
+def count_statements(client, path, headers):
+    status, _ = client.request('GET', path, headers=headers)
+    with QueryCounter() as counter:
+        status, data = client.request('GET', path, headers=headers)
+    if status != 200:
+        raise RuntimeError(f'{path} answered {status}: {data[:200]!r}')
+    return counter.count
+
+
+#ids spread over the dataset, the first users own the most books in the skewed sets
+def detail_ids(rows):
+    users, companies = dataset.sizes(rows)
+    return {
+        'books.getBook': (1, rows // 2, rows),
+        'companies.getCompany': (1, companies // 2, companies),
+        'users.getUser': (2, users // 2, users),
+    }
+
+
+def run(rows=1000, database_url=DEFAULT_DATABASE_URL, config='testing', seed=0, log=print):
+    url = database_url.format(rows=rows)
+    app = create_app(config, {
+        'SQLALCHEMY_DATABASE_URI': url,
+        'CACHE_BACKEND': 'null',
+        'RATELIMIT_ENABLED': False,
+        'TIMING_SAMPLE_RATE': 0,
+        'QUERY_COUNT_HEADER': False,
+    })
+    dataset.ensure_dataset(app, rows, seed)
+
+    client = ClientDriver(app)
+    headers = {'Authorization': 'Bearer ' + login(client, dataset.ADMIN_EMAIL)['access_token']}
+    results, failures = {}, []
+    try:
+        for endpoint, path, budget in LISTINGS:
+            counts = {}
+            for limit in PAGE_SIZES:
+                query = {'limit': limit}
+                if endpoint in SEARCHES:
+                    query['query'] = dataset.SEARCH_WORDS[0]
+                counts[str(limit)] = count_statements(client, path + '?' + urlencode(query), headers)
+            over = max(counts.values()) > budget
+            grows = len(set(counts.values())) > 1
+            if over or grows:
+                failures.append(endpoint)
+            results[endpoint] = {'budget': budget, 'statements': counts}
+            log(f'{endpoint:<28} ' + ' '.join(f'limit={limit} {count:>2}' for limit, count in counts.items())
+                + f'  budget {budget}' + ('  OVER BUDGET' if over else '') + ('  GROWS WITH THE PAGE' if grows else ''))
+
+        ids = detail_ids(rows)
+        for endpoint, path, budget in DETAILS:
+            counts = {str(id): count_statements(client, path.format(id=id), headers) for id in ids[endpoint]}
+            over = max(counts.values()) > budget
+            if over:
+                failures.append(endpoint)
+            results[endpoint] = {'budget': budget, 'statements': counts}
+            log(f'{endpoint:<28} ' + ' '.join(f'id={id} {count:>2}' for id, count in counts.items())
+                + f'  budget {budget}' + ('  OVER BUDGET' if over else ''))
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+
+    return {'rows': rows, 'results': results, 'failures': failures}
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import threading
+import time
+
+from app import create_app
+from app.extentions import limiter
+from app.ratelimit import client_ip, json_field
+from benchmarks.runner import summarize
+
+
+#overhead of the rate limiter per request: limiter.check() as @limiter.limit runs it
+#on auth.login (a bucket per IP and one per email), timed for each backend from one
+#thread and from several at once. The limits are set high enough that nothing is
+#refused, every check takes a token.
+
+
+BACKENDS = ('memory', 'sqlite')
+
+KEYS = {'ip': client_ip, 'email': json_field('email')}
+
+
+def time_checks(app, checks, emails, offset=0):
+    latencies = []
+    for i in range(checks):
+        email = f'user{(offset + i) % emails}@example.com'
+        with app.test_request_context('/api/v1/auth/login', method='POST', json={'email': email}, environ_base={'REMOTE_ADDR': f'10.0.{i % 200}.1'}):
+            started = time.perf_counter()
+            refused = limiter.check('login', KEYS)
+            latencies.append(time.perf_counter() - started)
+            if refused is not None:
+                raise RuntimeError('a benchmark check was refused, the limits are too low')
+    return latencies
+
+
+def run_threads(app, checks, emails, threads):
+    results = [None] * threads
+
+    def worker(index):
+        results[index] = time_checks(app, checks // threads, emails, offset=index * checks)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies = [latency for result in results for latency in result]
+    return latencies, elapsed
+
+
+def run(checks=20000, emails=1000, threads=8, config='testing', log=print):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in BACKENDS:
+            app = create_app(config, {
+                'RATELIMIT_ENABLED': True,
+                'RATELIMIT_BACKEND': backend,
+                'RATELIMIT_SQLITE_PATH': os.path.join(directory, f'{backend}.sqlite'),
+                'RATELIMIT_LIMITS': {'login.ip': '1000000/second', 'login.email': '1000000/second'},
+                'TIMING_SAMPLE_RATE': 0,
+            })
+            results[backend] = {}
+            for count in sorted({1, threads}):
+                latencies, elapsed = run_threads(app, checks, emails, count)
+                summary = summarize(latencies, 0)
+                summary['throughput_rps'] = round(len(latencies) / elapsed, 2)
+                results[backend][f'{count}_threads'] = summary
+                log(f'{backend:<7} {count:>3} threads p50 {summary["p50_ms"] * 1000:>8.1f}us p95 {summary["p95_ms"] * 1000:>8.1f}us '
+                    f'p99 {summary["p99_ms"] * 1000:>8.1f}us {summary["throughput_rps"]:>10} checks/s')
+    return {'checks': checks, 'emails': emails, 'backends': results}
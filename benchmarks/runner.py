@@ -0,0 +1,208 @@
+import http.client
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import url_for
+from sqlalchemy.engine import make_url
+from werkzeug.serving import make_server
+
+from app import create_app
+from app.extentions import db
+from benchmarks import dataset
+from benchmarks.scenarios import SCENARIOS, Context, missing_endpoints
+
+
+#drives every scenario against an app built with create_app and reports latency
+#percentiles and throughput per endpoint and dataset size
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, 'benchmarks', 'data')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+DEFAULT_DATABASE_URL = 'sqlite:///' + os.path.join(DATA_DIR, 'books-{rows}.db')
+
+
+#requests through the Flask test client, no sockets involved
+class ClientDriver:
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        data = response.get_data()
+        return response.status_code, data
+
+    def close(self):
+        pass
+
+
+#requests over HTTP to a threaded werkzeug server on a free local port
+class ServerDriver:
+
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        #werkzeug's development server closes after every response
+        self.connection.close()
+        return response.status, data
+
+    def close(self):
+        self.server.shutdown()
+        self.connection.close()
+
+
+DRIVERS = {'client': ClientDriver, 'server': ServerDriver}
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors):
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'mean_ms': ms(total / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'throughput_rps': round(len(ordered) / total, 2) if total else None,
+    }
+
+
+def login(driver, email):
+    status, data = driver.request('POST', '/api/v1/auth/login', {'email': email, 'password': dataset.PASSWORD})
+    if status != 200:
+        raise RuntimeError(f'benchmark login for {email} failed with {status}: {data[:200]!r}')
+    return json.loads(data)['user']
+
+
+def run_scenario(app, driver, ctx, scenario, requests, warmup):
+    count = min(requests, scenario.iterations or requests)
+    with app.test_request_context():
+        base = url_for(scenario.endpoint, **({'id': 0} if '<int:id>' in _rule(app, scenario.endpoint) else {}))
+
+    latencies, errors = [], 0
+    for i in range(warmup + count):
+        row = None
+        if scenario.setup is not None:
+            with app.app_context():
+                row = scenario.setup(ctx, i)
+        values, query, body = scenario.request(ctx, i, row)
+        with app.test_request_context():
+            path = url_for(scenario.endpoint, **values) if values else base
+        if query:
+            path += '?' + urlencode(query)
+        headers = {'Authorization': 'Bearer ' + ctx.tokens[scenario.token]} if scenario.token else None
+
+        started = time.perf_counter()
+        status, _ = driver.request(scenario.method, path, body, headers)
+        elapsed = time.perf_counter() - started
+
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        if status >= 400:
+            errors += 1
+    return summarize(latencies, errors)
+
+
+def _rule(app, endpoint):
+    return next(rule.rule for rule in app.url_map.iter_rules() if rule.endpoint == endpoint)
+
+
+def run(rows, database_url=DEFAULT_DATABASE_URL, requests=200, warmup=5, driver='client', config='testing', seed=0, only=None, log=print):
+    url = database_url.format(rows=rows)
+    if url.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(url[len('sqlite:///'):]) or '.', exist_ok=True)
+
+    #every login comes from one address for one email, the limiter would refuse most (python -m benchmarks ratelimit times it)
+    app = create_app(config, overrides={'SQLALCHEMY_DATABASE_URI': url, 'TIMING_SAMPLE_RATE': 0, 'QUERY_COUNT_HEADER': False, 'RATELIMIT_ENABLED': False})
+    missing = missing_endpoints(app)
+    if missing:
+        raise RuntimeError('no benchmark scenario for: ' + ', '.join(missing))
+
+    started = time.perf_counter()
+    if dataset.ensure_dataset(app, rows, seed):
+        log(f'built the {rows} row dataset in {time.perf_counter() - started:.1f}s')
+
+    ctx = Context(rows, seed)
+    client = DRIVERS[driver](app)
+    results = {}
+    try:
+        admin = login(client, dataset.ADMIN_EMAIL)
+        author = login(client, dataset.AUTHOR_EMAIL)
+        ctx.tokens.update(admin=admin['access_token'], author=author['access_token'], refresh=author['refresh_token'])
+
+        for scenario in SCENARIOS:
+            if only and scenario.endpoint not in only:
+                continue
+            results[scenario.endpoint] = summary = run_scenario(app, client, ctx, scenario, requests, warmup)
+            log(f'{rows:>9} {scenario.endpoint:<32} p50 {summary["p50_ms"]:>9}ms p95 {summary["p95_ms"]:>9}ms '
+                f'p99 {summary["p99_ms"]:>9}ms {summary["throughput_rps"]:>9} req/s' + (f' {summary["errors"]} errors' if summary['errors'] else ''))
+    finally:
+        client.close()
+        with app.app_context():
+            dataset.reset(rows)
+            db.engine.dispose()
+
+    return {'database': make_url(url).render_as_string(hide_password=True), 'results': results}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def metadata(database_url, driver, requests, warmup):
+    return {
+        'commit': git_commit(),
+        'dialect': make_url(database_url.format(rows=0)).get_backend_name(),
+        'driver': driver,
+        'requests': requests,
+        'warmup': warmup,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+#endpoints whose p95 grew by more than threshold (0.1 is 10%) between two result files
+def compare(base, head, threshold):
+    rows = []
+    for size, endpoints in head['runs'].items():
+        for endpoint, summary in endpoints['results'].items():
+            before = base['runs'].get(size, {}).get('results', {}).get(endpoint)
+            if not before or not before['p95_ms'] or summary['p95_ms'] is None:
+                continue
+            change = summary['p95_ms'] / before['p95_ms'] - 1
+            rows.append((size, endpoint, before['p95_ms'], summary['p95_ms'], change, change > threshold))
+    return rows
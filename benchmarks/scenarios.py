@@ -0,0 +1,143 @@
+import random
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app import book_stats, counters
+from app.extentions import db
+from app.models.books import Book
+from app.models.companies import Company
+from app.models.users import User
+from benchmarks import dataset
+
+
+#one scenario per endpoint of the auth, users, companies and books blueprints
+#A scenario turns (context, iteration) into a request: url values, query string and
+#JSON body. Scenarios that use a row up (deletes) create it in setup, which runs
+#in the app context and is not timed.
+
+
+BLUEPRINTS = ('auth', 'users', 'companies', 'books')
+
+
+class Scenario:
+
+    def __init__(self, endpoint, method, request, setup=None, token='admin', iterations=None):
+        self.endpoint = endpoint
+        self.method = method
+        self.request = request
+        self.setup = setup
+        self.token = token  #'admin', 'author', 'refresh' or None
+        self.iterations = iterations  #cap for the slow ones (export reads every row)
+
+    @property
+    def name(self):
+        return self.endpoint
+
+
+#what the scenarios share: dataset size, a seeded rng and a tag that keeps names
+#created by this run apart from earlier ones
+class Context:
+
+    def __init__(self, rows, seed=0):
+        self.rows = rows
+        self.users, self.companies = dataset.sizes(rows)
+        self.rng = random.Random(seed)
+        self.run = datetime.now().strftime('%Y%m%d%H%M%S')
+        self.tokens = {}
+
+    def book_id(self):
+        return self.rng.randint(1, self.rows)
+
+    def user_id(self):
+        return self.rng.randint(1, self.users)
+
+    def company_id(self):
+        return self.rng.randint(1, self.companies)
+
+
+def _book(ctx, i, suffix=''):
+    return {
+        'title': f'Benchmark {ctx.run} {i}{suffix}', 'pages': 320, 'price': 45000, 'price_unit': 'UGX',
+        'publication_date': '2020-05-01', 'isbn': f'bench-{ctx.run}-{i}{suffix}', 'genre': 'fiction',
+        'description': 'Created by the benchmark', 'company_id': ctx.company_id(),
+    }
+
+
+def _insert_row(model, values):
+    result = db.session.execute(insert(model.__table__).values(**values))
+    db.session.commit()
+    return result.inserted_primary_key[0]
+
+
+def _new_user(ctx, i):
+    return _insert_row(User, {
+        'first_name': 'Doomed', 'last_name': f'User{i}', 'email': f'doomed-{ctx.run}-{i}@example.com',
+        'contact': f'doomed-{ctx.run}-{i}', 'password': 'x', 'biography': 'Deleted by the benchmark',
+        'user_type': 'author', 'token_version': 0, 'created_at': datetime.now(),
+    })
+
+
+def _new_company(ctx, i):
+    counters.companies_added(db.session, {1: 1})
+    return _insert_row(Company, {
+        'name': f'Doomed {ctx.run} {i}', 'origin': 'UG', 'description': 'Deleted by the benchmark',
+        'user_id': 1, 'created_at': datetime.now(),
+    })
+
+
+#stands in for createBook, so it counts the book in the stats like createBook does
+def _new_book(ctx, i):
+    values = _book(ctx, i, '-doomed')
+    values['publication_date'] = datetime(2020, 5, 1).date()
+    values = dict(values, user_id=2, created_at=datetime.now())
+    book_stats.record(db.session, added=[values])
+    return _insert_row(Book, values)
+
+
+def _search(ctx):
+    return {'query': ctx.rng.choice(dataset.SEARCH_WORDS)}
+
+
+SCENARIOS = [
+    #auth
+    Scenario('auth.register_user', 'POST', lambda ctx, i, row: ({}, {}, {
+        'first_name': 'Bench', 'last_name': f'Register{i}', 'email': f'register-{ctx.run}-{i}@example.com',
+        'contact': f'register-{ctx.run}-{i}', 'password': dataset.PASSWORD, 'biography': 'Registered by the benchmark',
+    }), token=None),
+    Scenario('auth.login', 'POST', lambda ctx, i, row: ({}, {}, {'email': dataset.AUTHOR_EMAIL, 'password': dataset.PASSWORD}), token=None),
+    Scenario('auth.refresh', 'POST', lambda ctx, i, row: ({}, {}, None), token='refresh'),
+
+    #users
+    Scenario('users.getAllUsers', 'GET', lambda ctx, i, row: ({}, {}, None)),
+    Scenario('users.getAllAuthors', 'GET', lambda ctx, i, row: ({}, {}, None)),
+    Scenario('users.getUser', 'GET', lambda ctx, i, row: ({'id': ctx.user_id()}, {}, None)),
+    Scenario('users.updateUserDetails', 'PATCH', lambda ctx, i, row: ({'id': ctx.rng.randint(3, ctx.users)}, {}, {'biography': f'Updated by the benchmark {i}'})),
+    Scenario('users.deleteUser', 'DELETE', lambda ctx, i, row: ({'id': row}, {}, None), setup=_new_user),
+    Scenario('users.searchAuthors', 'GET', lambda ctx, i, row: ({}, _search(ctx), None)),
+
+    #companies
+    Scenario('companies.createCompany', 'POST', lambda ctx, i, row: ({}, {}, {'name': f'Bench {ctx.run} {i}', 'origin': 'UG', 'description': 'Created by the benchmark'}), token='author'),
+    Scenario('companies.getAllCompanies', 'GET', lambda ctx, i, row: ({}, {}, None)),
+    Scenario('companies.getCompany', 'GET', lambda ctx, i, row: ({'id': ctx.company_id()}, {}, None)),
+    Scenario('companies.updateCompanyDetails', 'PATCH', lambda ctx, i, row: ({'id': ctx.company_id()}, {}, {'description': f'Updated by the benchmark {i}'})),
+    Scenario('companies.deleteCompany', 'DELETE', lambda ctx, i, row: ({'id': row}, {}, None), setup=_new_company),
+
+    #books
+    Scenario('books.createBook', 'POST', lambda ctx, i, row: ({}, {}, _book(ctx, i)), token='author'),
+    Scenario('books.createBooks', 'POST', lambda ctx, i, row: ({}, {}, [_book(ctx, i, f'-{n}') for n in range(50)]), token='author'),
+    Scenario('books.exportBooks', 'GET', lambda ctx, i, row: ({}, {'format': 'ndjson'}, None), iterations=3),
+    Scenario('books.bookStats', 'GET', lambda ctx, i, row: ({}, {'limit': 20}, None)),
+    Scenario('books.getAllBooks', 'GET', lambda ctx, i, row: ({}, {'sort': ctx.rng.choice(['created_at', '-created_at', 'price'])}, None)),
+    Scenario('books.searchBooks', 'GET', lambda ctx, i, row: ({}, _search(ctx), None)),
+    Scenario('books.getBook', 'GET', lambda ctx, i, row: ({'id': ctx.book_id()}, {}, None)),
+    Scenario('books.updateBookDetails', 'PATCH', lambda ctx, i, row: ({'id': ctx.book_id()}, {}, {'price': ctx.rng.randint(1000, 90000)})),
+    Scenario('books.deleteBook', 'DELETE', lambda ctx, i, row: ({'id': row}, {}, None), setup=_new_book),
+]
+
+
+#endpoints of the benchmarked blueprints without a scenario, the runner refuses to
+#start while a new route is missing here
+def missing_endpoints(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.split('.')[0] in BLUEPRINTS}
+    return sorted(endpoints - {scenario.endpoint for scenario in SCENARIOS})
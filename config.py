@@ -1,6 +1,143 @@
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+#the profile is picked with APP_CONFIG (development, testing, production), every
+#setting below that reads the environment keeps its old value as the default
 class Config:
-    SQLALCHEMY_DATABASE_URI='mysql+pymysql://root:@localhost/flask_authors_db'
-    JWT_SECRET_KEY = "authors"
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'mysql+pymysql://root:@localhost/flask_authors_db')
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', "authors")
+
+    #connection pool, per process: DB_POOL_SIZE kept open, DB_MAX_OVERFLOW more under
+    #load, DB_POOL_TIMEOUT seconds to wait for one. Connections are replaced after
+    #DB_POOL_RECYCLE seconds, below MySQL's wait_timeout, and pinged on checkout
+    #(DB_POOL_PRE_PING) so one dropped by the server is never handed to a request.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': _env_int('DB_POOL_SIZE', 10),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+    }
+
+    #optional read replica: GET requests read from it, a replica that fails is
+    #skipped for REPLICA_RETRY_AFTER seconds (app/routing.py)
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    REPLICA_RETRY_AFTER = _env_int('REPLICA_RETRY_AFTER', 30)
+
+    #list endpoints page size, MAX_PAGE_SIZE is a hard cap on ?limit=
+    DEFAULT_PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+
+    #rows read per query when a list endpoint streams (?stream=1 or Accept: application/x-ndjson)
+    STREAM_CHUNK_SIZE = 500
+
+    #rows per query of the book export (GET /api/v1/books/export, flask books export)
+    EXPORT_CHUNK_SIZE = 10000
+
+    #largest array POST /api/v1/books/bulk accepts
+    BULK_MAX_ITEMS = 1000
+
+    #adds an X-Query-Count header with the number of SQL statements each request issued
+    QUERY_COUNT_HEADER = False
+
+    #share of requests timed (0 to 1): Server-Timing header plus a JSON line on the app.timing logger
+    TIMING_SAMPLE_RATE = float(os.environ.get('TIMING_SAMPLE_RATE', 0))
+
+    #JSON encoding: 'auto' (orjson when installed), 'orjson' or 'default' (json module)
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+    JSON_SORT_KEYS = True
+
+    #gzip / brotli (with the brotli package) response bodies of these types from
+    #COMPRESSION_MIN_SIZE bytes on, streamed ones whatever their size
+    COMPRESSION_ENABLED = True
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_GZIP_LEVEL = 6
+    COMPRESSION_BROTLI_QUALITY = 5
+    COMPRESSION_MIMETYPES = ['application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html']
+
+    #full text search: 'auto', 'sqlite' (FTS5), 'mysql' (FULLTEXT) or 'memory'
+    SEARCH_BACKEND = 'auto'
+
+    #single resource cache: 'memory' (per process), 'redis' (shared) or 'null'
+    #The cli commands that write in bulk (books import, seed, repair-counters) can only
+    #clear a shared cache, with 'memory' the servers keep their entries until CACHE_TTL
+    #or a restart. The same goes for the 'memory' search index.
+    CACHE_BACKEND = 'memory'
+    CACHE_MAX_ENTRIES = 10000
+    CACHE_TTL = 300
+    CACHE_REDIS_URL = 'redis://localhost:6379/0'
+
+    #async serving (asgi.py): ASYNC_ENDPOINTS run on the event loop over the async engine,
+    #whose url is derived from SQLALCHEMY_DATABASE_URI (mysql+aiomysql, sqlite+aiosqlite)
+    #unless set. Only endpoints that use db.session alone and do not stream belong here,
+    #the others run on ASGI_THREADS threads.
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+    ASYNC_ENDPOINTS = ['books.getBook', 'companies.getCompany', 'users.getUser', 'auth.login']
+    ASGI_THREADS = _env_int('ASGI_THREADS', 32)
+
+    #token bucket rate limits of the bcrypt routes, per client IP and per email in the
+    #body: 'count/second|minute|hour|day', routes without an entry get RATELIMIT_DEFAULT.
+    #RATELIMIT_BACKEND 'memory' counts per process, 'sqlite' shares the buckets between
+    #the processes of a host through RATELIMIT_SQLITE_PATH (instance/ratelimit.sqlite)
+    RATELIMIT_ENABLED = _env_bool('RATELIMIT_ENABLED', True)
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'memory')
+    RATELIMIT_SQLITE_PATH = os.environ.get('RATELIMIT_SQLITE_PATH')
+    RATELIMIT_MAX_KEYS = 100000
+    RATELIMIT_DEFAULT = '60/minute'
+    RATELIMIT_LIMITS = {
+        'login.ip': '30/minute',
+        'login.email': '10/minute',
+        'register.ip': '20/hour',
+    }
+
+    #password hashing: bcrypt cost of new hashes (older ones are upgraded on login),
+    #worker processes (0 hashes inline) and how many calls may wait for a worker
+    BCRYPT_LOG_ROUNDS = 12
+    PASSWORD_POOL_SIZE = _env_int('PASSWORD_POOL_SIZE', 2)
+    PASSWORD_QUEUE_DEPTH = 16
+    PASSWORD_TIMEOUT = 10
+
+
+    #Config is for storing configuration settings for the application
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    QUERY_COUNT_HEADER = _env_bool('QUERY_COUNT_HEADER', True)
+    TIMING_SAMPLE_RATE = float(os.environ.get('TIMING_SAMPLE_RATE', 1))
+
+
+#runs without MySQL: a SQLite file in the instance folder unless DATABASE_URL says otherwise
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///flask_authors_test.db')
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_pre_ping': False,
+    }
+
+    #cheap hashes, inline
+    BCRYPT_LOG_ROUNDS = 4
+    PASSWORD_POOL_SIZE = 0
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+    TIMING_SAMPLE_RATE = float(os.environ.get('TIMING_SAMPLE_RATE', 0.01))
 
 
-    #Config is for storing configuration settings for the application
\ No newline at end of file
+configs = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
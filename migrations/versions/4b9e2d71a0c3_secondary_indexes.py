@@ -0,0 +1,43 @@
+"""Secondary indexes for controller filters and list sorting
+
+Revision ID: 4b9e2d71a0c3
+Revises: c07a7124b2af
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4b9e2d71a0c3'
+down_revision = 'c07a7124b2af'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # title checks in createBook / updateBookDetails, the composite also serves title alone
+    op.create_index('ix_books_title_user_id', 'books', ['title', 'user_id'], unique=False)
+    # relationship loads and ownership lookups
+    op.create_index('ix_books_user_id', 'books', ['user_id'], unique=False)
+    op.create_index('ix_books_company_id', 'books', ['company_id'], unique=False)
+    op.create_index('ix_companies_user_id', 'companies', ['user_id'], unique=False)
+    # filter_by(user_type='author'), rows come back in primary key order for keyset pages
+    op.create_index('ix_users_user_type', 'users', ['user_type'], unique=False)
+    # ?sort= columns of the paginated list endpoints
+    op.create_index('ix_books_price', 'books', ['price'], unique=False)
+    op.create_index('ix_books_created_at', 'books', ['created_at'], unique=False)
+    op.create_index('ix_companies_created_at', 'companies', ['created_at'], unique=False)
+    op.create_index('ix_users_created_at', 'users', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_created_at', table_name='users')
+    op.drop_index('ix_companies_created_at', table_name='companies')
+    op.drop_index('ix_books_created_at', table_name='books')
+    op.drop_index('ix_books_price', table_name='books')
+    op.drop_index('ix_users_user_type', table_name='users')
+    op.drop_index('ix_companies_user_id', table_name='companies')
+    op.drop_index('ix_books_company_id', table_name='books')
+    op.drop_index('ix_books_user_id', table_name='books')
+    op.drop_index('ix_books_title_user_id', table_name='books')
@@ -0,0 +1,26 @@
+"""Token version on users, bumped to invalidate issued JWTs
+
+Revision ID: 5d8e3b6f2a17
+Revises: 7c2f5a9d1e64
+Create Date: 2026-10-18 16:42:09.518304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8e3b6f2a17'
+down_revision = '7c2f5a9d1e64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
@@ -0,0 +1,38 @@
+"""Microsecond precision for created_at / updated_at on MySQL
+
+Revision ID: 7c2f5a9d1e64
+Revises: e1a7c4f09b28
+Create Date: 2026-10-18 14:05:31.207815
+
+"""
+from alembic import op
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2f5a9d1e64'
+down_revision = 'e1a7c4f09b28'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('users', 'companies', 'books')
+
+
+def upgrade():
+    # other databases already keep fractional seconds
+    if op.get_bind().dialect.name != 'mysql':
+        return
+
+    for table in TABLES:
+        for column in ('created_at', 'updated_at'):
+            op.alter_column(table, column, existing_type=mysql.DATETIME(), type_=mysql.DATETIME(fsp=6), existing_nullable=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'mysql':
+        return
+
+    for table in TABLES:
+        for column in ('created_at', 'updated_at'):
+            op.alter_column(table, column, existing_type=mysql.DATETIME(fsp=6), type_=mysql.DATETIME(), existing_nullable=True)
@@ -0,0 +1,90 @@
+"""ON DELETE CASCADE on the foreign keys of companies and books
+
+Revision ID: 9a4c6e2b7d15
+Revises: 5d8e3b6f2a17
+Create Date: 2026-10-18 18:20:44.730196
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4c6e2b7d15'
+down_revision = '5d8e3b6f2a17'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, referred table), children first
+FOREIGN_KEYS = [
+    ('books', 'user_id', 'users'),
+    ('books', 'company_id', 'companies'),
+    ('companies', 'user_id', 'users'),
+]
+
+# names the unnamed foreign keys of the first migration so SQLite batch mode can drop them
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+BOOKS_FTS_COLUMNS = ['title', 'description', 'genre']
+
+
+def _name(table, column, referred):
+    return f'fk_{table}_{column}_{referred}'
+
+
+def _replace_inspected(ondelete):
+    inspector = sa.inspect(op.get_bind())
+    for table, column, referred in FOREIGN_KEYS:
+        # the database generated the old names (books_ibfk_1 on MySQL), look them up
+        for fk in inspector.get_foreign_keys(table):
+            if fk['constrained_columns'] == [column]:
+                op.drop_constraint(fk['name'], table, type_='foreignkey')
+        op.create_foreign_key(_name(table, column, referred), table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def _replace_sqlite(ondelete):
+    # SQLite cannot alter a constraint, batch mode copies each table. Foreign keys
+    # are switched off meanwhile, dropping the old companies table would otherwise
+    # cascade into books.
+    with op.get_context().autocommit_block():
+        op.execute('PRAGMA foreign_keys=OFF')
+
+    for table in ('books', 'companies'):
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION, recreate='always') as batch_op:
+            for fk_table, column, referred in FOREIGN_KEYS:
+                if fk_table == table:
+                    batch_op.drop_constraint(_name(table, column, referred), type_='foreignkey')
+                    batch_op.create_foreign_key(_name(table, column, referred), referred, [column], ['id'], ondelete=ondelete)
+
+    # dropping the old books table dropped its full text triggers (migration e1a7c4f09b28)
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT count(*) FROM sqlite_master WHERE name = 'books_fts'")).scalar():
+        names = ', '.join(BOOKS_FTS_COLUMNS)
+        new = ', '.join('new.' + column for column in BOOKS_FTS_COLUMNS)
+        old = ', '.join('old.' + column for column in BOOKS_FTS_COLUMNS)
+        op.execute("CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN "
+                   f"INSERT INTO books_fts(rowid, {names}) VALUES (new.id, {new}); END")
+        op.execute("CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN "
+                   f"INSERT INTO books_fts(books_fts, rowid, {names}) VALUES ('delete', old.id, {old}); END")
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF {names} ON books BEGIN "
+                   f"INSERT INTO books_fts(books_fts, rowid, {names}) VALUES ('delete', old.id, {old}); "
+                   f"INSERT INTO books_fts(rowid, {names}) VALUES (new.id, {new}); END")
+
+    with op.get_context().autocommit_block():
+        op.execute('PRAGMA foreign_keys=ON')
+
+
+def _replace(ondelete):
+    if op.get_bind().dialect.name == 'sqlite':
+        _replace_sqlite(ondelete)
+    else:
+        _replace_inspected(ondelete)
+
+
+def upgrade():
+    _replace('CASCADE')
+
+
+def downgrade():
+    _replace(None)
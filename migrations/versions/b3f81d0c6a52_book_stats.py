@@ -0,0 +1,58 @@
+"""Book stats summary table, filled from the existing books
+
+Revision ID: b3f81d0c6a52
+Revises: 9a4c6e2b7d15
+Create Date: 2026-10-18 21:05:37.402918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f81d0c6a52'
+down_revision = '9a4c6e2b7d15'
+branch_labels = None
+depends_on = None
+
+
+# dimension -> books column, as in app/book_stats.py
+DIMENSIONS = {
+    'genre': 'genre',
+    'company': 'company_id',
+    'author': 'user_id',
+    'price_unit': 'price_unit',
+}
+
+
+def upgrade():
+    book_stats = op.create_table('book_stats',
+    sa.Column('dimension', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=100), nullable=False),
+    sa.Column('book_count', sa.Integer(), nullable=False),
+    sa.Column('price_total', sa.BigInteger(), nullable=False),
+    sa.Column('price_min', sa.Integer(), nullable=True),
+    sa.Column('price_max', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('dimension', 'value')
+    )
+    op.create_index('ix_book_stats_dimension_book_count', 'book_stats', ['dimension', 'book_count'], unique=False)
+    # lowest and highest price of a genre or price unit, looked up again when a book holding one goes
+    op.create_index('ix_books_genre_price', 'books', ['genre', 'price'], unique=False)
+    op.create_index('ix_books_price_unit_price', 'books', ['price_unit', 'price'], unique=False)
+
+    # the same GROUP BY queries as flask books stats-rebuild
+    books = sa.table('books', sa.column('price', sa.Integer), *[sa.column(column) for column in DIMENSIONS.values()])
+    for dimension, name in DIMENSIONS.items():
+        column = books.c[name]
+        op.execute(book_stats.insert().from_select(
+            ['dimension', 'value', 'book_count', 'price_total', 'price_min', 'price_max'],
+            sa.select(sa.literal(dimension), sa.cast(column, sa.String(100)), sa.func.count(), sa.func.sum(books.c.price),
+                      sa.func.min(books.c.price), sa.func.max(books.c.price))
+            .where(column.isnot(None)).group_by(column)))
+
+
+def downgrade():
+    op.drop_index('ix_books_price_unit_price', table_name='books')
+    op.drop_index('ix_books_genre_price', table_name='books')
+    op.drop_index('ix_book_stats_dimension_book_count', table_name='book_stats')
+    op.drop_table('book_stats')
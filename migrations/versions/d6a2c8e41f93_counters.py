@@ -0,0 +1,43 @@
+"""books_count / companies_count counters on users and companies
+
+Revision ID: d6a2c8e41f93
+Revises: b3f81d0c6a52
+Create Date: 2026-10-18 22:14:08.615730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6a2c8e41f93'
+down_revision = 'b3f81d0c6a52'
+branch_labels = None
+depends_on = None
+
+
+# (table, counter column, counted table, its foreign key), as in app/counters.py
+COUNTERS = [
+    ('users', 'books_count', 'books', 'user_id'),
+    ('users', 'companies_count', 'companies', 'user_id'),
+    ('companies', 'books_count', 'books', 'company_id'),
+]
+
+
+def upgrade():
+    for table, column, _, _ in COUNTERS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+
+    # the same recount as flask repair-counters
+    for table, column, counted, foreign_key in COUNTERS:
+        parent = sa.table(table, sa.column('id'), sa.column(column))
+        child = sa.table(counted, sa.column(foreign_key))
+        count = sa.select(sa.func.count()).where(child.c[foreign_key] == parent.c.id).scalar_subquery()
+        op.execute(parent.update().values({column: count}))
+
+
+def downgrade():
+    for table, column, _, _ in reversed(COUNTERS):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column(column)
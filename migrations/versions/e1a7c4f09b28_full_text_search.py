@@ -0,0 +1,67 @@
+"""Full text search indexes for authors and books
+
+Revision ID: e1a7c4f09b28
+Revises: 4b9e2d71a0c3
+Create Date: 2026-10-18 11:40:02.551930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a7c4f09b28'
+down_revision = '4b9e2d71a0c3'
+branch_labels = None
+depends_on = None
+
+
+# table -> (fts table, indexed columns); authors are users filtered on user_type at query time
+SQLITE_FTS = {
+    'users': ('users_fts', ['first_name', 'last_name', 'biography']),
+    'books': ('books_fts', ['title', 'description', 'genre']),
+}
+
+
+def _sqlite_has_fts5(bind):
+    options = [row[0] for row in bind.execute(sa.text('PRAGMA compile_options'))]
+    return 'ENABLE_FTS5' in options
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'mysql':
+        op.create_index('ft_users_search', 'users', ['first_name', 'last_name', 'biography'], mysql_prefix='FULLTEXT')
+        op.create_index('ft_books_search', 'books', ['title', 'description', 'genre'], mysql_prefix='FULLTEXT')
+
+    elif bind.dialect.name == 'sqlite' and _sqlite_has_fts5(bind):
+        for table, (fts, columns) in SQLITE_FTS.items():
+            names = ', '.join(columns)
+            new = ', '.join('new.' + column for column in columns)
+            old = ', '.join('old.' + column for column in columns)
+            op.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', content_rowid='id', tokenize='unicode61')")
+            op.execute(f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                       f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END")
+            op.execute(f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                       f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END")
+            op.execute(f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {names} ON {table} BEGIN "
+                       f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+                       f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END")
+            op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    # other databases use the in-process index (SEARCH_BACKEND = 'memory')
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'mysql':
+        op.drop_index('ft_books_search', table_name='books')
+        op.drop_index('ft_users_search', table_name='users')
+
+    elif bind.dialect.name == 'sqlite':
+        for table, (fts, columns) in SQLITE_FTS.items():
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {fts}')